@@ -0,0 +1,75 @@
+"""Benchmark BookList title lookups as the catalogue grows.
+
+Run from the repository root:
+
+    python benchmarks/book_list_lookup.py
+
+For each catalogue size a BookList is filled with synthetic books, then the
+same `exists`/`get` pattern that `Scraper.run` uses for every search result is
+timed, alongside the linear scan that BookList used to do.
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sibi_scraper.book import Book  # noqa: E402
+from sibi_scraper.book_list import BookList  # noqa: E402
+
+
+def build_book_list(size):
+    book_list = BookList(Path("benchmark_book_list.csv"))
+    for i in range(size):
+        book_list.add(Book(
+            title=f"Buku Siswa {i}",
+            class_=str(i % 12 + 1),
+            isbn=f"978-602-{i:07d}",
+            file=f"buku-siswa-{i}.pdf",
+        ))
+    return book_list
+
+
+def linear_exists(book_list, title):
+    return any(filter(lambda r: r.title == title, book_list.books))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000])
+    parser.add_argument("--lookups", type=int, default=1_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    print(f"{'books':>8} {'indexed (us)':>14} {'linear (us)':>13}")
+    for size in args.sizes:
+        book_list = build_book_list(size)
+        # Half hits, half misses, like a pass over a partly scraped catalogue.
+        titles = [f"Buku Siswa {rng.randrange(size * 2)}"
+                  for _ in range(args.lookups)]
+        # The linear scan is far too slow to time every lookup at 100k.
+        linear_titles = titles[:max(1, len(titles) // 100)]
+
+        def indexed(book_list=book_list, titles=titles):
+            for title in titles:
+                if book_list.exists(title):
+                    book_list.get(title)
+
+        def linear(book_list=book_list, titles=linear_titles):
+            for title in titles:
+                linear_exists(book_list, title)
+
+        indexed_us = (min(timeit.repeat(indexed, number=1, repeat=5))
+                      / len(titles) * 1e6)
+        linear_us = (min(timeit.repeat(linear, number=1, repeat=3))
+                     / len(linear_titles) * 1e6)
+
+        print(f"{size:>8} {indexed_us:>14.3f} {linear_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
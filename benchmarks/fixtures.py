@@ -0,0 +1,79 @@
+"""Generate the PDF and audio files served by the mock SIBI server.
+
+The fixtures are small, valid files built in memory, so a benchmark never
+needs real books: `pdf_fixture` writes PDFs with the hand-rolled writer from
+`pdf_page_count`, and `mp3_fixture` repeats a silent MPEG-1 Layer III frame.
+Both are deterministic, so every run downloads and parses the same bytes.
+"""
+import tempfile
+from pathlib import Path
+
+from pdf_page_count import make_pdf
+
+# The header of an MPEG-1 Layer III frame: 128 kbit/s, 44.1 kHz, no padding,
+# joint stereo. Each such frame is 144 * 128000 // 44100 bytes long.
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_BYTES = 417
+
+
+def pdf_fixture(pages, page_bytes):
+    """Return the bytes of a PDF with the given number of pages.
+
+    Parameters
+    ----------
+    pages : int
+        The number of pages.
+    page_bytes : int
+        Roughly how many bytes of drawing operators each page holds.
+
+    Returns
+    -------
+    bytes
+        The PDF.
+
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "fixture.pdf"
+        make_pdf(path, pages, page_bytes)
+        return path.read_bytes()
+
+
+def mp3_fixture(size):
+    """Return the bytes of a silent MP3 of about `size` bytes.
+
+    Parameters
+    ----------
+    size : int
+        The approximate size of the file. At least one frame is written.
+
+    Returns
+    -------
+    bytes
+        The MP3, a whole number of frames long.
+
+    """
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+    return frame * max(1, size // MP3_FRAME_BYTES)
+
+
+def pdf_fixtures(variants, pages, page_bytes):
+    """Return PDFs of differing lengths for the catalogue to share out.
+
+    Parameters
+    ----------
+    variants : int
+        The number of different PDFs to build.
+    pages : int
+        The number of pages of the longest PDF; the others are shorter, so
+        page counting does a realistic mix of work.
+    page_bytes : int
+        Roughly how many bytes of drawing operators each page holds.
+
+    Returns
+    -------
+    list of bytes
+        The PDFs.
+
+    """
+    return [pdf_fixture(max(1, pages * (i + 1) // variants), page_bytes)
+            for i in range(max(1, variants))]
@@ -0,0 +1,473 @@
+"""A local stand-in for the SIBI catalogue API and file server.
+
+Run on its own to poke at it with curl:
+
+    python benchmarks/mock_sibi_server.py --books 500 --port 8000
+
+or start a `MockSibiServer` from a benchmark (see `scraper_run.py`). The
+server implements the `getTextBooks`, `getPenggerakTextBooks`,
+`getNonTextBooks` and `getDetails` endpoints, paged with `limit` and
+`offset` and ordered newest first like the real catalogue, and serves the
+books' PDFs and the audiobooks' chapters from `/files/`, with `ETag`s and
+`Range` requests so interrupted downloads can be resumed.
+
+Everything that makes the real server slow or unreliable can be dialled in:
+a delay before every response, a per-connection bandwidth cap for files,
+and the share of API requests that are throttled (503) and of downloads
+that are cut off halfway. Which requests fail is worked out from a hash of
+the request and the seed, and only the first attempt at a request fails, so
+a run is reproducible and always completes.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import mp3_fixture, pdf_fixtures
+
+TEXT_CATEGORIES = {
+    "getTextBooks": "buku_teks",
+    "getPenggerakTextBooks": "buku_sekolah_penggerak",
+}
+NON_TEXT_CATEGORY = "buku_non_teks"
+NON_TEXT_LEVELS = ["A", "B1", "B2", "B3", "C", "D", "E", "transisi"]
+SUBJECTS = ["Matematika", "Bahasa Indonesia", "IPA", "IPS", "Seni Budaya",
+            "Pendidikan Pancasila"]
+
+HTTP_OK = 200
+HTTP_PARTIAL_CONTENT = 206
+HTTP_NOT_FOUND = 404
+HTTP_SERVICE_UNAVAILABLE = 503
+
+
+class Catalogue:
+    """A generated catalogue of text, non-text and audio books.
+
+    Attributes
+    ----------
+    books : list of dict
+        The API result for every book, in the order they were added.
+    chapters : int
+        The number of chapters of each audiobook.
+    base_url : str
+        The URL that attachments are served from, set by the server. The
+        books store attachment paths, which `search` turns into URLs.
+
+    """
+
+    def __init__(self, size, *, audio_share=0.1, non_text_share=0.2,
+                 unclassified_share=0.05, chapters=5, seed=0):
+        """Generate a catalogue.
+
+        Parameters
+        ----------
+        size : int
+            The number of books.
+        audio_share : float
+            The share of text books that are audiobooks.
+        non_text_share : float
+            The share of books that are non-text books.
+        unclassified_share : float
+            The share of text books that have no class.
+        chapters : int
+            The number of chapters of each audiobook.
+        seed : int
+            The seed of the random choices, so the same arguments always
+            give the same catalogue.
+
+        """
+        self.audio_share = audio_share
+        self.non_text_share = non_text_share
+        self.unclassified_share = unclassified_share
+        self.chapters = chapters
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.books = []
+        self.by_slug = {}
+        self.base_url = ""
+        self._clock = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+        self.add_books(size)
+
+    def add_books(self, count):
+        """Add new books, updated after every book already there."""
+        with self.lock:
+            for _ in range(count):
+                book = self._new_book(len(self.books))
+                self.books.append(book)
+                self.by_slug[book["slug"]] = book
+
+    def touch_books(self, count):
+        """Mark some existing books as updated, as an edit on SIBI would."""
+        with self.lock:
+            for book in self.rng.sample(self.books,
+                                        min(count, len(self.books))):
+                book["updated_at"] = self._tick()
+
+    def search(self, endpoint, params):
+        """Return a page of the books matching a catalogue search.
+
+        Parameters
+        ----------
+        endpoint : str
+            The name of the endpoint, e.g. `getTextBooks`.
+        params : dict
+            The query parameters of the search.
+
+        Returns
+        -------
+        list of dict or None
+            The API results, or None if the endpoint does not exist.
+
+        """
+        if endpoint == "getNonTextBooks":
+            def wanted(book):
+                return (book["category"] == NON_TEXT_CATEGORY
+                        and f"level_{book['level']}" in params)
+        elif endpoint in TEXT_CATEGORIES:
+            category = TEXT_CATEGORIES[endpoint]
+            types = {key.removeprefix("type_") for key in params
+                     if key.startswith("type_")}
+            classes = {key.removeprefix("class_") for key in params
+                       if key.startswith("class_")}
+
+            def wanted(book):
+                return (book["category"] == category
+                        and (not types or book["type"] in types)
+                        and ("None" in classes or not classes
+                             or book["class"] in classes))
+        else:
+            return None
+
+        with self.lock:
+            books = sorted((book for book in self.books if wanted(book)),
+                           key=lambda book: book["updated_at"], reverse=True)
+
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        return [{**book, "attachment": (self.base_url + book["attachment"]
+                                        if book["attachment"] else "")}
+                for book in books[offset:offset + limit]]
+
+    def details(self, slug):
+        """Return the `getDetails` result for an audiobook, or None."""
+        book = self.by_slug.get(slug)
+        if book is None:
+            return None
+
+        return {"results": {"slug": slug, "audio_attachment": [
+            {
+                "title": f"{book['title']} Bab {i}",
+                "attachment": f"{self.base_url}/files/{slug}/bab-{i}.mp3",
+                "chapter": str(i),
+                "sub_chapter": "",
+            }
+            for i in range(1, self.chapters + 1)
+        ]}}
+
+    def titles(self):
+        """Return every book and chapter title, to pre-fill translations."""
+        with self.lock:
+            books = list(self.books)
+        titles = [book["title"] for book in books]
+        for book in books:
+            if book["type"] == "audio":
+                titles.extend(f"{book['title']} Bab {i}"
+                              for i in range(1, self.chapters + 1))
+        return titles
+
+    def _new_book(self, number):
+        non_text = self.rng.random() < self.non_text_share
+        audio = not non_text and self.rng.random() < self.audio_share
+        slug = f"buku-{number:06d}"
+
+        if non_text:
+            category, class_ = NON_TEXT_CATEGORY, ""
+            level = self.rng.choice(NON_TEXT_LEVELS)
+        else:
+            category = self.rng.choice(list(TEXT_CATEGORIES.values()))
+            level = self.rng.choice(["SD", "SMP"])
+            class_ = ("" if self.rng.random() < self.unclassified_share
+                      else str(self.rng.randint(1, 12)))
+
+        return {
+            "title": f"Buku {self.rng.choice(SUBJECTS)} {number}",
+            "isbn": f"978-602-{number:07d}",
+            "edition": "Revisi",
+            "attachment": "" if audio else f"/files/{slug}.pdf",
+            "level": level,
+            "subject": self.rng.choice(SUBJECTS),
+            "class": class_,
+            "category": category,
+            "type": "audio" if audio else "pdf",
+            "slug": slug,
+            "updated_at": self._tick(),
+        }
+
+    def _tick(self):
+        self._clock += datetime.timedelta(seconds=1)
+        return self._clock.strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+
+class MockSibiServer(ThreadingHTTPServer):
+    """A threaded HTTP server answering like SIBI from a `Catalogue`.
+
+    Attributes
+    ----------
+    catalogue : obj:`Catalogue`
+        The books served.
+    latency : float
+        Seconds to wait before every response.
+    bandwidth : int
+        The most bytes per second sent on each connection when serving a
+        file, or 0 for no limit.
+    api_error_rate : float
+        The share of API requests answered with 503 Service Unavailable.
+    download_error_rate : float
+        The share of downloads cut off halfway through the body.
+    stats : dict
+        Counts of the `api`, `details` and `file` requests served, the
+        `throttled` and `cut` responses and the file `bytes` sent.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, catalogue, pdfs, mp3, *, latency=0.0, bandwidth=0,
+                 api_error_rate=0.0, download_error_rate=0.0, seed=0,
+                 address=("127.0.0.1", 0)):
+        super().__init__(address, SibiRequestHandler)
+        self.catalogue = catalogue
+        self.catalogue.base_url = self.url
+        self.pdfs = pdfs
+        self.mp3 = mp3
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.api_error_rate = api_error_rate
+        self.download_error_rate = download_error_rate
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.attempts = {}
+        self.stats = dict.fromkeys(["api", "details", "file", "throttled",
+                                    "cut", "bytes"], 0)
+        self._thread = None
+
+    @property
+    def url(self):
+        """The base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name="mock-sibi", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def count(self, stat, value=1):
+        with self.lock:
+            self.stats[stat] += value
+
+    def should_fail(self, key, rate):
+        """Decide whether to fail a request, the first time it is made."""
+        if rate <= 0:
+            return False
+        with self.lock:
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+        digest = hashlib.sha256(f"{self.seed}:{key}".encode()).digest()
+        return attempt == 1 and int.from_bytes(digest[:4]) / 2**32 < rate
+
+    def file_body(self, path):
+        """Return the contents of a file under `/files/`, or None."""
+        name = path.removeprefix("/files/")
+        if name.endswith(".mp3"):
+            slug = name.split("/")[0]
+            return self.mp3 if slug in self.catalogue.by_slug else None
+
+        slug = name.removesuffix(".pdf")
+        book = self.catalogue.by_slug.get(slug)
+        if book is None or book["type"] != "pdf":
+            return None
+        return self.pdfs[int(slug.rsplit("-", 1)[-1]) % len(self.pdfs)]
+
+
+class SibiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockSibiServer
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_GET(self):  # noqa: N802
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query,
+                                             keep_blank_values=True))
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if url.path.startswith("/api/catalogue/"):
+            self.api(url.path.rsplit("/", 1)[-1], params)
+        elif url.path.startswith("/files/"):
+            self.file(url.path)
+        else:
+            self.send_json(HTTP_NOT_FOUND, {"message": "Not found"})
+
+    def api(self, endpoint, params):
+        if self.server.should_fail(self.path, self.server.api_error_rate):
+            self.server.count("throttled")
+            self.send_json(HTTP_SERVICE_UNAVAILABLE,
+                           {"message": "Service unavailable"},
+                           {"Retry-After": "0"})
+            return
+
+        if endpoint == "getDetails":
+            self.server.count("details")
+            result = self.server.catalogue.details(params.get("slug"))
+        else:
+            self.server.count("api")
+            results = self.server.catalogue.search(endpoint, params)
+            result = None if results is None else {"results": results}
+
+        if result is None:
+            self.send_json(HTTP_NOT_FOUND, {"message": "Not found"})
+        else:
+            self.send_json(HTTP_OK, result)
+
+    def file(self, path):
+        body = self.server.file_body(urllib.parse.unquote(path))
+        if body is None:
+            self.send_json(HTTP_NOT_FOUND, {"message": "Not found"})
+            return
+        self.server.count("file")
+
+        etag = f'"{hashlib.sha256(path.encode()).hexdigest()[:16]}"'
+        start = 0
+        range_header = self.headers.get("Range", "")
+        if (range_header.startswith("bytes=")
+                and self.headers.get("If-Range") == etag):
+            start = min(int(range_header[6:].split("-")[0] or 0), len(body))
+
+        self.send_response(HTTP_PARTIAL_CONTENT if start else HTTP_OK)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("ETag", etag)
+        if start:
+            self.send_header("Content-Range",
+                             f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+
+        end = len(body)
+        if self.server.should_fail(path, self.server.download_error_rate):
+            self.server.count("cut")
+            end = start + (end - start) // 2
+            self.close_connection = True
+        self.send_body(body[start:end])
+
+    def send_body(self, body):
+        bandwidth = self.server.bandwidth
+        chunk_size = (min(64 * 1024, max(1024, bandwidth // 20))
+                      if bandwidth else 64 * 1024)
+
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+                return
+            self.server.count("bytes", len(chunk))
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def build_server(args, port=0):
+    """Build a server from the options added by `add_arguments`.
+
+    The server listens on `port` of the loopback interface, or on any free
+    port if `port` is 0.
+
+    """
+    catalogue = Catalogue(args.books, audio_share=args.audio_share,
+                          non_text_share=args.non_text_share,
+                          chapters=args.chapters, seed=args.seed)
+    pdfs = pdf_fixtures(args.pdf_variants, args.pdf_pages,
+                        args.pdf_page_bytes)
+    return MockSibiServer(catalogue, pdfs, mp3_fixture(args.chapter_bytes),
+                          latency=args.latency, bandwidth=args.bandwidth,
+                          api_error_rate=args.api_error_rate,
+                          download_error_rate=args.download_error_rate,
+                          seed=args.seed, address=("127.0.0.1", port))
+
+
+def add_arguments(parser):
+    """Add the options describing the catalogue and the server."""
+    parser.add_argument("--books", type=int, default=200,
+                        help="the number of books in the catalogue")
+    parser.add_argument("--audio-share", type=float, default=0.1,
+                        help="the share of text books that are audiobooks")
+    parser.add_argument("--non-text-share", type=float, default=0.2,
+                        help="the share of books that are non-text books")
+    parser.add_argument("--chapters", type=int, default=5,
+                        help="the number of chapters of each audiobook")
+    parser.add_argument("--pdf-variants", type=int, default=4,
+                        help="the number of different PDFs served")
+    parser.add_argument("--pdf-pages", type=int, default=200,
+                        help="the number of pages of the longest PDF")
+    parser.add_argument("--pdf-page-bytes", type=int, default=2_000,
+                        help="roughly how many bytes each PDF page holds")
+    parser.add_argument("--chapter-bytes", type=int, default=200_000,
+                        help="the size of each audio chapter")
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="seconds to wait before every response")
+    parser.add_argument("--bandwidth", type=int, default=0,
+                        help="bytes per second per connection for files "
+                             "(default: unlimited)")
+    parser.add_argument("--api-error-rate", type=float, default=0.0,
+                        help="the share of API requests throttled with 503")
+    parser.add_argument("--download-error-rate", type=float, default=0.0,
+                        help="the share of downloads cut off halfway")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the catalogue and of which "
+                             "requests fail")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = build_server(args, args.port)
+    print(f"Serving {args.books} books at {server.url}/api/catalogue/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark the fast PDF page count against a full PyPDF2 parse.
+
+Run from the repository root:
+
+    python benchmarks/pdf_page_count.py
+
+A corpus of PDFs is generated in a temporary directory, varying both the
+number of pages and the size of each page's content stream (to stand in for
+big scanned textbooks). Each file is counted with `sibi_scraper.pdf` and with
+the `PyPDF2.PdfReader(path).pages` approach it replaced, and the best wall
+clock time and peak Python memory of each are reported.
+"""
+import argparse
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import PyPDF2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sibi_scraper import pdf  # noqa: E402
+
+
+def make_pdf(path, pages, page_bytes):
+    """Write a PDF with the given number of pages.
+
+    Each page gets a content stream of roughly `page_bytes` drawing
+    operators. The file is written by hand, with a classic cross-reference
+    table, because PyPDF2's writer is far too slow for large corpora.
+
+    """
+    operators = b"0 0 m 595 842 l S\n" * max(1, page_bytes // 18)
+    # Objects 1 and 2 are the catalog and page tree, then a page object and
+    # content stream for each page.
+    kids = b" ".join(b"%d 0 R" % (3 + 2 * i) for i in range(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages),
+    ]
+    for i in range(pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R "
+                       b"/MediaBox [0 0 595 842] /Contents %d 0 R >>"
+                       % (4 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream"
+                       % (len(operators), operators))
+
+    with path.open("wb") as pdf_file:
+        pdf_file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(pdf_file.tell())
+            pdf_file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+        startxref = pdf_file.tell()
+        pdf_file.write(b"xref\n0 %d\n0000000000 65535 f \n"
+                       % (len(objects) + 1))
+        for offset in offsets:
+            pdf_file.write(b"%010d 00000 n \n" % offset)
+        pdf_file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\n"
+                       b"startxref\n%d\n%%%%EOF\n"
+                       % (len(objects) + 1, startxref))
+
+
+def pypdf2_page_count(path):
+    reader = PyPDF2.PdfReader(path)
+    return len(reader.pages)
+
+
+def measure(func, path, repeat):
+    seconds = min(timeit.repeat(lambda: func(path), number=1, repeat=repeat))
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+",
+                        default=[10, 100, 500])
+    parser.add_argument("--page-bytes", type=int, nargs="+",
+                        default=[1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'KB/page':>8} {'size MB':>8} "
+          f"{'fast ms':>9} {'fast KB':>8} {'pypdf2 ms':>10} {'pypdf2 KB':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pages in args.pages:
+            for page_bytes in args.page_bytes:
+                path = Path(tmp_dir) / f"{pages}-{page_bytes}.pdf"
+                make_pdf(path, pages, page_bytes)
+
+                if pdf.page_count(path) != pypdf2_page_count(path):
+                    msg = f"page counts disagree for {path}"
+                    raise AssertionError(msg)
+
+                fast_s, fast_peak = measure(pdf.page_count, path, args.repeat)
+                slow_s, slow_peak = measure(pypdf2_page_count, path,
+                                            args.repeat)
+
+                print(f"{pages:>6} {page_bytes // 1000:>8} "
+                      f"{path.stat().st_size / 1e6:>8.1f} "
+                      f"{fast_s * 1000:>9.2f} {fast_peak / 1000:>8.1f} "
+                      f"{slow_s * 1000:>10.2f} {slow_peak / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
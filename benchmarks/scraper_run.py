@@ -0,0 +1,250 @@
+"""Benchmark full and incremental scraper runs against a mock SIBI server.
+
+Run from the repository root:
+
+    python benchmarks/scraper_run.py --books 500 --workers 8
+
+A `MockSibiServer` (see `mock_sibi_server.py`) is started on the loopback
+interface with a generated catalogue, and `Scraper.run` scrapes every class
+and level from it into a temporary directory: first a full pass over an
+empty book list, then, after some books have been added to the catalogue
+and some edited, an incremental pass that should only look at those. The
+catalogue API's requests are sent to the mock server by swapping the
+transport of the `Session` client for its host; files are downloaded from
+the server directly. Titles are translated from a pre-filled
+`TranslationCache`, so nothing leaves the machine.
+
+For each pass the wall clock time, books and megabytes downloaded per
+second, catalogue search and download latencies (from `Metrics`), requests
+served and peak memory are reported. The same arguments give the same
+catalogue and the same injected errors, so runs can be compared before and
+after a change; `--json` saves the numbers for that.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mock_sibi_server import add_arguments, build_server  # noqa: E402
+from sibi_scraper.metrics import Metrics  # noqa: E402
+from sibi_scraper.rate_limit import RateLimiter  # noqa: E402
+from sibi_scraper.scraper import Scraper  # noqa: E402
+from sibi_scraper.translation import TranslationCache  # noqa: E402
+from sibi_scraper.web import Session  # noqa: E402
+
+API_HOST = "api.buku.kemdikbud.go.id"
+
+
+class LocalTransport(httpx.HTTPTransport):
+    """Send every request to the mock server, whatever host it names."""
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        self.url = httpx.URL(url)
+
+    def handle_request(self, request):
+        request.url = request.url.copy_with(scheme=self.url.scheme,
+                                            host=self.url.host,
+                                            port=self.url.port)
+        return super().handle_request(request)
+
+
+def use_server(server, rate):
+    """Point the `Session` at the mock server and lift the rate limits."""
+    session = Session()
+    client = session.client(API_HOST)
+    session.clients[API_HOST] = httpx.Client(
+        headers=client.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        transport=LocalTransport(server.url, limits=httpx.Limits(
+            max_connections=session.pool_size,
+            max_keepalive_connections=session.pool_size,
+        )),
+    )
+    client.close()
+
+    for host in [API_HOST, httpx.URL(server.url).netloc.decode()]:
+        RateLimiter().configure(host, rate=rate, max_rate=rate,
+                                capacity=max(1, rate))
+
+
+def translate_catalogue(catalogue):
+    """Pre-fill the translation cache, so no titles go to Google."""
+    for title in catalogue.titles():
+        TranslationCache().put(title, "id", "en", f"EN {title}")
+
+
+def counter_total(summary, name, **labels):
+    return sum(counter["value"] for counter in summary["counters"]
+               if counter["name"] == name
+               and labels.items() <= counter["labels"].items())
+
+
+def run_pass(name, server, args, work_dir):
+    """Run the scraper once and return its numbers."""
+    Metrics().reset()
+    served = dict(server.stats)
+
+    scraper = Scraper(None, None, work_dir / "sibi_book_list.csv",
+                      work_dir / "sibi_failures.csv",
+                      workers=args.workers,
+                      validate_workers=args.validate_workers,
+                      stats_interval=0,
+                      sync_state_file=work_dir / "sibi_sync_state.csv",
+                      page_size=args.page_size,
+                      discover_workers=args.discover_workers,
+                      audio_workers=args.audio_workers,
+                      audio_index_file=work_dir / "sibi_audio_index.csv",
+                      checkpoint_file=work_dir / "sibi_checkpoint.json")
+
+    if args.trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    scraper.run()
+    seconds = time.perf_counter() - started
+    traced_peak = None
+    if args.trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    summary = Metrics().summary()
+    downloaded = counter_total(summary, "sibi_downloaded_bytes_total")
+    books = counter_total(summary, "sibi_books_recorded_total",
+                          outcome="downloaded")
+    return {
+        "pass": name,
+        "seconds": round(seconds, 3),
+        "books": books,
+        "failed": len(scraper.failure_list.failures),
+        "books_per_second": round(books / seconds, 2),
+        "megabytes": round(downloaded / 1e6, 2),
+        "megabytes_per_second": round(downloaded / 1e6 / seconds, 2),
+        "api": Metrics().histogram_summary("sibi_api_request_seconds"),
+        "download": Metrics().histogram_summary("sibi_download_seconds"),
+        "pdf_parse": Metrics().histogram_summary("sibi_pdf_parse_seconds"),
+        "retries": counter_total(summary, "sibi_retries_total"),
+        "served": {stat: server.stats[stat] - served[stat]
+                   for stat in served},
+        # ru_maxrss is in kilobytes on Linux, and the peak of the whole
+        # process so far, so it only grows from one pass to the next.
+        "peak_rss_mb": round(resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1e3, 1),
+        "traced_peak_mb": (None if traced_peak is None
+                           else round(traced_peak / 1e6, 1)),
+    }
+
+
+def print_results(results):
+    print(f"{'pass':<12} {'time s':>7} {'books':>6} {'failed':>6} "
+          f"{'books/s':>8} {'MB/s':>7} {'api p50/p95 ms':>15} "
+          f"{'dl p50/p95 ms':>14} {'retries':>7} {'requests':>8} "
+          f"{'RSS MB':>7} {'traced MB':>9}")
+    for result in results:
+        api, download = result["api"], result["download"]
+        served = result["served"]
+        traced = result["traced_peak_mb"]
+        print(f"{result['pass']:<12} {result['seconds']:>7.2f} "
+              f"{result['books']:>6} {result['failed']:>6} "
+              f"{result['books_per_second']:>8.2f} "
+              f"{result['megabytes_per_second']:>7.2f} "
+              f"{api['p50'] * 1000:>7.1f}/{api['p95'] * 1000:<7.1f} "
+              f"{download['p50'] * 1000:>6.1f}/{download['p95'] * 1000:<7.1f} "
+              f"{result['retries']:>7} "
+              f"{served['api'] + served['details'] + served['file']:>8} "
+              f"{result['peak_rss_mb']:>7.1f} "
+              f"{'-' if traced is None else f'{traced:.1f}':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="the number of books to download concurrently")
+    parser.add_argument("--validate-workers", type=int, default=2,
+                        help="the number of processes counting PDF pages")
+    parser.add_argument("--discover-workers", type=int, default=4,
+                        help="the number of catalogue searches to run "
+                             "concurrently")
+    parser.add_argument("--audio-workers", type=int, default=4,
+                        help="the number of chapters of each audiobook to "
+                             "download concurrently")
+    parser.add_argument("--page-size", type=int, default=100,
+                        help="the number of books per catalogue page")
+    parser.add_argument("--rate", type=float, default=1000,
+                        help="requests per second allowed to each host; "
+                             "0.5 is what the scraper uses against SIBI")
+    parser.add_argument("--new-books", type=int, default=None,
+                        help="books added before the incremental pass "
+                             "(default: 5%% of --books)")
+    parser.add_argument("--edited-books", type=int, default=None,
+                        help="books edited before the incremental pass "
+                             "(default: 5%% of --books)")
+    parser.add_argument("--http-cache", action="store_true",
+                        help="cache catalogue responses, as the command "
+                             "line does by default")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the peak Python memory from "
+                             "tracemalloc, which slows the run down")
+    parser.add_argument("--json", type=Path, default=None,
+                        help="write the results to this file")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log what the scraper is doing")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(levelname)s: %(message)s",
+                        level=logging.INFO if args.verbose
+                        else logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.json is not None:
+        args.json = args.json.resolve()
+    cwd = Path.cwd()
+
+    server = build_server(args)
+    server.start()
+    results = []
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            work_dir = Path(tmp_dir)
+            # Books and audiobooks are downloaded relative to the working
+            # directory.
+            os.chdir(work_dir)
+            if args.http_cache:
+                Session().use_cache(work_dir / "sibi_http_cache")
+            use_server(server, args.rate)
+
+            translate_catalogue(server.catalogue)
+            results.append(run_pass("full", server, args, work_dir))
+
+            step = max(1, args.books // 20)
+            server.catalogue.add_books(
+                step if args.new_books is None else args.new_books)
+            server.catalogue.touch_books(
+                step if args.edited_books is None else args.edited_books)
+            translate_catalogue(server.catalogue)
+            results.append(run_pass("incremental", server, args, work_dir))
+    finally:
+        os.chdir(cwd)
+        server.stop()
+
+    print_results(results)
+    if args.json is not None:
+        args.json.write_text(json.dumps(
+            {"arguments": vars(args), "results": results},
+            indent=2, default=str) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 # pylint: disable=too-many-arguments
+import concurrent.futures
 import datetime
+import hashlib
 import logging
 import time
 import urllib.parse
@@ -13,22 +15,38 @@ from tenacity import (
     wait_exponential,
 )
 
-from sibi_scraper.audio_book_list import AudioBookList
+from sibi_scraper.audio_index import AudioIndex
+from sibi_scraper.blob_store import BlobStore
 from sibi_scraper.book import Book
+from sibi_scraper.download import fetch_to_file
 from sibi_scraper.errors import ScraperError
-from sibi_scraper.failure_list import FailureList
+from sibi_scraper.metrics import record_retry
 from sibi_scraper.web import Session
 
 
 class AudioBook(Book):
     def __init__(self, **kwargs):
-        self.file_list = None
-        self.failure_list = None
+        self.chapters = None
 
         super().__init__(**kwargs)
 
     @classmethod
-    def from_api(cls, json_blob):
+    def from_api(cls, json_blob, *, workers=4):
+        """Create an AudioBook from an API result and download its chapters.
+
+        Parameters
+        ----------
+        json_blob : dict
+            The API result for the audiobook.
+        workers : int
+            The maximum number of chapters to download concurrently.
+
+        Returns
+        -------
+        obj:`sibi_scraper.audio_book.AudioBook` or None
+            The audiobook, or None if any of its chapters failed to download.
+
+        """
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         params = {
             "title": json_blob["title"],
@@ -49,24 +67,41 @@ class AudioBook(Book):
         new_book = cls(**params)
 
         new_book.set_category(json_blob["category"])
-        new_book.english_title = new_book.translate(new_book.title)
 
-        new_book.download_audio_files(json_blob["slug"])
+        new_book.download_audio_files(json_blob["slug"], workers=workers)
 
-        if not new_book.failure_list.isempty():
+        if not new_book.chapters.isempty():
             return None
 
         return new_book
 
+    def load_lists(self):
+        """Look up the downloaded and failed chapters in the `AudioIndex`.
+
+        Returns
+        -------
+        obj:`pathlib.Path`
+            The directory that the audio files are downloaded to:
+                {CWD}/audiobooks/{class_}/{file}
+
+        """
+        download_dir = Path("audiobooks") / self.class_ / self.file
+        scope = f"{self.class_}/{self.file}"
+
+        self.chapters = AudioIndex().book(scope, download_dir)
+
+        return download_dir
+
     def get_audiobook_details(self, slug):
-        response = Session().session.get(
+        response = Session().get(
             "https://api.buku.kemdikbud.go.id/api/catalogue/getDetails",
+            cache=True,
             params={
                 "slug": slug,
             },
         )
 
-        if not response.ok:
+        if not response.is_success:
             raise ScraperError(self.title,
                                "Failed to get book details: "
                                f"error {response.status_code}")
@@ -79,64 +114,131 @@ class AudioBook(Book):
                httpx.ConnectError,
                httpx.ReadTimeout,
                TimeoutError)),
+           before_sleep=record_retry,
            reraise=True)
-    def download_audio_files(self, slug):
+    def download_audio_files(self, slug, workers=4):
+        """Download every chapter of the audiobook not downloaded before.
+
+        Up to `workers` chapters are downloaded at once. Chapters are added
+        to the `AudioIndex`, downloaded or failed, in the order that the API
+        lists them, whatever order they finish in. Chapters that failed
+        before are tried again.
+
+        Parameters
+        ----------
+        slug : str
+            The slug identifying the audiobook.
+        workers : int
+            The maximum number of chapters to download concurrently.
+
+        """
         try:
             audiobook_details = self.get_audiobook_details(slug)
         except httpx.HTTPError as e:
-            raise ScraperError(self.title, e.message) from e
+            raise ScraperError(self.title, str(e)) from e
 
         self.file = self.safe_path(slug)
-        download_dir = Path("audiobooks") / self.class_ / self.file
-        if not download_dir.is_dir():
-            download_dir.mkdir(parents=True)
-
-        self.file_list = AudioBookList(download_dir / "files.csv")
-        self.failure_list = FailureList(download_dir / "failures.csv")
-        self.file_list.load()
-        self.failure_list.load()
+        download_dir = self.load_lists()
+        # Other workers may be creating the same directory.
+        download_dir.mkdir(parents=True, exist_ok=True)
 
+        # Chapters saved to the same file are downloaded one after the other
+        # by the same worker, so they never write to one part file at once.
+        batches = {}
+        titles = set()
         for attachment in audiobook_details["results"]["audio_attachment"]:
-            if self.file_list.exists(attachment["title"]):
+            if (self.chapters.exists(attachment["title"])
+                    or attachment["title"] in titles):
                 continue
+            titles.add(attachment["title"])
 
             filename = Path(
                 urllib.parse.unquote(attachment["attachment"]),
             ).name
-            download_path = download_dir / filename
+            batches.setdefault(filename, []).append(attachment)
 
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(self.download_batch, download_dir, filename,
+                                batch)
+                for filename, batch in batches.items()
+            ]
+            outcomes = {}
+            for future in futures:
+                outcomes.update(future.result())
+
+        for attachment in audiobook_details["results"]["audio_attachment"]:
+            if attachment["title"] not in outcomes:
+                continue
+            filename, error = outcomes.pop(attachment["title"])
+
+            if error is not None:
+                self.chapters.fail(attachment["title"], error.message)
+                continue
+
+            self.chapters.add(
+                attachment["title"],
+                "",
+                attachment["chapter"],
+                attachment["sub_chapter"],
+                filename,
+            )
+
+        # Failures that are no longer in the API result (or were recorded
+        # under another title by older versions) can't be tried again.
+        self.chapters.clear_failures(titles)
+
+        # Every chapter of the book is written to the index at once.
+        self.chapters.save()
+
+    def download_batch(self, download_dir, filename, attachments):
+        """Download chapters that are saved to the same file, in turn.
+
+        Parameters
+        ----------
+        download_dir : obj:`pathlib.Path`
+            The directory to download the chapters to.
+        filename : str
+            The name of the file the chapters are saved to.
+        attachments : obj:`list` of dict
+            The API results for the chapters.
+
+        Returns
+        -------
+        dict
+            The file name and the error (a
+            obj:`sibi_scraper.errors.ScraperError`, or None if the download
+            succeeded) for each chapter, by chapter title.
+
+        """
+        outcomes = {}
+        for attachment in attachments:
+            error = None
             try:
                 self.download_audio_file(
                     attachment["title"],
                     attachment["attachment"],
                     attachment["chapter"],
                     attachment["sub_chapter"],
-                    download_path,
+                    download_dir / filename,
                 )
-                self.file_list.add(
-                    attachment["title"],
-                    self.translate(attachment["title"]),
-                    attachment["chapter"],
-                    attachment["sub_chapter"],
-                    filename,
-                )
-                if self.failure_list.exists(attachment["title"]):
-                    self.failure_list.remove(attachment["title"])
-                time.sleep(10)
             except ScraperError as e:
-                self.failure_list.add(e.title, e.message)
+                error = e
             except httpx.HTTPError as e:
-                self.failure_list.add(self.title, e.message)
-
-        self.failure_list.save()
-        self.file_list.save()
+                error = ScraperError(self.title, str(e))
+            outcomes[attachment["title"]] = (filename, error)
+        return outcomes
 
     @retry(wait=wait_exponential(multiplier=1, min=2, max=10),
            stop=stop_after_attempt(3),
            retry=retry_if_exception_type((
                httpx.ConnectError,
+               httpx.ReadError,
                httpx.ReadTimeout,
+               httpx.RemoteProtocolError,
                TimeoutError)),
+           before_sleep=record_retry,
            reraise=True)
     def download_audio_file(self, title, attachment, chapter, sub_chapter,
                             path):
@@ -146,12 +248,16 @@ class AudioBook(Book):
         if attachment in ["", None]:
             raise ScraperError(ident, f"Blank URL: {ident}")
 
-        response = Session().session.get(attachment)
-        if not response.ok:
+        store = BlobStore()
+        digest = hashlib.sha256() if store.path is not None else None
+        started = time.monotonic()
+        response = fetch_to_file(attachment, path, digest)
+        self.record_download(response, time.monotonic() - started)
+        if not response.is_success:
             logging.info("Unable to download %s: error %d",
                          attachment, response.status_code)
             raise ScraperError(ident, f"Unable to download {attachment}: "
                                f"error {response.status_code}")
 
-        with path.open("wb") as local_file:
-            local_file.write(response.content)
+        if digest is not None:
+            store.add(path, digest.hexdigest())
@@ -1,4 +1,4 @@
-import csv
+from sibi_scraper.storage import Storage
 
 
 class AudioBookList:
@@ -10,33 +10,32 @@ class AudioBookList:
         "File Name",
     ]
 
-    def __init__(self, path):
+    def __init__(self, path, scope=""):
         self.path = path
         self.files = []
+        self._by_title = {}
+        self.backend = Storage().backend(path, self._csv_fields, "Title",
+                                         "audio_files", scope=scope)
 
     def load(self):
-        if not self.path.is_file():
-            return
-
-        with self.path.open(newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                self.files.append(row)
+        for row in self.backend.load():
+            self.files.append(row)
+            self._by_title[row["Title"]] = row
 
     def save(self):
-        parent = self.path.parent
-        if not parent.is_dir():
-            parent.mkdir(parents=True)
-
-        with self.path.open("w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self._csv_fields)
-            writer.writeheader()
-            for file in self.files:
-                writer.writerow(file)
+        self.backend.commit()
+        self.backend.compact()
 
     def exists(self, title):
-        return any(filter(lambda r: r["Title"] == title, self.files))
+        return title in self._by_title
 
     def add(self, *params):
         data = dict(zip(self._csv_fields, params))
         self.files.append(data)
+        self._by_title[data["Title"]] = data
+        self.backend.put(data["Title"], data)
+
+    def update(self, title, values):
+        row = self._by_title[title]
+        row.update(values)
+        self.backend.put(title, row)
@@ -0,0 +1,343 @@
+import logging
+import threading
+
+from sibi_scraper.audio_book_list import AudioBookList
+from sibi_scraper.failure_list import FailureList
+from sibi_scraper.journal import write_csv
+from sibi_scraper.storage import Storage
+
+
+class AudioIndex:
+    """A singleton index of the chapters of every audiobook.
+
+    Each chapter that has been downloaded, or failed to download, is a row
+    keyed by its audiobook (`{class_}/{file}`, as in the `audiobooks/`
+    directory layout) and its title, so all audiobooks are tracked in a
+    single list rather than a `files.csv` and `failures.csv` per
+    audiobook. Rows are also indexed by audiobook, so checking whether a
+    chapter has been downloaded, or listing the incomplete audiobooks,
+    doesn't need to read anything from disk.
+
+    The index is stored through the backend chosen by
+    `sibi_scraper.storage.Storage`. The first time an audiobook is looked
+    at, its per-directory lists are imported if it has any, and `export`
+    writes them back out.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path` or None
+        The path to the index's CSV file, or None until `use_file` is called.
+
+    """
+
+    _csv_fields = [
+        "ID",
+        "Audiobook",
+        "Title",
+        "English Title",
+        "Chapter",
+        "Subchapter",
+        "File Name",
+        "Failure",
+    ]
+
+    # The columns of an audiobook's files.csv (see AudioBookList).
+    _file_fields = _csv_fields[2:7]
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.path = None
+                instance.lock = threading.RLock()
+                instance.backend = None
+                instance.books = {}
+                instance.failed = {}
+                cls._instance = instance
+        return cls._instance
+
+    def use_file(self, path):
+        """Load the index from a file.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path to the index's CSV file.
+
+        """
+        with self.lock:
+            self.path = path
+            self.books = {}
+            self.failed = {}
+            self.backend = Storage().backend(path, self._csv_fields, "ID",
+                                             "audio_index")
+            for row in self.backend.load():
+                self._index(row)
+
+    def book(self, audiobook, download_dir):
+        """Return the chapters of an audiobook.
+
+        Parameters
+        ----------
+        audiobook : str
+            The audiobook, as `{class_}/{file}`.
+        download_dir : obj:`pathlib.Path`
+            The directory the audiobook's chapters are downloaded to, which
+            may hold per-directory lists to import.
+
+        Returns
+        -------
+        obj:`AudioChapters`
+            The audiobook's chapters.
+
+        """
+        with self.lock:
+            if audiobook not in self.books:
+                self.import_lists(audiobook, download_dir)
+                self.books.setdefault(audiobook, {})
+        return AudioChapters(self, audiobook, download_dir)
+
+    def import_lists(self, audiobook, download_dir):
+        """Add an audiobook's per-directory lists to the index.
+
+        Parameters
+        ----------
+        audiobook : str
+            The audiobook, as `{class_}/{file}`.
+        download_dir : obj:`pathlib.Path`
+            The directory holding the `files.csv` and `failures.csv` lists.
+
+        """
+        file_list = AudioBookList(download_dir / "files.csv", scope=audiobook)
+        failure_list = FailureList(download_dir / "failures.csv",
+                                   scope=audiobook)
+        file_list.load()
+        failure_list.load()
+
+        if not file_list.files and failure_list.isempty():
+            return
+
+        logging.debug("Importing the chapter lists of %s", audiobook)
+        with self.lock:
+            for row in file_list.files:
+                self.put(audiobook, row["Title"],
+                         **{"English Title": row["English Title"],
+                            "Chapter": row["Chapter"],
+                            "Subchapter": row["Subchapter"],
+                            "File Name": row["File Name"]})
+            for title, failure in failure_list.failures.items():
+                self.put(audiobook, title, Failure=failure)
+            self.commit()
+
+    def row(self, audiobook, title):
+        """Return the row for a chapter, or None if it is not in the index."""
+        with self.lock:
+            return self.books.get(audiobook, {}).get(title)
+
+    def put(self, audiobook, title, **values):
+        """Add or change the row for a chapter.
+
+        Nothing is written until `commit` is called.
+
+        Parameters
+        ----------
+        audiobook : str
+            The audiobook, as `{class_}/{file}`.
+        title : str
+            The title of the chapter.
+        **values
+            The new values of the row's columns, by CSV column name.
+
+        """
+        with self.lock:
+            row = self.row(audiobook, title)
+            if row is None:
+                row = dict.fromkeys(self._csv_fields, "")
+                row.update({"ID": f"{audiobook}/{title}",
+                            "Audiobook": audiobook, "Title": title})
+            row.update(values)
+            self._index(row)
+            self.backend.put(row["ID"], row)
+
+    def remove(self, audiobook, title):
+        """Remove the row for a chapter, if there is one."""
+        with self.lock:
+            row = self.books.get(audiobook, {}).pop(title, None)
+            if row is None:
+                return
+            self.failed.get(audiobook, set()).discard(title)
+            self.backend.delete(row["ID"])
+
+    def commit(self):
+        """Durably record every change made since the last commit."""
+        with self.lock:
+            self.backend.commit()
+
+    def compact(self):
+        """Bring the index's CSV file up to date."""
+        with self.lock:
+            if self.backend is not None:
+                self.backend.compact()
+
+    def incomplete(self):
+        """Return the audiobooks with chapters that failed to download.
+
+        Returns
+        -------
+        dict
+            The titles of the failed chapters, by audiobook.
+
+        """
+        with self.lock:
+            return {audiobook: sorted(titles)
+                    for audiobook, titles in sorted(self.failed.items())
+                    if titles}
+
+    def export(self, audiobook, download_dir):
+        """Write an audiobook's `files.csv` and `failures.csv` lists.
+
+        The lists have the same columns as `AudioBookList` and `FailureList`,
+        and `failures.csv` is removed if no chapters failed.
+
+        Parameters
+        ----------
+        audiobook : str
+            The audiobook, as `{class_}/{file}`.
+        download_dir : obj:`pathlib.Path`
+            The directory to write the lists to.
+
+        """
+        with self.lock:
+            rows = list(self.books.get(audiobook, {}).values())
+
+        write_csv(download_dir / "files.csv", self._file_fields,
+                  [{field: row[field] for field in self._file_fields}
+                   for row in rows if row["File Name"] and not row["Failure"]])
+
+        failures = [{"Title": row["Title"], "Failure": row["Failure"]}
+                    for row in rows if row["Failure"]]
+        failures_path = download_dir / "failures.csv"
+        if failures:
+            write_csv(failures_path, ["Title", "Failure"], failures)
+        else:
+            failures_path.unlink(missing_ok=True)
+
+    def export_all(self, root):
+        """Write the per-directory lists of every audiobook.
+
+        Parameters
+        ----------
+        root : obj:`pathlib.Path`
+            The directory holding the audiobooks, e.g. `audiobooks`.
+
+        Returns
+        -------
+        int
+            The number of audiobooks exported.
+
+        """
+        with self.lock:
+            audiobooks = [audiobook for audiobook, rows in self.books.items()
+                          if rows]
+        for audiobook in audiobooks:
+            self.export(audiobook, root / audiobook)
+        return len(audiobooks)
+
+    def _index(self, row):
+        audiobook, title = row["Audiobook"], row["Title"]
+        self.books.setdefault(audiobook, {})[title] = row
+        failed = self.failed.setdefault(audiobook, set())
+        if row["Failure"]:
+            failed.add(title)
+        else:
+            failed.discard(title)
+
+
+class AudioChapters:
+    """The chapters of one audiobook in the `AudioIndex`.
+
+    Attributes
+    ----------
+    index : obj:`AudioIndex`
+        The index holding the chapters.
+    audiobook : str
+        The audiobook, as `{class_}/{file}`.
+    download_dir : obj:`pathlib.Path`
+        The directory the chapters are downloaded to.
+
+    """
+
+    def __init__(self, index, audiobook, download_dir):
+        self.index = index
+        self.audiobook = audiobook
+        self.download_dir = download_dir
+
+    @property
+    def files(self):
+        """The rows of the downloaded chapters, in the order they were added."""
+        with self.index.lock:
+            rows = self.index.books.get(self.audiobook, {}).values()
+            return [row for row in rows
+                    if row["File Name"] and not row["Failure"]]
+
+    @property
+    def failures(self):
+        """The reason each failed chapter failed, by chapter title."""
+        with self.index.lock:
+            rows = self.index.books.get(self.audiobook, {}).values()
+            return {row["Title"]: row["Failure"] for row in rows
+                    if row["Failure"]}
+
+    def exists(self, title):
+        """Check whether a chapter has been downloaded."""
+        row = self.index.row(self.audiobook, title)
+        return row is not None and bool(row["File Name"]) and not row["Failure"]
+
+    def isempty(self):
+        """Check that no chapters failed to download."""
+        with self.index.lock:
+            return not self.index.failed.get(self.audiobook)
+
+    def add(self, title, english_title, chapter, subchapter, file_name):
+        """Record a downloaded chapter, clearing any earlier failure."""
+        self.index.put(self.audiobook, title, **{
+            "English Title": english_title,
+            "Chapter": chapter,
+            "Subchapter": subchapter,
+            "File Name": file_name,
+            "Failure": "",
+        })
+
+    def update(self, title, values):
+        """Change the columns of a chapter's row, by CSV column name."""
+        self.index.put(self.audiobook, title, **values)
+
+    def fail(self, title, message):
+        """Record why a chapter could not be downloaded."""
+        self.index.put(self.audiobook, title, Failure=message)
+
+    def clear_failures(self, keep):
+        """Forget failed chapters that were not tried again.
+
+        Parameters
+        ----------
+        keep : obj:`set` of str
+            The titles of the chapters that were tried again, whose rows
+            have already been brought up to date.
+
+        """
+        with self.index.lock:
+            for title in list(self.failures):
+                if title not in keep:
+                    self.index.remove(self.audiobook, title)
+
+    def save(self):
+        """Record every change to the index in one write."""
+        self.index.commit()
+
+    def export(self):
+        """Write the audiobook's per-directory lists."""
+        self.index.export(self.audiobook, self.download_dir)
@@ -0,0 +1,292 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from sibi_scraper.storage import Storage
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file's contents.
+
+    The file is read in `CHUNK_SIZE` pieces, and hashlib releases the GIL
+    while hashing pieces that large, so several files can be hashed at once
+    in threads.
+
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """A singleton, content-addressed store for downloaded files.
+
+    Once `use_directory` has been called, every downloaded file is stored
+    once under `{path}/{sha256[:2]}/{sha256}` and the file in the usual
+    `books/` or `audiobooks/` layout becomes a link to it: a hard link where
+    possible, otherwise (or if asked for) a symbolic link. Identical files
+    downloaded for several classes or categories therefore only take up
+    space once, and the page count of a PDF only has to be worked out the
+    first time it is seen.
+
+    The hash, size and page count of every blob are kept in an index,
+    stored through the backend chosen by `sibi_scraper.storage.Storage`.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path` or None
+        The directory holding the blobs, or None if the store is not used.
+    symlink : bool
+        True if files should be symbolic rather than hard links to blobs.
+    duplicates : int
+        The number of files found to be identical to an existing blob.
+    bytes_saved : int
+        The number of bytes not stored again thanks to duplicates.
+
+    """
+
+    _csv_fields = [
+        "SHA-256",
+        "Size",
+        "Pages",
+    ]
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.path = None
+                instance.symlink = False
+                instance.lock = threading.RLock()
+                instance.backend = None
+                instance.blobs = {}
+                instance.duplicates = 0
+                instance.bytes_saved = 0
+                cls._instance = instance
+        return cls._instance
+
+    def use_directory(self, path, *, symlink=False):
+        """Store downloaded files in a content-addressed directory.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path` or None
+            The directory to keep the blobs in, which is created if
+            necessary, or None to stop using the store.
+        symlink : bool
+            True to always link files to blobs with symbolic links.
+
+        """
+        with self.lock:
+            self.path = path
+            self.symlink = symlink
+            self.blobs = {}
+            self.backend = None
+
+            if path is None:
+                return
+
+            path.mkdir(parents=True, exist_ok=True)
+            self.backend = Storage().backend(path / "blobs.csv",
+                                             self._csv_fields, "SHA-256",
+                                             "blobs")
+            for row in self.backend.load():
+                self.blobs[row["SHA-256"]] = row
+
+    def blob_path(self, digest):
+        """Return the path of the blob with the given SHA-256 hex digest."""
+        return self.path / digest[:2] / digest
+
+    def pages(self, digest):
+        """Return the known page count of a blob, or None if it is unknown."""
+        with self.lock:
+            row = self.blobs.get(digest)
+            return int(row["Pages"]) if row and row["Pages"] else None
+
+    def set_pages(self, digest, pages):
+        """Remember the page count of a blob.
+
+        Parameters
+        ----------
+        digest : str
+            The SHA-256 hex digest of the blob.
+        pages : int
+            The number of pages in the PDF.
+
+        """
+        with self.lock:
+            row = self.blobs.get(digest)
+            if row is None or row["Pages"] == str(pages):
+                return
+            row["Pages"] = str(pages)
+            self.backend.put(digest, row)
+            self.backend.commit()
+
+    def add(self, target, digest):
+        """Move a downloaded file into the store and link it back.
+
+        If a blob with the same hash is already stored, the downloaded copy
+        is replaced by a link to it. The file at `target` is replaced
+        atomically, so it never goes missing.
+
+        Parameters
+        ----------
+        target : obj:`pathlib.Path`
+            The downloaded file.
+        digest : str
+            The SHA-256 hex digest of the file's contents.
+
+        Returns
+        -------
+        bool
+            True if the file was a duplicate of an existing blob.
+
+        """
+        blob = self.blob_path(digest)
+
+        with self.lock:
+            if blob.is_file() and blob.samefile(target):
+                return False
+
+            size = target.stat().st_size
+            duplicate = blob.is_file()
+
+            if duplicate:
+                logging.info("%s is a duplicate of %s", target, blob)
+                self.duplicates += 1
+                self.bytes_saved += size
+                self._link(blob, target)
+            else:
+                blob.parent.mkdir(exist_ok=True)
+                if not self._hard_link(target, blob):
+                    temp = blob.with_name(f"{blob.name}.tmp")
+                    shutil.copyfile(target, temp)
+                    temp.replace(blob)
+                    self._link(blob, target)
+
+            if digest not in self.blobs:
+                self.blobs[digest] = dict(zip(self._csv_fields,
+                                              [digest, str(size), ""]))
+                self.backend.put(digest, self.blobs[digest])
+                self.backend.commit()
+
+        return duplicate
+
+    def remove(self, digest, target):
+        """Drop a blob that a damaged file is linked to.
+
+        Nothing is removed unless `target` really is a link to the blob, so
+        the next download of the same contents is stored afresh rather than
+        linked to the damaged copy.
+
+        Parameters
+        ----------
+        digest : str
+            The SHA-256 hex digest the blob was stored under.
+        target : obj:`pathlib.Path`
+            The damaged file.
+
+        Returns
+        -------
+        bool
+            True if the blob was removed.
+
+        """
+        blob = self.blob_path(digest)
+
+        with self.lock:
+            try:
+                if not blob.samefile(target):
+                    return False
+            except OSError:
+                return False
+
+            logging.warning("Removing damaged blob %s", blob)
+            blob.unlink()
+            if self.blobs.pop(digest, None) is not None:
+                self.backend.delete(digest)
+                self.backend.commit()
+        return True
+
+    def adopt(self, target):
+        """Hash an existing file and add it to the store.
+
+        Parameters
+        ----------
+        target : obj:`pathlib.Path`
+            The file to add.
+
+        Returns
+        -------
+        str
+            The SHA-256 hex digest of the file.
+
+        """
+        digest = file_sha256(target)
+        self.add(target, digest)
+        return digest
+
+    def import_tree(self, root):
+        """Add every downloaded file under a directory to the store.
+
+        The scraper's own CSV, journal and partial download files are left
+        alone, as are files that are already links to a blob.
+
+        Parameters
+        ----------
+        root : obj:`pathlib.Path`
+            The directory to import, e.g. `books`.
+
+        Returns
+        -------
+        int
+            The number of files imported.
+
+        """
+        imported = 0
+        for target in sorted(root.rglob("*")):
+            if (not target.is_file() or target.is_symlink()
+                    or target.suffix in {".csv", ".journal", ".part", ".json"}
+                    or target.stat().st_nlink > 1):
+                continue
+            self.adopt(target)
+            imported += 1
+        return imported
+
+    def compact(self):
+        """Rewrite the index's CSV file."""
+        with self.lock:
+            if self.backend is not None:
+                self.backend.compact()
+
+    def log_stats(self):
+        """Log how much space the store has saved."""
+        logging.info("Blob store: %d blobs, %d duplicates, %.1f MB saved",
+                     len(self.blobs), self.duplicates, self.bytes_saved / 1e6)
+
+    def _link(self, blob, target):
+        temp = target.with_name(f".{target.name}.link")
+        temp.unlink(missing_ok=True)
+        if not self._hard_link(blob, temp):
+            temp.symlink_to(blob.resolve())
+        temp.replace(target)
+
+    def _hard_link(self, source, destination):
+        if self.symlink:
+            return False
+        try:
+            os.link(source, destination)
+        except OSError as e:
+            # Most likely the store is on a different filesystem.
+            logging.debug("Unable to hard link %s: %s", destination, e)
+            return False
+        return True
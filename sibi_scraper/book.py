@@ -1,10 +1,11 @@
 # pylint: disable=too-many-arguments
 import datetime
+import hashlib
 import re
+import time
 import urllib.parse
 from pathlib import Path
 
-import googletrans
 import httpx
 import PyPDF2
 from tenacity import (
@@ -14,8 +15,12 @@ from tenacity import (
     wait_exponential,
 )
 
+from sibi_scraper import pdf
+from sibi_scraper.blob_store import BlobStore
+from sibi_scraper.download import fetch_to_file
 from sibi_scraper.errors import ScraperError
-from sibi_scraper.web import Session
+from sibi_scraper.metrics import Metrics, record_retry
+from sibi_scraper.translation import translate_text
 
 
 class Book:
@@ -37,8 +42,13 @@ class Book:
         The filename of the downloaded book.
     isbn : str
         The ISBN of the book (if published).
+    local_path : obj:`pathlib.Path`
+        Where the book PDF was downloaded to, once it has been downloaded.
     pages : str
         The number of pages in the book.
+    sha256 : str or None
+        The SHA-256 hex digest of the downloaded PDF, if it was added to the
+        `BlobStore`.
     title : str
         The title of the book.
     type_ : str
@@ -97,20 +107,26 @@ class Book:
         self.type_ = type_
         self.level = level
         self.subject = subject
+        self.local_path = None
+        self.sha256 = None
 
     @classmethod
-    def from_api(cls, json_blob):
+    def from_api(cls, json_blob, *, validate=True):
         """
         Initialise a Book from the result of a SIBI API query.
 
-        After initialisation the title is translated into English, the book PDF
-        is downloaded, and the number of pages in the PDF is counted.
+        After initialisation the book PDF is downloaded and the number of
+        pages in the PDF is counted. The English title is left blank, to be
+        filled in later by `Scraper.translate_missing`.
 
         Parameters
         ----------
         json_blob : dict
             A dictionary of values representing a Book as returned by an API
             call from SIBI.
+        validate : bool
+            False to leave counting the pages (and so checking that the PDF
+            is readable) to the caller.
 
         Returns
         -------
@@ -139,10 +155,9 @@ class Book:
         new_book = cls(**params)
 
         new_book.set_category(json_blob["category"])
-        new_book.english_title = new_book.translate(new_book.title)
 
         try:
-            if new_book.download_file():
+            if new_book.download_file(validate=validate):
                 return new_book
         except httpx.ReadTimeout as e:
             raise ScraperError(params["title"],
@@ -150,17 +165,14 @@ class Book:
                                ) from e
         return None
 
-    @retry(wait=wait_exponential(multiplier=1, min=2, max=10),
-           stop=stop_after_attempt(3),
-           retry=retry_if_exception_type((
-               httpx.ConnectError,
-               httpx.ReadTimeout,
-               TimeoutError)),
-           reraise=True)
     def translate(self, text):
-        """Translate the given text to English using Google Translate."""
-        translator = googletrans.Translator()
-        return translator.translate(text, src="id", dest="en").text
+        """Translate the given text to English using Google Translate.
+
+        Translations are memoised in the persistent `TranslationCache`, so
+        titles that have been seen before do not need a network round trip.
+
+        """
+        return translate_text(text, src="id", dest="en")
 
     def set_category(self, category):
         """Translate the Book category from the API response.
@@ -194,16 +206,28 @@ class Book:
            stop=stop_after_attempt(3),
            retry=retry_if_exception_type((
                httpx.ConnectError,
+               httpx.ReadError,
                httpx.ReadTimeout,
+               httpx.RemoteProtocolError,
                TimeoutError)),
+           before_sleep=record_retry,
            reraise=True)
-    def download_file(self):
+    def download_file(self, *, validate=True):
         """Download the book PDF.
 
         The PDF will be downloaded to a folder relative to the current working
         directory as follows:
             {CWD}/books/{class_}/{filename}
 
+        If the `BlobStore` is in use, the PDF is hashed as it is downloaded
+        and added to the store, and a known page count for the same contents
+        is reused rather than counted again.
+
+        Parameters
+        ----------
+        validate : bool
+            False to skip counting the pages of the downloaded PDF.
+
         Returns
         -------
         bool
@@ -218,33 +242,60 @@ class Book:
         local_path = Path("books") / self.class_ / filename
         download_dir = local_path.parent
 
-        if not download_dir.is_dir():
-            download_dir.mkdir(parents=True)
+        # Other workers may be creating the same directory.
+        download_dir.mkdir(parents=True, exist_ok=True)
 
-        response = Session().session.get(self.file)
+        store = BlobStore()
+        digest = hashlib.sha256() if store.path is not None else None
+        started = time.monotonic()
+        response = fetch_to_file(self.file, local_path, digest)
+        self.record_download(response, time.monotonic() - started)
 
-        if not response.ok:
+        if not response.is_success:
             raise ScraperError(self.title,
                                f"Unable to download {self.file}: "
                                f"error {response.status_code}")
 
-        with local_path.open("wb") as local_file:
-            local_file.write(response.content)
+        if digest is not None:
+            self.sha256 = digest.hexdigest()
+            store.add(local_path, self.sha256)
 
-        try:
-            self.pages = self.get_book_length(local_path)
-        except PyPDF2.errors.PdfReadError as e:
-            raise ScraperError(self.title, f"Corrupt PDF: {self.file}") from e
+        if validate:
+            try:
+                self.pages = self.get_book_length(local_path)
+            except PyPDF2.errors.PdfReadError as e:
+                raise ScraperError(self.title,
+                                   f"Corrupt PDF: {self.file}") from e
 
         self.file = filename
+        self.local_path = local_path
         return True
 
+    def record_download(self, response, seconds):
+        """Record the size and duration of a download in the `Metrics`.
+
+        Parameters
+        ----------
+        response : obj:`httpx.Response`
+            The response the file was downloaded from.
+        seconds : float
+            How long the download took.
+
+        """
+        labels = {"type": self.type_, "class_": self.class_,
+                  "category": self.category}
+        Metrics().inc("sibi_downloaded_bytes_total",
+                      response.num_bytes_downloaded, **labels)
+        Metrics().observe("sibi_download_seconds", seconds, **labels)
+        Metrics().inc("sibi_downloads_total",
+                      status=response.status_code, **labels)
+
     def get_book_length(self, path):
         """Read a PDF to determine the number of pages.
 
         Parameters
         ----------
-        path : str
+        path : obj:`pathlib.Path`
             The path to the PDF.
 
         Returns
@@ -252,9 +303,20 @@ class Book:
         int
             The number of pages in the PDF.
 
+        Raises
+        ------
+        PyPDF2.errors.PdfReadError
+            If the PDF is truncated or cannot be read.
+
         """
-        reader = PyPDF2.PdfReader(path)
-        return len(reader.pages)
+        store = BlobStore()
+        pages = store.pages(self.sha256) if self.sha256 else None
+        if pages is None:
+            with Metrics().time("sibi_pdf_parse_seconds"):
+                pages = pdf.page_count(path)
+            if self.sha256:
+                store.set_pages(self.sha256, pages)
+        return pages
 
     def safe_path(self, name):
         """Convert a string into a safe path name.
@@ -1,7 +1,8 @@
-import csv
 import logging
+import time
 
 from sibi_scraper.book import Book
+from sibi_scraper.storage import Storage
 
 
 class BookList:
@@ -14,8 +15,42 @@ class BookList:
     books : obj:`list` of obj:`sibi_scraper.book.Book`
         The list of Books that have been scraped.
 
+    Lookups by title are served from a hash index, with secondary indexes on
+    ISBN, file name and class. The indexes are maintained by `load`, `add`,
+    `update` and `remove`, so any change to a Book in the list must go through
+    `update`.
+
+    The list is stored through the backend chosen by
+    `sibi_scraper.storage.Storage`. With the default CSV backend, `save`
+    appends changes to a journal next to the CSV file, and the CSV is only
+    rewritten by `compact` once the journal has grown as large as the list
+    itself. With the SQLite backend, `save` commits the changes in a single
+    transaction and `compact` exports the table to the CSV file.
+
+    Changes that don't need to be durable straight away, such as metadata
+    filled in from the catalogue, can be saved with `save_if_due` instead,
+    which only saves once enough changes have built up or enough time has
+    passed since the last save.
+
     """
 
+    _indexed_attrs = ["title", "isbn", "file", "class_"]
+
+    _book_attrs = [
+        "title",
+        "class_",
+        "isbn",
+        "edition",
+        "file",
+        "pages",
+        "english_title",
+        "date_downloaded",
+        "category",
+        "type_",
+        "level",
+        "subject",
+    ]
+
     _csv_fields = [
         "Book List Title",
         "Class",
@@ -31,56 +66,72 @@ class BookList:
         "Subject",
     ]
 
-    def __init__(self, path):
+    def __init__(self, path, compact_min=1000, save_every=1000,
+                 save_interval=60):
         """Initialise a new BookList.
 
         Parameters
         ----------
         path : str
             The path to the CSV file where the book list is stored.
+        compact_min : int
+            The smallest number of journal entries that will trigger a
+            compaction.
+        save_every : int
+            The number of unsaved changes that makes `save_if_due` save.
+        save_interval : float
+            The number of seconds since the last save that makes
+            `save_if_due` save.
 
         """
         self.path = path.resolve()
         self.books = []
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.dirty = set()
+        self.changed = set()
+        self._saved_at = time.monotonic()
+        self.backend = Storage().backend(self.path, self._csv_fields,
+                                         "Book List Title", "books",
+                                         compact_min=compact_min)
+        self._indexes = {attr: {} for attr in self._indexed_attrs}
 
     def load(self):
-        """Load the data from the CSV file into the BookList."""
-        if not self.path.is_file():
-            return
-
+        """Load the data from the backend into the BookList."""
         logging.debug("Loading %s", self.path)
-        with self.path.open(newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                book = Book(
-                    title=row["Book List Title"],
-                    class_=row["Class"],
-                    isbn=row["ISBN"],
-                    edition=row["Edition"],
-                    file=row["File Name"],
-                    pages=row["Pages"],
-                    english_title=row["English Title"],
-                    date_downloaded=row["Date Downloaded"],
-                    category=row["Category"],
-                    type_=row["Type"],
-                    level=row["Level"],
-                    subject=row["Subject"],
-                )
-                self.books.append(book)
+        for row in self.backend.load():
+            self._add(self.csv_to_book(row))
 
     def save(self):
-        """Save the BookList into the CSV file."""
+        """Durably record every change made since the last save."""
         logging.debug("Saving %s", self.path)
+        self.backend.commit()
+        self.dirty.clear()
+        self._saved_at = time.monotonic()
+
+    def save_if_due(self):
+        """Save if there are enough unsaved changes, or they are old enough.
+
+        Returns
+        -------
+        bool
+            True if the book list was saved.
+
+        """
+        if not self.dirty:
+            return False
 
-        parent = self.path.parent
-        if not parent.is_dir():
-            parent.mkdir(parents=True)
+        if (len(self.dirty) < self.save_every
+                and time.monotonic() - self._saved_at < self.save_interval):
+            return False
 
-        with self.path.open("w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self._csv_fields)
-            writer.writeheader()
-            for book in self.books:
-                writer.writerow(self.book_to_csv(book))
+        self.save()
+        return True
+
+    def compact(self):
+        """Bring the CSV file up to date with every change in the BookList."""
+        logging.debug("Compacting %s", self.path)
+        self.backend.compact()
 
     def book_to_csv(self, book):
         """Convert a Book into a format suitable for saving to the CSV file.
@@ -97,23 +148,28 @@ class BookList:
             to the CSV file.
 
         """
-        values = [
-            book.title,
-            book.class_,
-            book.isbn,
-            book.edition,
-            book.file,
-            book.pages,
-            book.english_title,
-            book.date_downloaded,
-            book.category,
-            book.type_,
-            book.level,
-            book.subject,
-        ]
+        values = [getattr(book, attr) for attr in self._book_attrs]
 
         return dict(zip(self._csv_fields, values))
 
+    def csv_to_book(self, row):
+        """Convert a row from the CSV file into a Book.
+
+        Parameters
+        ----------
+        row : dict
+            The CSV row, keyed by column name.
+
+        Returns
+        -------
+        obj:`sibi_scraper.book.Book`
+            The Book described by the row.
+
+        """
+        values = [row.get(field) for field in self._csv_fields]
+
+        return Book(**dict(zip(self._book_attrs, values)))
+
     def exists(self, book_title):
         """Check if there is a book with the given title in the list.
 
@@ -129,7 +185,7 @@ class BookList:
             list, otherwise False.
 
         """
-        return any(filter(lambda r: r.title == book_title, self.books))
+        return bool(self._indexes["title"].get(book_title))
 
     def add(self, new_book):
         """Add a Book to the book list.
@@ -140,7 +196,58 @@ class BookList:
             The book to be added to the book list.
 
         """
-        self.books.append(new_book)
+        self._add(new_book)
+        self._touch(new_book.title)
+        self.backend.put(new_book.title, self.book_to_csv(new_book))
+
+    def update(self, book, **values):
+        """Change attributes of a Book in the book list.
+
+        Parameters
+        ----------
+        book : obj:`sibi_scraper.book.Book`
+            The book to change, which must already be in the book list.
+        **values
+            The new values of the Book attributes, by attribute name.
+
+        """
+        key = book.title
+        self._update(book, values)
+        self._touch(book.title)
+        self.backend.put(key, self.book_to_csv(book))
+
+    def remove(self, book):
+        """Remove a Book from the book list.
+
+        Parameters
+        ----------
+        book : obj:`sibi_scraper.book.Book`
+            The book to remove, which must be in the book list.
+
+        """
+        self.books = [b for b in self.books if b is not book]
+        for attr in self._indexes:
+            self._unindex(book, attr)
+        self._touch(book.title)
+        self.backend.delete(book.title)
+
+    def _touch(self, title):
+        self.dirty.add(title)
+        self.changed.add(title)
+
+    def _add(self, book):
+        self.books.append(book)
+        for attr in self._indexes:
+            self._index(book, attr)
+
+    def _update(self, book, values):
+        for attr, value in values.items():
+            if attr in self._indexes:
+                self._unindex(book, attr)
+                setattr(book, attr, value)
+                self._index(book, attr)
+            else:
+                setattr(book, attr, value)
 
     def get(self, title):
         """Return a book from the book list.
@@ -157,4 +264,30 @@ class BookList:
 
         """
 
-        return list(filter(lambda r: r.title == title, self.books))[0]
+        return self._indexes["title"][title][0]
+
+    def find(self, attr, value):
+        """Return every book with the given value of an indexed attribute.
+
+        Parameters
+        ----------
+        attr : str
+            The name of the Book attribute: "title", "isbn", "file" or
+            "class_".
+        value : str
+            The value to look for.
+
+        Returns
+        -------
+        obj:`list` of obj:`sibi_scraper.book.Book`
+            The matching books, in the order that they were added.
+
+        """
+        return list(self._indexes[attr].get(value, []))
+
+    def _index(self, book, attr):
+        self._indexes[attr].setdefault(getattr(book, attr), []).append(book)
+
+    def _unindex(self, book, attr):
+        matches = self._indexes[attr].get(getattr(book, attr), [])
+        matches[:] = [b for b in matches if b is not book]
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class Checkpoint:
+    """How far a scrape has got, so that an interrupted run can be resumed.
+
+    The checkpoint records the catalogue searches that have finished, with
+    the high-water mark and titles needed to advance their marks (see
+    `Scraper.advance_marks`), and every book that has been found but not yet
+    downloaded or recorded as a failure.
+
+    It is kept in memory and written out as a single JSON file whenever a
+    search finishes, at most every `interval` seconds as books are handled,
+    and by `save`. A book handled since the last write is simply found to
+    be in the book list again when the run is resumed, and a search that
+    had not finished is run again, so losing the changes since the last
+    write costs time but loses nothing.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the checkpoint file.
+    interval : float
+        The most seconds that handled books go unwritten.
+    queries : dict
+        The `newest` mark and `titles` found by each finished search, by key.
+    pending : dict
+        The API result of each book found but not yet handled, by book key.
+
+    """
+
+    def __init__(self, path, interval=10):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.queries = {}
+        self.pending = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def load(self):
+        """Read the checkpoint left by an earlier run.
+
+        Returns
+        -------
+        bool
+            True if there was a checkpoint to read.
+
+        """
+        try:
+            with self.path.open(encoding="utf-8") as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable checkpoint %s: %s",
+                            self.path, e)
+            return False
+
+        with self.lock:
+            self.queries = state.get("queries", {})
+            self.pending = state.get("pending", {})
+        return True
+
+    def complete_query(self, key, newest, titles):
+        """Record a finished search and write the checkpoint.
+
+        Parameters
+        ----------
+        key : str
+            The key of the search's high-water mark.
+        newest : str or None
+            The newest `updated_at` the search returned.
+        titles : obj:`list` of str
+            The titles of the books the search queued.
+
+        """
+        with self.lock:
+            self.queries[key] = {"newest": newest, "titles": titles}
+            self._dirty = True
+        self.save()
+
+    def add(self, key, book_json):
+        """Record a book that has been found and queued for download."""
+        with self.lock:
+            self.pending[key] = book_json
+            self._dirty = True
+        self.save_if_due()
+
+    def finish(self, key):
+        """Record that a book has been downloaded, failed or skipped."""
+        with self.lock:
+            if self.pending.pop(key, None) is not None:
+                self._dirty = True
+        self.save_if_due()
+
+    def save_if_due(self):
+        """Write the checkpoint if it has not been written for a while."""
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self):
+        """Atomically write the checkpoint, if anything has changed."""
+        with self.lock:
+            if not self._dirty:
+                return
+            state = {"queries": self.queries, "pending": self.pending}
+
+            new_file = self.path.with_name(f"{self.path.name}.new")
+            with new_file.open("w", encoding="utf-8") as checkpoint_file:
+                json.dump(state, checkpoint_file)
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            new_file.replace(self.path)
+
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def clear(self):
+        """Forget the checkpoint, once a run has finished."""
+        with self.lock:
+            self.queries = {}
+            self.pending = {}
+            self._dirty = False
+            self.path.unlink(missing_ok=True)
@@ -1,15 +1,30 @@
 import argparse
-import csv
 import logging
 from pathlib import Path
 
+from sibi_scraper.blob_store import BlobStore
+from sibi_scraper.metrics import Metrics
 from sibi_scraper.scraper import Scraper
+from sibi_scraper.storage import Storage
+from sibi_scraper.translation import TranslationCache
+from sibi_scraper.web import Session
 
 
-def main():
+def build_parser():
+    """Return the parser for the command line arguments."""
     parser = argparse.ArgumentParser(
         prog="sibi_scraper",
         description="Scrape books from SIBI for TIB.")
+    parser.add_argument("command", nargs="?",
+                        choices=["scrape", "verify", "incomplete-audio",
+                                 "export-audio"],
+                        default="scrape",
+                        help="scrape the catalogue (the default); check that "
+                             "downloaded files are intact and queue any "
+                             "missing or corrupt ones for download; list the "
+                             "audiobooks with chapters that failed to "
+                             "download; or write the files.csv and "
+                             "failures.csv of every audiobook")
     parser.add_argument("-c", "--class", choices=Scraper.CLASSES,
                         dest="classes", nargs="+", type=str,
                         help="the class of text books to scrape")
@@ -19,11 +34,107 @@ def main():
     parser.add_argument("--debug", action="store_true", dest="debug",
                         help="Enable debug logging")
     parser.add_argument("--update-metadata-only", action="store_true",
-                        dest="update_metadata_only", help="Update CSV metadata only")
+                        dest="update_metadata_only",
+                        help="Update CSV metadata only, looking at every "
+                             "book in the catalogue")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        dest="workers",
+                        help="the number of books to download concurrently")
+    parser.add_argument("--pool-size", type=int, default=10, dest="pool_size",
+                        help="the number of keep-alive connections per host")
+    parser.add_argument("--http2", action="store_true", dest="http2",
+                        help="use HTTP/2 where the server supports it")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv",
+                        dest="storage",
+                        help="where to keep the book and failure lists")
+    parser.add_argument("--database", type=Path,
+                        default=Path("sibi_scraper.db"), dest="database",
+                        help="the SQLite database used by --storage sqlite")
+    parser.add_argument("--translation-cache-size", type=int, default=100_000,
+                        dest="translation_cache_size",
+                        help="the number of translations to remember")
+    parser.add_argument("--translate-workers", type=int, default=4,
+                        dest="translate_workers",
+                        help="the number of titles to translate concurrently")
+    parser.add_argument("--validate-workers", type=int, default=None,
+                        dest="validate_workers",
+                        help="the number of processes checking downloaded "
+                             "PDFs (default: one per CPU)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        dest="queue_size",
+                        help="the number of items that can wait for each "
+                             "pipeline stage (default: twice its workers)")
+    parser.add_argument("--stats-interval", type=float, default=30,
+                        dest="stats_interval",
+                        help="seconds between pipeline statistics log lines")
+    parser.add_argument("--resume", action="store_true", dest="resume",
+                        help="carry on from where an interrupted run "
+                             "stopped")
+    parser.add_argument("--full-resync", action="store_true",
+                        dest="full_resync",
+                        help="look at every book in the catalogue, not just "
+                             "those changed since the last run")
+    parser.add_argument("--page-size", type=int, default=100,
+                        dest="page_size",
+                        help="the number of books to request from the "
+                             "catalogue at a time")
+    parser.add_argument("--discover-workers", type=int, default=4,
+                        dest="discover_workers",
+                        help="the number of catalogue searches to run "
+                             "concurrently")
+    parser.add_argument("--audio-workers", type=int, default=4,
+                        dest="audio_workers",
+                        help="the number of chapters of each audiobook to "
+                             "download concurrently")
+    parser.add_argument("--http-cache", type=Path,
+                        default=Path("sibi_http_cache"), dest="http_cache",
+                        help="the directory caching catalogue responses")
+    parser.add_argument("--no-http-cache", action="store_const", const=None,
+                        dest="http_cache",
+                        help="do not cache catalogue responses")
+    parser.add_argument("--offline", action="store_true", dest="offline",
+                        help="only use cached catalogue responses; implies "
+                             "--update-metadata-only")
+    parser.add_argument("--blob-store", type=Path, default=None,
+                        dest="blob_store",
+                        help="store downloaded files once each, in a "
+                             "content-addressed directory, and link to them")
+    parser.add_argument("--symlink-blobs", action="store_true",
+                        dest="symlink_blobs",
+                        help="link to the blob store with symbolic rather "
+                             "than hard links")
+    parser.add_argument("--import-blobs", action="store_true",
+                        dest="import_blobs",
+                        help="move files already downloaded into the blob "
+                             "store before scraping")
+    parser.add_argument("--hash-workers", type=int, default=4,
+                        dest="hash_workers",
+                        help="the number of files to hash concurrently when "
+                             "verifying")
+    parser.add_argument("--metrics-json", type=Path, default=None,
+                        dest="metrics_json",
+                        help="write a JSON summary of the run's metrics here")
+    parser.add_argument("--metrics-textfile", type=Path, default=None,
+                        dest="metrics_textfile",
+                        help="write the run's metrics here in the Prometheus "
+                             "text format, for the node exporter's textfile "
+                             "collector")
+    parser.add_argument("--translate-only", action="store_true",
+                        dest="translate_only",
+                        help="only fill in missing English titles")
+    return parser
+
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
 
     book_list = Path("sibi_book_list.csv")
     failure_list = Path("sibi_failures.csv")
+    sync_state = Path("sibi_sync_state.csv")
+    manifest = Path("sibi_manifest.csv")
+    audio_index = Path("sibi_audio_index.csv")
+    checkpoint = Path("sibi_checkpoint.json")
 
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
@@ -32,68 +143,61 @@ def main():
                             level=logging.INFO)
         logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    # Temp migrations
-    add_level_column(book_list)
-    add_subject_column(book_list)
-
-    Scraper(args.classes, args.non_text_levels, book_list, failure_list).run(args.update_metadata_only)
-
-
-def add_level_column(book_list):
-    if not book_list.is_file():
-        return
-
-    new_file = Path(f"{book_list}.new")
-
-    with book_list.open(newline="", encoding="utf-8") as csv_input:
-        reader = csv.reader(csv_input)
-        all_rows = []
-        row = next(reader)
-
-        if "Level" in row:
-            return
-
-        row.append("Level")
-        all_rows.append(row)
-
-        for row in reader:
-            row.append("")
-            all_rows.append(row)
-
-        with new_file.open("w", newline="", encoding="utf-8") as csv_output:
-            writer = csv.writer(csv_output)
-            writer.writerows(all_rows)
-
-    book_list.unlink()
-    new_file.rename(book_list)
-
-def add_subject_column(book_list):
-    if not book_list.is_file():
-        return
-
-    new_file = Path(f"{book_list}.new")
-
-    with book_list.open(newline="", encoding="utf-8") as csv_input:
-        reader = csv.reader(csv_input)
-        all_rows = []
-        row = next(reader)
-
-        if "Subject" in row:
-            return
-
-        row.append("Subject")
-        all_rows.append(row)
-
-        for row in reader:
-            row.append("")
-            all_rows.append(row)
-
-        with new_file.open("w", newline="", encoding="utf-8") as csv_output:
-            writer = csv.writer(csv_output)
-            writer.writerows(all_rows)
+    Session().configure(pool_size=args.pool_size, http2=args.http2)
+    if args.offline and args.http_cache is None:
+        parser.error("--offline needs the HTTP cache")
+    Session().use_cache(args.http_cache, offline=args.offline)
+
+    if args.storage == "sqlite":
+        Storage().use_sqlite(args.database)
+
+    if args.import_blobs and args.blob_store is None:
+        parser.error("--import-blobs needs --blob-store")
+    BlobStore().use_directory(args.blob_store, symlink=args.symlink_blobs)
+    if args.import_blobs:
+        for root in [Path("books"), Path("audiobooks")]:
+            if root.is_dir():
+                logging.info("Imported %d files from %s into the blob store",
+                             BlobStore().import_tree(root), root)
+        BlobStore().compact()
+
+    Metrics().use_files(args.metrics_json, args.metrics_textfile)
+
+    TranslationCache().use_database(Path("sibi_translations.db"),
+                                    max_entries=args.translation_cache_size)
+
+    scraper = Scraper(args.classes, args.non_text_levels, book_list,
+                      failure_list, workers=args.workers,
+                      translate_workers=args.translate_workers,
+                      validate_workers=args.validate_workers,
+                      queue_size=args.queue_size,
+                      stats_interval=args.stats_interval,
+                      sync_state_file=sync_state,
+                      full_resync=args.full_resync,
+                      page_size=args.page_size,
+                      discover_workers=args.discover_workers,
+                      audio_workers=args.audio_workers,
+                      audio_index_file=audio_index,
+                      checkpoint_file=checkpoint,
+                      resume=args.resume)
+
+    run_command(scraper, args, manifest)
+
+
+def run_command(scraper, args, manifest):
+    """Run the command chosen on the command line."""
+    if args.command == "verify":
+        scraper.verify(manifest, workers=args.hash_workers)
+    elif args.command == "incomplete-audio":
+        scraper.log_incomplete_audio_books()
+    elif args.command == "export-audio":
+        logging.info("Exported the chapter lists of %d audiobooks",
+                     scraper.export_audio_lists())
+    elif args.translate_only:
+        scraper.translate()
+    else:
+        scraper.run(args.update_metadata_only or args.offline)
 
-    book_list.unlink()
-    new_file.rename(book_list)
 
 if __name__ == "__main__":
     main()
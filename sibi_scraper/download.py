@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+
+from sibi_scraper.web import Session
+
+CHUNK_SIZE = 64 * 1024
+
+HTTP_PARTIAL_CONTENT = 206
+HTTP_RANGE_NOT_SATISFIABLE = 416
+
+
+def fetch_to_file(url, path, digest=None):
+    """Stream a URL to disk, resuming any earlier interrupted download.
+
+    The body is written in `CHUNK_SIZE` pieces to `{path}.part`. If the
+    transfer is interrupted the part file is kept, along with the server's
+    `ETag` and `Last-Modified` validators in `{path}.part.json`. The next call
+    for the same path asks the server for just the missing bytes with a
+    `Range` request, and falls back to downloading the whole file if the
+    server ignores the range or the file has changed since.
+
+    Once the body is complete the part file is fsynced and atomically renamed
+    over `path`, so a file under its final name is always complete.
+
+    Parameters
+    ----------
+    url : str
+        The URL to download.
+    path : obj:`pathlib.Path`
+        Where to save the downloaded file.
+    digest : obj:`hashlib._Hash`, optional
+        A hash object (e.g. `hashlib.sha256()`) to update with the contents
+        of the file as it is written, including any part downloaded earlier.
+
+    Returns
+    -------
+    obj:`httpx.Response`
+        The (closed) response from the server. The file is only written if
+        `response.is_success` is True.
+
+    """
+    part = PartFile(path)
+    headers = part.resume_headers(url)
+
+    with Session().stream(url, headers=headers) as response:
+        offset = part.resume_offset(response)
+
+        if headers and (offset is None or response.status_code
+                        == HTTP_RANGE_NOT_SATISFIABLE):
+            logging.debug("Server rejected resume of %s, starting over", url)
+            part.discard()
+            response.close()
+            return fetch_to_file(url, path, digest)
+
+        if not response.is_success:
+            return response
+
+        part.save_validators(url, response)
+
+        if digest is not None and offset:
+            part.hash_prefix(digest, offset)
+
+        mode = "ab" if offset else "wb"
+        with part.path.open(mode) as part_file:
+            part_file.truncate(offset)
+            for chunk in response.iter_bytes(CHUNK_SIZE):
+                part_file.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+            part_file.flush()
+            os.fsync(part_file.fileno())
+
+    part.finalise()
+    return response
+
+
+class PartFile:
+    """A partially downloaded file and the validators needed to resume it.
+
+    Attributes
+    ----------
+    target : obj:`pathlib.Path`
+        The final path of the downloaded file.
+    path : obj:`pathlib.Path`
+        The path of the partially downloaded data.
+    meta_path : obj:`pathlib.Path`
+        The path of the JSON file holding the server's validators.
+
+    """
+
+    def __init__(self, target):
+        """Initialise a PartFile for a download.
+
+        Parameters
+        ----------
+        target : obj:`pathlib.Path`
+            The final path of the downloaded file.
+
+        """
+        self.target = target
+        self.path = target.with_name(f"{target.name}.part")
+        self.meta_path = target.with_name(f"{target.name}.part.json")
+
+    def load_validators(self):
+        """Read the validators saved alongside the part file.
+
+        Returns
+        -------
+        dict
+            The saved `url`, `etag` and `last_modified` values, or an empty
+            dict if there are none.
+
+        """
+        if not self.meta_path.is_file():
+            return {}
+
+        try:
+            with self.meta_path.open(encoding="utf-8") as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def resume_headers(self, url):
+        """Build the request headers needed to resume the download.
+
+        A download is only resumed if the part file was fetched from the same
+        URL and the server gave us a validator to check it against.
+
+        Parameters
+        ----------
+        url : str
+            The URL being downloaded.
+
+        Returns
+        -------
+        dict
+            The `Range` and `If-Range` headers to send, or an empty dict if
+            the download has to start from the beginning.
+
+        """
+        if not self.path.is_file():
+            return {}
+
+        size = self.path.stat().st_size
+        validators = self.load_validators()
+        validator = validators.get("etag") or validators.get("last_modified")
+
+        if size == 0 or validators.get("url") != url or not validator:
+            self.discard()
+            return {}
+
+        logging.info("Resuming %s from byte %d", url, size)
+        return {"Range": f"bytes={size}-", "If-Range": validator}
+
+    def resume_offset(self, response):
+        """Work out where the response body starts in the file.
+
+        Parameters
+        ----------
+        response : obj:`httpx.Response`
+            The response to a (possibly ranged) request.
+
+        Returns
+        -------
+        int or None
+            The byte offset to start writing the body at. This is 0 if the
+            server sent the whole file, or None if the range the server sent
+            does not follow on from the part file.
+
+        """
+        if response.status_code != HTTP_PARTIAL_CONTENT:
+            return 0
+
+        # Content-Range: bytes 1000-1999/2000
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            start = int(content_range.split()[1].split("-")[0])
+        except (IndexError, ValueError):
+            return None
+
+        size = self.path.stat().st_size if self.path.is_file() else 0
+        if start != size:
+            return None
+
+        return start
+
+    def save_validators(self, url, response):
+        """Record the validators for the data about to be written.
+
+        Parameters
+        ----------
+        url : str
+            The URL being downloaded.
+        response : obj:`httpx.Response`
+            The response from the server.
+
+        """
+        validators = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        with self.meta_path.open("w", encoding="utf-8") as meta_file:
+            json.dump(validators, meta_file)
+
+    def hash_prefix(self, digest, size):
+        """Feed the data already in the part file to a hash object.
+
+        Parameters
+        ----------
+        digest : obj:`hashlib._Hash`
+            The hash object to update.
+        size : int
+            The number of bytes from the start of the part file to hash.
+
+        """
+        with self.path.open("rb") as part_file:
+            while size > 0:
+                chunk = part_file.read(min(CHUNK_SIZE, size))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size -= len(chunk)
+
+    def finalise(self):
+        """Move the completed part file into place."""
+        self.path.replace(self.target)
+        self.meta_path.unlink(missing_ok=True)
+        fsync_dir(self.target.parent)
+
+    def discard(self):
+        """Throw away any partially downloaded data."""
+        self.path.unlink(missing_ok=True)
+        self.meta_path.unlink(missing_ok=True)
+
+
+def fsync_dir(path):
+    """Flush a directory entry to disk so that a rename survives a crash.
+
+    Parameters
+    ----------
+    path : obj:`pathlib.Path`
+        The directory to flush.
+
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
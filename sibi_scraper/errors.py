@@ -13,3 +13,20 @@ class ScraperError(Exception):
         self.title = title
         self.message = message
         super().__init__(self.message)
+
+
+class SearchError(Exception):
+    """Exception raised when a catalogue search could not be completed.
+
+    Attributes
+    ----------
+    url : str
+        The catalogue endpoint being searched.
+    message : str
+        Explanation of the error
+
+    """
+    def __init__(self, url, message):
+        self.url = url
+        self.message = message
+        super().__init__(self.message)
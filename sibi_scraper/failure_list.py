@@ -1,44 +1,45 @@
-import csv
+from sibi_scraper.storage import Storage
 
 
 class FailureList:
+    """The books (or audio chapters) that could not be scraped, and why.
+
+    Like `BookList`, the list is stored through the backend chosen by
+    `sibi_scraper.storage.Storage`. An empty FailureList is exported as no
+    CSV file at all.
+
+    """
+
     _csv_fields = [
         "Title",
         "Failure",
     ]
 
-    def __init__(self, path):
+    def __init__(self, path, scope="", compact_min=100):
         self.path = path
         self.failures = {}
+        self.backend = Storage().backend(path, self._csv_fields, "Title",
+                                         "failures", scope=scope,
+                                         compact_min=compact_min,
+                                         keep_empty=False)
 
     def load(self):
-        if not self.path.is_file():
-            return
-
-        with self.path.open(newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                self.failures[row["Title"]] = row["Failure"]
+        for row in self.backend.load():
+            self.failures[row["Title"]] = row["Failure"]
 
     def save(self):
-        if not self.failures:
-            if self.path.is_file():
-                self.path.unlink()
-            return
-
-        with self.path.open("w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self._csv_fields)
-            writer.writeheader()
-            for title in self.failures:
-                row = dict(zip(self._csv_fields,
-                               [title, self.failures[title]]))
-                writer.writerow(row)
+        self.backend.commit()
+
+    def compact(self):
+        self.backend.compact()
 
     def add(self, key, value):
         self.failures[key] = value
+        self.backend.put(key, dict(zip(self._csv_fields, [key, value])))
 
     def remove(self, key):
         del self.failures[key]
+        self.backend.delete(key)
 
     def exists(self, key):
         return key in self.failures
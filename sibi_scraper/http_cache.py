@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import httpx
+
+CHUNK_SIZE = 64 * 1024
+HTTP_NOT_MODIFIED = 304
+HTTP_GATEWAY_TIMEOUT = 504
+
+# The cached body is stored decoded, so headers describing the encoding of
+# the original body no longer apply to it.
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class HttpCache:
+    """Successful responses stored on disk, revalidated before they are used.
+
+    Each response is stored in a single file named after a hash of its URL:
+    a line of JSON holding the URL, status and headers, followed by the
+    decoded body. Files are written to a temporary name and renamed into
+    place, so a reader never sees a half-written entry, and a body that was
+    not read to the end is never stored.
+
+    Before a cached URL is requested again, its `ETag` and `Last-Modified`
+    are sent as `If-None-Match` and `If-Modified-Since`, and a
+    `304 Not Modified` is answered from disk. In offline mode nothing is
+    requested at all: cached URLs are answered from disk and anything else
+    gets a `504 Gateway Timeout`.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path`
+        The directory holding the cache.
+    offline : bool
+        True if only the cache should be used.
+    hits : int
+        The number of responses served from disk.
+    misses : int
+        The number of responses that had to be downloaded.
+    bytes_saved : int
+        The number of body bytes served from disk instead of downloaded.
+
+    """
+
+    def __init__(self, path, *, offline=False):
+        self.path = path
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, url):
+        """Return the path of the cache file for a URL."""
+        digest = hashlib.sha256(str(url).encode("utf-8")).hexdigest()
+        return self.path / digest
+
+    def lookup(self, url):
+        """Read the metadata of the cached response for a URL.
+
+        Parameters
+        ----------
+        url : str or obj:`httpx.URL`
+            The URL requested, including its query string.
+
+        Returns
+        -------
+        dict or None
+            The URL, status, headers and body `offset` of the cached response,
+            or None if the URL is not cached (or its entry is unreadable).
+
+        """
+        path = self.entry_path(url)
+        try:
+            with path.open("rb") as entry_file:
+                meta = json.loads(entry_file.readline())
+                meta["offset"] = entry_file.tell()
+                meta["size"] = path.stat().st_size - meta["offset"]
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("url") != str(url):
+            return None
+        return meta
+
+    def conditional_headers(self, meta):
+        """Return the headers that revalidate a cached response."""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def offline_response(self, request, meta, *, stream):
+        """Answer a request from the cache alone.
+
+        Parameters
+        ----------
+        request : obj:`httpx.Request`
+            The request that would have been sent.
+        meta : dict or None
+            The cached entry from `lookup`.
+        stream : bool
+            True if the body should be left unread.
+
+        Returns
+        -------
+        obj:`httpx.Response`
+            The cached response, or a `504 Gateway Timeout` if there is none.
+
+        """
+        if meta is None:
+            logging.debug("Not cached: %s", request.url)
+            return httpx.Response(HTTP_GATEWAY_TIMEOUT, request=request)
+        return self.cached_response(request, meta, stream=stream)
+
+    def cached_response(self, request, meta, *, stream):
+        """Build a response from a cache entry.
+
+        Parameters
+        ----------
+        request : obj:`httpx.Request`
+            The request being answered.
+        meta : dict
+            The cached entry from `lookup`.
+        stream : bool
+            True if the body should be left unread, to be read from disk by
+            `iter_bytes`.
+
+        Returns
+        -------
+        obj:`httpx.Response`
+            The cached response.
+
+        """
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += meta["size"]
+
+        body = _FileStream(self.entry_path(request.url), meta["offset"])
+        response = httpx.Response(meta["status"], headers=meta["headers"],
+                                  stream=body, request=request)
+        if not stream:
+            response.read()
+        return response
+
+    def update(self, request, response, meta, *, stream):
+        """Store or answer a response from the network.
+
+        Parameters
+        ----------
+        request : obj:`httpx.Request`
+            The request that was sent.
+        response : obj:`httpx.Response`
+            The response received.
+        meta : dict or None
+            The cached entry from `lookup` that the request revalidated.
+        stream : bool
+            True if the body of `response` has not been read.
+
+        Returns
+        -------
+        obj:`httpx.Response`
+            The cached response for a `304 Not Modified`; for a successful
+            response, a response with the same body that is stored as it is
+            read; otherwise `response` itself.
+
+        """
+        if response.status_code == HTTP_NOT_MODIFIED and meta is not None:
+            response.close()
+            return self.cached_response(request, meta, stream=stream)
+
+        if not response.is_success:
+            return response
+
+        with self.lock:
+            self.misses += 1
+
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in _DROPPED_HEADERS]
+        meta = {
+            "url": str(request.url),
+            "status": response.status_code,
+            "headers": headers,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        if not stream:
+            for _ in self.tee(request.url, meta, [response.content]):
+                pass
+            return response
+
+        return httpx.Response(response.status_code, headers=headers,
+                              stream=_TeeStream(self, request.url, meta,
+                                                response),
+                              request=request)
+
+    def stats(self):
+        """Return the hit, miss and bytes saved counters."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "bytes_saved": self.bytes_saved}
+
+    def log_stats(self):
+        """Log how effective the cache has been."""
+        stats = self.stats()
+        logging.info("HTTP cache: %d hits, %d misses, %.1f MB saved",
+                     stats["hits"], stats["misses"],
+                     stats["bytes_saved"] / 1e6)
+
+    def tee(self, url, meta, chunks):
+        """Store a response body in the cache while passing it on.
+
+        Parameters
+        ----------
+        url : str or obj:`httpx.URL`
+            The URL requested.
+        meta : dict
+            The URL, status, headers and validators of the response.
+        chunks : iterable of bytes
+            The decoded body.
+
+        Yields
+        ------
+        bytes
+            Each chunk of `chunks`. The entry is only stored once the last
+            chunk has been consumed.
+
+        """
+        path = self.entry_path(url)
+        descriptor, temp_name = tempfile.mkstemp(dir=self.path,
+                                                 prefix=f"{path.name}.",
+                                                 suffix=".tmp")
+        complete = False
+        try:
+            with os.fdopen(descriptor, "wb") as entry_file:
+                entry_file.write(json.dumps(meta).encode("utf-8") + b"\n")
+                for chunk in chunks:
+                    entry_file.write(chunk)
+                    yield chunk
+            Path(temp_name).replace(path)
+            complete = True
+        finally:
+            if not complete:
+                Path(temp_name).unlink(missing_ok=True)
+
+
+class _FileStream(httpx.SyncByteStream):
+    """The body of a cached response, read from disk in chunks."""
+
+    def __init__(self, path, offset):
+        self.path = path
+        self.offset = offset
+
+    def __iter__(self):
+        with self.path.open("rb") as entry_file:
+            entry_file.seek(self.offset)
+            while chunk := entry_file.read(CHUNK_SIZE):
+                yield chunk
+
+
+class _TeeStream(httpx.SyncByteStream):
+    """The body of a response, stored in the cache as it is read."""
+
+    def __init__(self, cache, url, meta, response):
+        self.cache = cache
+        self.url = url
+        self.meta = meta
+        self.response = response
+
+    def __iter__(self):
+        yield from self.cache.tee(self.url, self.meta,
+                                  self.response.iter_bytes())
+
+    def close(self):
+        self.response.close()
@@ -0,0 +1,130 @@
+import csv
+import json
+import logging
+import os
+
+
+class Journal:
+    """An append-only log of changes to a CSV backed list.
+
+    Each entry is a JSON object on its own line. Appends are fsynced, so once
+    `append` returns the entries survive a crash. A torn final line left by a
+    crash part way through an append is ignored on replay.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the journal file.
+    entries : int
+        The number of entries in the journal.
+
+    """
+
+    def __init__(self, path):
+        """Initialise a new Journal.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path to the journal file.
+
+        """
+        self.path = path
+        self.entries = 0
+
+    def replay(self):
+        """Read every entry in the journal.
+
+        Yields
+        ------
+        dict
+            Each journal entry, oldest first.
+
+        """
+        self.entries = 0
+        if not self.path.is_file():
+            return
+
+        with self.path.open(encoding="utf-8") as journal_file:
+            for line_no, line in enumerate(journal_file, start=1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning("Ignoring damaged entry at %s:%d",
+                                    self.path, line_no)
+                    continue
+                self.entries += 1
+                yield entry
+
+    def append(self, entries):
+        """Durably append entries to the journal.
+
+        Parameters
+        ----------
+        entries : obj:`list` of dict
+            The entries to append.
+
+        """
+        if not entries:
+            return
+
+        parent = self.path.parent
+        if not parent.is_dir():
+            parent.mkdir(parents=True)
+
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n"
+                       for entry in entries)
+        if self._is_torn():
+            data = "\n" + data
+
+        with self.path.open("a", encoding="utf-8") as journal_file:
+            journal_file.write(data)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        self.entries += len(entries)
+
+    def _is_torn(self):
+        """Check whether the journal ends part way through an entry."""
+        if not self.path.is_file() or self.path.stat().st_size == 0:
+            return False
+
+        with self.path.open("rb") as journal_file:
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) != b"\n"
+
+    def clear(self):
+        """Remove every entry from the journal."""
+        self.path.unlink(missing_ok=True)
+        self.entries = 0
+
+
+def write_csv(path, fieldnames, rows):
+    """Atomically replace a CSV file with the given rows.
+
+    The rows are written to `{path}.new`, fsynced and renamed over `path`, so
+    readers only ever see the old or the new file in full.
+
+    Parameters
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the CSV file.
+    fieldnames : obj:`list` of str
+        The CSV column names.
+    rows : iterable of dict
+        The rows to write.
+
+    """
+    parent = path.parent
+    if not parent.is_dir():
+        parent.mkdir(parents=True)
+
+    new_file = path.with_name(f"{path.name}.new")
+    with new_file.open("w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+
+    new_file.replace(path)
@@ -0,0 +1,135 @@
+import json
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class _Reader:
+    """A window onto a stream of JSON text, filled a chunk at a time."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        """Read another chunk, returning False at the end of the stream."""
+        for chunk in self.chunks:
+            if chunk:
+                # Drop what has been consumed so the buffer stays small.
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while (self.pos < len(self.buffer)
+                   and self.buffer[self.pos] in _WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                msg = "Unexpected end of JSON stream"
+                raise json.JSONDecodeError(msg, self.buffer, self.pos)
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be `char`."""
+        if self.peek() != char:
+            msg = f"Expecting {char!r}"
+            raise json.JSONDecodeError(msg, self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self, decoder):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+
+            # A number cut off by the end of a chunk (e.g. "12" of "123" or
+            # "5" of "5e-3") still decodes, so only trust a value that is
+            # followed by whitespace or punctuation.
+            if ((end < len(self.buffer) and self.buffer[end] in _DELIMITERS)
+                    or self.exhausted or not self.fill()):
+                self.pos = end
+                return value
+
+
+def iter_items(chunks, key="results"):
+    """Yield the items of an array in a JSON object as they are received.
+
+    Only the array itself is streamed: every other value in the object is
+    decoded and discarded as a whole, and each array item is decoded in one
+    go. Memory use is therefore bounded by the largest single item, not by
+    the size of the document.
+
+    Parameters
+    ----------
+    chunks : iterable of str
+        The JSON text, in pieces, e.g. from `httpx.Response.iter_text`.
+    key : str
+        The key of the array in the top level object.
+
+    Yields
+    ------
+    object
+        Each decoded item of the array, in order. Nothing is yielded if the
+        object has no such key or its value is null.
+
+    Raises
+    ------
+    json.JSONDecodeError
+        If the text is not a single JSON object, or the value of `key` is
+        neither an array nor null.
+
+    """
+    decoder = json.JSONDecoder()
+    reader = _Reader(chunks)
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = reader.value(decoder)
+        reader.expect(":")
+
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value(decoder)
+                    if reader.peek() != ",":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            value = reader.value(decoder)
+            if name == key and value is not None:
+                msg = f"Expecting an array for {key!r}"
+                raise json.JSONDecodeError(msg, reader.buffer, reader.pos)
+
+        if reader.peek() != ",":
+            break
+        reader.expect(",")
+
+    reader.expect("}")
+
+    # Read to the end of the stream, both to reject trailing garbage and so
+    # that the whole body has been consumed (and, say, cached) by the time
+    # the last item has been yielded.
+    while True:
+        if reader.buffer[reader.pos:].strip(_WHITESPACE):
+            msg = "Extra data"
+            raise json.JSONDecodeError(msg, reader.buffer, reader.pos)
+        reader.pos = len(reader.buffer)
+        if not reader.fill():
+            break
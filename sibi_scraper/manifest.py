@@ -0,0 +1,86 @@
+from sibi_scraper.storage import Storage
+
+
+class Manifest:
+    """The size, modification time and hash of every downloaded file.
+
+    `sibi_scraper.verify.Verifier` records each file it has hashed here, so
+    that later checks only need to hash files whose size or modification
+    time has changed since.
+
+    Like `SyncState`, the manifest is stored through the backend chosen by
+    `sibi_scraper.storage.Storage`.
+
+    """
+
+    _csv_fields = [
+        "Path",
+        "Size",
+        "Modified",
+        "SHA-256",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.backend = Storage().backend(path, self._csv_fields, "Path",
+                                         "manifest")
+
+    def load(self):
+        for row in self.backend.load():
+            self.entries[row["Path"]] = row
+
+    def save(self):
+        self.backend.commit()
+        self.backend.compact()
+
+    def get(self, path):
+        """Return the entry for a file, or None if it has not been hashed."""
+        return self.entries.get(str(path))
+
+    def matches(self, path, stat):
+        """Check whether a file looks unchanged since it was hashed.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path of the file.
+        stat : obj:`os.stat_result`
+            The current status of the file.
+
+        Returns
+        -------
+        bool
+            True if the file has an entry with the same size and
+            modification time, otherwise False.
+
+        """
+        entry = self.get(path)
+        return (entry is not None
+                and entry["Size"] == str(stat.st_size)
+                and entry["Modified"] == str(stat.st_mtime_ns))
+
+    def update(self, path, stat, sha256):
+        """Record the status and hash of a file.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path of the file.
+        stat : obj:`os.stat_result`
+            The status of the file when it was hashed.
+        sha256 : str
+            The SHA-256 hex digest of the file.
+
+        """
+        key = str(path)
+        self.entries[key] = dict(zip(self._csv_fields,
+                                     [key, str(stat.st_size),
+                                      str(stat.st_mtime_ns), sha256]))
+        self.backend.put(key, self.entries[key])
+
+    def remove(self, path):
+        """Forget a file, if it is in the manifest."""
+        key = str(path)
+        if self.entries.pop(key, None) is not None:
+            self.backend.delete(key)
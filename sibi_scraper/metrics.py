@@ -0,0 +1,369 @@
+import bisect
+import contextlib
+import datetime
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the buckets of every histogram.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+           300)
+
+# The type and help text of every metric, as exported to Prometheus.
+METRICS = {
+    "sibi_api_request_seconds": (
+        "histogram", "Time until the headers of a catalogue search arrive."),
+    "sibi_download_seconds": (
+        "histogram", "Time taken to download a book or audio chapter."),
+    "sibi_downloaded_bytes_total": (
+        "counter", "Bytes downloaded for books and audio chapters."),
+    "sibi_downloads_total": (
+        "counter", "Books and audio chapters downloaded."),
+    "sibi_pdf_parse_seconds": (
+        "histogram", "Time taken to count the pages of a PDF."),
+    "sibi_translation_seconds": (
+        "histogram", "Time taken to translate a batch of titles."),
+    "sibi_translated_titles_total": (
+        "counter", "Titles translated into English."),
+    "sibi_retries_total": (
+        "counter", "Requests and downloads tried again after an error."),
+    "sibi_sleep_seconds_total": (
+        "counter", "Time spent waiting before sending requests."),
+    "sibi_books_recorded_total": (
+        "counter", "Books added to the book or failure list."),
+    "sibi_stage_processed_total": (
+        "counter", "Items handled by each pipeline stage."),
+    "sibi_stage_failed_total": (
+        "counter", "Items that raised an error in each pipeline stage."),
+    "sibi_stage_busy_seconds_total": (
+        "counter", "Time each pipeline stage's workers spent handling items."),
+    "sibi_stage_blocked_seconds_total": (
+        "counter", "Time spent waiting for room in each stage's queue."),
+    "sibi_run_duration_seconds": (
+        "gauge", "How long the last run took."),
+    "sibi_last_run_timestamp_seconds": (
+        "gauge", "When the last run finished, as a Unix timestamp."),
+}
+
+
+class Metrics:
+    """A singleton collecting counters and histograms during a run.
+
+    Hooks in `Scraper`, `Book`, `AudioBook` and `Session` record how long
+    catalogue searches, downloads, PDF parsing and translation take, how
+    many bytes are downloaded for each class and category, and how often
+    requests are retried or held back. Every metric is listed in `METRICS`.
+
+    Once `use_files` has been called, `export` writes the metrics as a JSON
+    summary and as a Prometheus textfile, for the node exporter's textfile
+    collector.
+
+    Metric labels are passed as keyword arguments. A trailing underscore is
+    dropped from a label name, so `class_="5"` is exported as `class="5"`.
+
+    Attributes
+    ----------
+    json_path : obj:`pathlib.Path` or None
+        Where `export` writes the JSON summary.
+    textfile_path : obj:`pathlib.Path` or None
+        Where `export` writes the Prometheus textfile.
+
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.lock = threading.Lock()
+                instance.json_path = None
+                instance.textfile_path = None
+                instance.reset()
+                cls._instance = instance
+        return cls._instance
+
+    def use_files(self, json_path=None, textfile_path=None):
+        """Choose where `export` writes the metrics.
+
+        Parameters
+        ----------
+        json_path : obj:`pathlib.Path`, optional
+            The path of the JSON summary.
+        textfile_path : obj:`pathlib.Path`, optional
+            The path of the Prometheus textfile, which should end in `.prom`.
+
+        """
+        self.json_path = json_path
+        self.textfile_path = textfile_path
+
+    def reset(self):
+        """Forget every metric recorded so far."""
+        with self.lock:
+            self.values = {}
+            self.histograms = {}
+            self.started = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter.
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter, from `METRICS`.
+        value : float
+            The amount to add.
+        **labels
+            The values of the counter's labels.
+
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge, or a counter to a total kept elsewhere (see `inc`)."""
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name, value, **labels):
+        """Record a value, such as a duration in seconds, in a histogram.
+
+        Parameters
+        ----------
+        name : str
+            The name of the histogram, from `METRICS`.
+        value : float
+            The value observed.
+        **labels
+            The values of the histogram's labels.
+
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    "buckets": [0] * (len(BUCKETS) + 1),
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0,
+                }
+            histogram["buckets"][bisect.bisect_left(BUCKETS, value)] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        """Time the body of a `with` block into a histogram (see `observe`)."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def summary(self):
+        """Return every metric as a JSON serialisable dict.
+
+        Histograms are summarised by their count, sum, mean, maximum and
+        approximate median and 95th percentile, worked out from their
+        buckets. The download rate of each type of file is worked out from
+        the bytes downloaded and time spent downloading.
+
+        """
+        with self.lock:
+            values = dict(self.values)
+            histograms = {key: dict(histogram)
+                          for key, histogram in self.histograms.items()}
+            elapsed = time.monotonic() - self.started
+
+        return {
+            "finished_at": datetime.datetime.now().isoformat(
+                timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(values.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels),
+                 **self._summarise(histogram)}
+                for (name, labels), histogram in sorted(histograms.items())
+            ],
+            "download_rates": self._download_rates(values, histograms),
+        }
+
+    def histogram_summary(self, name):
+        """Summarise a histogram over every combination of its labels.
+
+        Parameters
+        ----------
+        name : str
+            The name of the histogram, from `METRICS`.
+
+        Returns
+        -------
+        dict
+            The count, sum, mean, maximum, median and 95th percentile, as
+            in `summary`.
+
+        """
+        merged = {"buckets": [0] * (len(BUCKETS) + 1), "count": 0,
+                  "sum": 0.0, "max": 0.0}
+        with self.lock:
+            for (histogram_name, _), histogram in self.histograms.items():
+                if histogram_name != name:
+                    continue
+                merged["buckets"] = [a + b for a, b in zip(
+                    merged["buckets"], histogram["buckets"])]
+                merged["count"] += histogram["count"]
+                merged["sum"] += histogram["sum"]
+                merged["max"] = max(merged["max"], histogram["max"])
+        return self._summarise(merged)
+
+    def log_summary(self):
+        """Log the headline numbers."""
+        for kind, rate in self.summary()["download_rates"].items():
+            logging.info("Downloaded %.1f MB of %s files at %.2f MB/s",
+                         rate["bytes"] / 1e6, kind,
+                         rate["bytes_per_second"] / 1e6)
+
+    def export(self):
+        """Write the metrics to the files chosen with `use_files`."""
+        self.set_gauge("sibi_run_duration_seconds",
+                       time.monotonic() - self.started)
+        self.set_gauge("sibi_last_run_timestamp_seconds", time.time())
+
+        if self.json_path is not None:
+            self._write(self.json_path,
+                        json.dumps(self.summary(), indent=2) + "\n")
+        if self.textfile_path is not None:
+            self._write(self.textfile_path, self.prometheus())
+
+    def prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self.lock:
+            series = {}
+            for (name, labels), value in sorted(self.values.items()):
+                series.setdefault(name, []).append(
+                    f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                lines = series.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, math.inf),
+                                        histogram["buckets"]):
+                    cumulative += count
+                    bucket_labels = (*labels, ("le", _number(bound)))
+                    lines.append(f"{name}_bucket{_labels(bucket_labels)} "
+                                 f"{cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} "
+                             f"{_number(histogram['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} "
+                             f"{histogram['count']}")
+
+        output = []
+        for name in sorted(series):
+            type_, help_ = METRICS[name]
+            output.append(f"# HELP {name} {help_}")
+            output.append(f"# TYPE {name} {type_}")
+            output.extend(series[name])
+        return "\n".join(output) + "\n"
+
+    def _key(self, name, labels):
+        if name not in METRICS:
+            msg = f"Unknown metric: {name}"
+            raise KeyError(msg)
+        return name, tuple(sorted((label.rstrip("_"), str(value))
+                                  for label, value in labels.items()))
+
+    def _summarise(self, histogram):
+        count = histogram["count"]
+        return {
+            "count": count,
+            "sum": round(histogram["sum"], 6),
+            "mean": round(histogram["sum"] / count, 6) if count else 0.0,
+            "max": round(histogram["max"], 6),
+            "p50": _quantile(histogram, 0.5),
+            "p95": _quantile(histogram, 0.95),
+        }
+
+    def _download_rates(self, values, histograms):
+        rates = {}
+        for (name, labels), value in values.items():
+            if name == "sibi_downloaded_bytes_total":
+                kind = dict(labels).get("type", "")
+                rates.setdefault(kind, {"bytes": 0, "seconds": 0.0})
+                rates[kind]["bytes"] += value
+        for (name, labels), histogram in histograms.items():
+            if name == "sibi_download_seconds":
+                kind = dict(labels).get("type", "")
+                rates.setdefault(kind, {"bytes": 0, "seconds": 0.0})
+                rates[kind]["seconds"] += histogram["sum"]
+        for rate in rates.values():
+            rate["bytes_per_second"] = (rate["bytes"] / rate["seconds"]
+                                        if rate["seconds"] else 0.0)
+        return rates
+
+    def _write(self, path, text):
+        # Written to a temporary file and renamed, as the node exporter may
+        # read the textfile at any moment.
+        new_file = path.with_name(f".{path.name}.new")
+        with new_file.open("w", encoding="utf-8") as metrics_file:
+            metrics_file.write(text)
+            metrics_file.flush()
+            os.fsync(metrics_file.fileno())
+        new_file.replace(path)
+
+
+def record_retry(retry_state):
+    """Count a retry by tenacity, for use as its `before_sleep` callback."""
+    operation = getattr(retry_state.fn, "__name__", "unknown")
+    Metrics().inc("sibi_retries_total", operation=operation)
+    if retry_state.next_action is not None:
+        Metrics().inc("sibi_sleep_seconds_total",
+                      retry_state.next_action.sleep, reason="retry")
+
+
+def _quantile(histogram, q):
+    """Estimate a quantile from a histogram's buckets."""
+    count = histogram["count"]
+    if not count:
+        return 0.0
+
+    rank = q * count
+    cumulative = 0
+    lower = 0.0
+    for bound, bucket in zip((*BUCKETS, histogram["max"]),
+                             histogram["buckets"]):
+        if bucket and cumulative + bucket >= rank:
+            # Interpolate within the bucket, as Prometheus does.
+            upper = min(bound, histogram["max"])
+            return round(lower + (upper - lower)
+                         * (rank - cumulative) / bucket, 6)
+        cumulative += bucket
+        lower = bound
+    return round(histogram["max"], 6)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{pairs}}}"
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
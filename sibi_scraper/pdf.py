@@ -0,0 +1,238 @@
+import logging
+import mmap
+import re
+
+import PyPDF2
+
+# The PDF specification requires %%EOF within the last 1024 bytes.
+EOF_WINDOW = 1024
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_PAGES = re.compile(rb"/Pages\s+(\d+)\s+(\d+)\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)\b(?!\s+\d+\s+R)")
+_TYPE_PAGES = re.compile(rb"/Type\s*/Pages\b")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)\s*[\r\n]+")
+
+
+class FastPathError(Exception):
+    """Raised when a PDF is too unusual for the fast page count."""
+
+
+def is_truncated(path):
+    """Check whether a PDF is missing its end-of-file marker.
+
+    The marker should be in the last kilobyte, so usually only that is read,
+    which is a cheap way to catch a download that stopped early before doing
+    any real parsing. Like PyPDF2, a marker followed by more trailing bytes
+    than that is still accepted, by searching back through the whole file.
+
+    Parameters
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the PDF.
+
+    Returns
+    -------
+    bool
+        True if there is no `%%EOF` marker anywhere in the file.
+
+    """
+    with path.open("rb") as pdf_file:
+        pdf_file.seek(0, 2)
+        size = pdf_file.tell()
+        pdf_file.seek(max(0, size - EOF_WINDOW))
+        if b"%%EOF" in pdf_file.read():
+            return False
+        if size <= EOF_WINDOW:
+            return True
+
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data.rfind(b"%%EOF") == -1
+
+
+def page_count(path):
+    """Count the pages in a PDF.
+
+    The page count is read straight from the `/Count` of the root of the page
+    tree, found through the trailer and cross-reference table of a
+    memory-mapped file. Files that the fast path cannot handle (for example
+    ones that keep the page tree in a compressed object stream, or whose
+    catalog or page tree is not in their newest cross-reference section)
+    are counted with PyPDF2 instead.
+
+    Parameters
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the PDF.
+
+    Returns
+    -------
+    int
+        The number of pages in the PDF.
+
+    Raises
+    ------
+    PyPDF2.errors.PdfReadError
+        If the PDF is truncated or cannot be read.
+
+    """
+    if is_truncated(path):
+        msg = f"{path} is truncated: no %%EOF marker"
+        raise PyPDF2.errors.PdfReadError(msg)
+
+    try:
+        return fast_page_count(path)
+    except FastPathError as e:
+        logging.debug("Falling back to PyPDF2 for %s: %s", path, e)
+
+    reader = PyPDF2.PdfReader(path)
+    return len(reader.pages)
+
+
+def fast_page_count(path):
+    """Count the pages in a PDF without parsing the whole document.
+
+    Parameters
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the PDF.
+
+    Returns
+    -------
+    int
+        The `/Count` of the root of the page tree.
+
+    Raises
+    ------
+    FastPathError
+        If any step of the lookup finds something it does not understand.
+
+    """
+    with path.open("rb") as pdf_file:
+        try:
+            data = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            raise FastPathError(str(e)) from e
+
+        with data:
+            reader = _XrefReader(data)
+            root = reader.get_object(*reader.root())
+
+            match = _PAGES.search(root)
+            if match is None:
+                msg = "catalog has no /Pages"
+                raise FastPathError(msg)
+
+            pages = reader.get_object(int(match[1]), int(match[2]))
+            if _TYPE_PAGES.search(pages) is None:
+                msg = "/Pages is not a page tree node"
+                raise FastPathError(msg)
+
+            match = _COUNT.search(pages)
+            if match is None:
+                msg = "page tree has no direct /Count"
+                raise FastPathError(msg)
+
+            return int(match[1])
+
+
+class _XrefReader:
+    """Finds objects in a memory-mapped PDF through its cross references."""
+
+    def __init__(self, data):
+        self.data = data
+
+        tail = data[max(0, len(data) - EOF_WINDOW):]
+        matches = list(_STARTXREF.finditer(tail))
+        if not matches:
+            msg = "no startxref"
+            raise FastPathError(msg)
+        self.startxref = int(matches[-1][1])
+
+    def root(self):
+        """Return the object and generation number of the catalog."""
+        offset = self.startxref
+        seen = set()
+
+        while offset not in seen:
+            seen.add(offset)
+            trailer = self._trailer(offset)
+            match = _ROOT.search(trailer)
+            if match:
+                return int(match[1]), int(match[2])
+            match = _PREV.search(trailer)
+            if match is None:
+                break
+            offset = int(match[1])
+
+        msg = "no /Root in trailer"
+        raise FastPathError(msg)
+
+    def get_object(self, number, generation):
+        """Return the bytes of an indirect object, up to its `endobj`."""
+        offset = self._offset(number, generation)
+        header = re.compile(rb"\s*%d\s+%d\s+obj\b" % (number, generation))
+        if header.match(self.data, offset) is None:
+            msg = f"object {number} {generation} is not at offset {offset}"
+            raise FastPathError(msg)
+
+        end = self.data.find(b"endobj", offset)
+        if end == -1:
+            msg = f"object {number} {generation} has no endobj"
+            raise FastPathError(msg)
+        return self.data[offset:end]
+
+    def _trailer(self, offset):
+        if self.data[offset:offset + 4] == b"xref":
+            start = self.data.find(b"trailer", offset)
+            end = self.data.find(b"startxref", start)
+            if start == -1 or end == -1:
+                msg = "xref table has no trailer"
+                raise FastPathError(msg)
+            return self.data[start:end]
+
+        # A cross-reference stream, whose dictionary is the trailer.
+        end = self.data.find(b"stream", offset)
+        if end == -1:
+            msg = "startxref does not point at a cross-reference"
+            raise FastPathError(msg)
+        return self.data[offset:end]
+
+    def _offset(self, number, generation):
+        # Only the newest cross-reference section is searched. An object
+        # that it does not list as in use may have been updated or deleted
+        # in a way the fast path would misread through older sections, so
+        # anything else is left to PyPDF2.
+        offset = self.startxref
+        if self.data[offset:offset + 4] != b"xref":
+            msg = "cross-reference streams are not supported"
+            raise FastPathError(msg)
+        return self._search_table(offset + 4, number, generation)
+
+    def _search_table(self, position, number, generation):
+        # Each subsection is "first count" followed by count 20-byte entries
+        # of "offset generation n|f".
+        while True:
+            match = _SUBSECTION.match(self.data, position)
+            if match is None:
+                msg = (f"object {number} {generation} is not in the newest "
+                       "xref section")
+                raise FastPathError(msg)
+
+            first, count = int(match[1]), int(match[2])
+            position = match.end()
+
+            if first <= number < first + count:
+                entry_start = position + (number - first) * 20
+                entry = self.data[entry_start:entry_start + 20].split()
+                if (len(entry) < 3 or entry[2] != b"n"  # noqa: PLR2004
+                        or not entry[0].isdigit()
+                        or entry[1] != b"%05d" % generation):
+                    msg = (f"object {number} {generation} is not in use in "
+                           "the newest xref section")
+                    raise FastPathError(msg)
+                return int(entry[0])
+
+            position += count * 20
@@ -0,0 +1,224 @@
+import logging
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class Stage:
+    """A pool of worker threads consuming items from a bounded queue.
+
+    Producers hand items to the stage with `put`, which blocks while the
+    queue is full, so a slow stage holds back the stages feeding it rather
+    than letting work pile up in memory.
+
+    Attributes
+    ----------
+    name : str
+        The name of the stage, used in thread names and statistics.
+    workers : int
+        The number of threads consuming the queue.
+    queue : obj:`queue.Queue`
+        The items waiting to be handled.
+    processed : int
+        The number of items handled successfully.
+    failed : int
+        The number of items whose handler raised an exception.
+    busy : float
+        The total number of seconds the workers have spent handling items.
+    blocked : float
+        The total number of seconds producers have spent waiting for room in
+        the queue.
+    max_depth : int
+        The largest number of items that have been waiting at once.
+
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=None):
+        """Initialise a new Stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        handler : callable
+            Called with each item put on the queue.
+        workers : int
+            The number of threads consuming the queue.
+        queue_size : int, optional
+            The number of items that can wait on the queue before `put`
+            blocks. Defaults to twice the number of workers.
+
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self.started = None
+
+    def start(self):
+        """Start the worker threads."""
+        self.started = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work,
+                                      name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        """Queue an item for the stage, waiting for room if the queue is full.
+
+        Parameters
+        ----------
+        item : object
+            The item to pass to the handler.
+
+        """
+        start = time.monotonic()
+        self.queue.put(item)
+        waited = time.monotonic() - start
+
+        with self.lock:
+            self.blocked += waited
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def close(self):
+        """Wait for every queued item to be handled and stop the workers."""
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stats(self):
+        """Return a snapshot of the stage's statistics.
+
+        Returns
+        -------
+        dict
+            The stage's name, worker count, current queue depth and the
+            counters described in the class attributes, plus `rate`, the
+            number of items handled per second since the stage started.
+
+        """
+        with self.lock:
+            elapsed = time.monotonic() - self.started if self.started else 0
+            done = self.processed + self.failed
+            return {
+                "name": self.name,
+                "workers": self.workers,
+                "depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+                "processed": self.processed,
+                "failed": self.failed,
+                "busy": self.busy,
+                "blocked": self.blocked,
+                "rate": done / elapsed if elapsed else 0.0,
+            }
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+
+            start = time.monotonic()
+            try:
+                self.handler(item)
+            except Exception:  # noqa: BLE001
+                logging.exception("Unhandled error in %s stage", self.name)
+                failed = True
+            else:
+                failed = False
+
+            with self.lock:
+                self.busy += time.monotonic() - start
+                if failed:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+
+
+class Pipeline:
+    """A chain of stages, each feeding the next.
+
+    The stages are started together and closed in order, so that every item
+    an upstream stage produces is handled before the stages after it stop.
+    While the pipeline runs, the statistics of every stage are logged every
+    `stats_interval` seconds.
+
+    """
+
+    def __init__(self, stages, stats_interval=30):
+        """Initialise a new Pipeline.
+
+        Parameters
+        ----------
+        stages : obj:`list` of obj:`Stage`
+            The stages, from the first to the last.
+        stats_interval : float
+            The number of seconds between statistics log lines, or 0 to only
+            log them when the pipeline is closed.
+
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.stats_interval = stats_interval
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Start every stage and the statistics monitor."""
+        for stage in self.stages.values():
+            stage.start()
+
+        if self.stats_interval:
+            self._monitor = threading.Thread(target=self._log_periodically,
+                                             name="pipeline-stats",
+                                             daemon=True)
+            self._monitor.start()
+
+    def close(self):
+        """Close every stage in order and log their final statistics."""
+        for stage in self.stages.values():
+            stage.close()
+
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        self.log_stats()
+
+    def stats(self):
+        """Return a snapshot of the statistics of every stage, in order."""
+        return [stage.stats() for stage in self.stages.values()]
+
+    def log_stats(self):
+        """Log the queue depth and throughput of every stage."""
+        for stats in self.stats():
+            logging.info(
+                "Stage %s: %d workers, %d queued (max %d), %d done, "
+                "%d failed, %.2f/s, %.1fs busy, %.1fs blocked upstream",
+                stats["name"], stats["workers"], stats["depth"],
+                stats["max_depth"], stats["processed"], stats["failed"],
+                stats["rate"], stats["busy"], stats["blocked"])
+
+    def _log_periodically(self):
+        while not self._stopped.wait(self.stats_interval):
+            self.log_stats()
@@ -0,0 +1,268 @@
+import contextlib
+import datetime
+import email.utils
+import logging
+import threading
+import time
+
+
+class TokenBucket:
+    """An adaptive token bucket limiting the request rate to a single host.
+
+    The refill rate follows an additive-increase/multiplicative-decrease
+    scheme: every healthy response nudges the rate up, while a throttled or
+    failed response halves it. A `Retry-After` from the server blocks the
+    bucket completely until the requested time has passed.
+
+    Attributes
+    ----------
+    host : str
+        The host name that this bucket limits.
+    rate : float
+        The current number of requests per second allowed.
+    min_rate : float
+        The slowest the bucket will ever go.
+    max_rate : float
+        The fastest the bucket will ever go.
+    capacity : float
+        The largest burst of requests allowed after an idle period.
+
+    """
+
+    def __init__(self, host, rate=0.5, min_rate=0.05, max_rate=5.0,
+                 capacity=2.0, increase=0.1, decrease=0.5):
+        """Initialise a new TokenBucket.
+
+        Parameters
+        ----------
+        host : str
+            The host name that this bucket limits.
+        rate : float
+            The initial number of requests per second allowed.
+        min_rate : float
+            The slowest the bucket will ever go.
+        max_rate : float
+            The fastest the bucket will ever go.
+        capacity : float
+            The largest burst of requests allowed after an idle period.
+        increase : float
+            The amount added to the rate after each healthy response.
+        decrease : float
+            The factor applied to the rate after each throttled response.
+
+        """
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.increase = increase
+        self.decrease = decrease
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Wait until a request to the host is allowed.
+
+        Tokens are reserved before sleeping, so concurrent callers queue up
+        behind each other rather than all waking at the same moment.
+
+        Returns
+        -------
+        float
+            The number of seconds spent waiting.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate,
+                       self._blocked_until - now,
+                       0.0)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self):
+        """Record a healthy response and speed the bucket up."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self, retry_after=None):
+        """Record a throttled or failed response and slow the bucket down.
+
+        Parameters
+        ----------
+        retry_after : float, optional
+            The number of seconds the server asked us to wait before the
+            next request.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until,
+                                          now + retry_after)
+
+        logging.info("Slowing requests to %s to %.2f/s", self.host, self.rate)
+
+    def update(self, response):
+        """Adjust the bucket based on an HTTP response from the host.
+
+        Parameters
+        ----------
+        response : obj:`httpx.Response`
+            The response received from the host.
+
+        Returns
+        -------
+        bool
+            True if the response indicates that the host is throttling us or
+            struggling, otherwise False.
+
+        """
+        if is_throttled(response.status_code):
+            self.throttled(parse_retry_after(
+                response.headers.get("Retry-After")))
+            return True
+
+        self.succeeded()
+        return False
+
+
+class RateLimiter:
+    """A singleton registry of TokenBuckets, one per host."""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.buckets = {}
+                instance.limits = {}
+                instance.lock = threading.Lock()
+                cls._instance = instance
+        return cls._instance
+
+    def configure(self, host, **limits):
+        """Set the TokenBucket parameters used for a host.
+
+        Parameters
+        ----------
+        host : str
+            The host name to configure.
+        **limits
+            Keyword arguments passed to `TokenBucket`.
+
+        """
+        with self.lock:
+            self.limits[host] = limits
+            self.buckets.pop(host, None)
+
+    def bucket(self, host):
+        """Return the TokenBucket for a host, creating it if necessary.
+
+        Parameters
+        ----------
+        host : str
+            The host name.
+
+        Returns
+        -------
+        obj:`sibi_scraper.rate_limit.TokenBucket`
+            The shared bucket for the host.
+
+        """
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(host,
+                                                 **self.limits.get(host, {}))
+            return self.buckets[host]
+
+    @contextlib.contextmanager
+    def limit(self, host):
+        """Rate limit a block of code that talks to a host.
+
+        This is for clients that do their own HTTP and only report success or
+        failure by raising. Any exception raised in the block slows the bucket
+        down before being re-raised.
+
+        Parameters
+        ----------
+        host : str
+            The host name.
+
+        """
+        bucket = self.bucket(host)
+        bucket.acquire()
+        try:
+            yield bucket
+        except BaseException:
+            bucket.throttled()
+            raise
+        bucket.succeeded()
+
+
+def is_throttled(status_code):
+    """Check whether an HTTP status code means the server wants us to back off.
+
+    Parameters
+    ----------
+    status_code : int
+        The HTTP status code.
+
+    Returns
+    -------
+    bool
+        True for 429 Too Many Requests and any 5xx error, otherwise False.
+
+    """
+    return status_code == 429 or 500 <= status_code < 600  # noqa: PLR2004
+
+
+def parse_retry_after(value):
+    """Parse the value of a `Retry-After` header.
+
+    Parameters
+    ----------
+    value : str or None
+        Either a number of seconds or an HTTP date.
+
+    Returns
+    -------
+    float or None
+        The number of seconds to wait, or None if the header was missing or
+        could not be understood.
+
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (when - now).total_seconds())
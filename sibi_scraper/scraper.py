@@ -1,11 +1,33 @@
+import concurrent.futures
+import contextlib
+import json
 import logging
+import multiprocessing
+import os
+import signal
+import threading
 import time
+from pathlib import Path
 
+import httpx
+import PyPDF2
+
+from sibi_scraper import pdf
 from sibi_scraper.audio_book import AudioBook
+from sibi_scraper.audio_index import AudioIndex
+from sibi_scraper.blob_store import BlobStore
 from sibi_scraper.book import Book
 from sibi_scraper.book_list import BookList
-from sibi_scraper.errors import ScraperError
+from sibi_scraper.checkpoint import Checkpoint
+from sibi_scraper.errors import ScraperError, SearchError
 from sibi_scraper.failure_list import FailureList
+from sibi_scraper.json_stream import iter_items
+from sibi_scraper.manifest import Manifest
+from sibi_scraper.metrics import Metrics
+from sibi_scraper.pipeline import Pipeline, Stage
+from sibi_scraper.sync_state import SyncState
+from sibi_scraper.translation import TranslationCache, translate_all
+from sibi_scraper.verify import Verifier
 from sibi_scraper.web import Session
 
 
@@ -20,6 +42,35 @@ class Scraper:
         The BookList storing the details of all previously scraped books.
     non_text_levels : obj:`list` of str
         The levels to scrape non-text books for.
+    workers : int
+        The maximum number of books to download concurrently.
+    translate_workers : int
+        The maximum number of titles to translate concurrently.
+    validate_workers : int
+        The number of processes counting the pages of downloaded PDFs.
+    queue_size : int or None
+        The number of items that can wait for each pipeline stage.
+    stats_interval : float
+        The number of seconds between pipeline statistics log lines.
+    stage_stats : obj:`list` of dict
+        The statistics of each pipeline stage from the last `scrape`.
+    sync_state : obj:`sibi_scraper.sync_state.SyncState`
+        The high-water mark of each catalogue search.
+    full_resync : bool
+        True if every book in the catalogue is looked at, ignoring the
+        high-water marks.
+    page_size : int
+        The number of books requested from the catalogue at a time.
+    discover_workers : int
+        The number of catalogue searches run concurrently.
+    audio_workers : int
+        The maximum number of chapters of each audiobook to download
+        concurrently.
+    checkpoint : obj:`sibi_scraper.checkpoint.Checkpoint`
+        How far the current (or last interrupted) scrape has got.
+    resume : bool
+        True if `scrape` carries on from the checkpoint of an interrupted
+        run.
 
     """
     CLASSES = ["all"] + [str(i) for i in range(1, 13)]
@@ -33,7 +84,11 @@ class Scraper:
     BOOK_TYPES = ["pdf", "audio"]
 
     def __init__(self, text_classes, non_text_levels, book_list_file,
-                 failure_list_file):
+                 failure_list_file, workers=1, translate_workers=4,
+                 validate_workers=None, queue_size=None, stats_interval=30,
+                 *, sync_state_file=None, full_resync=False, page_size=100,
+                 discover_workers=4, audio_workers=4, audio_index_file=None,
+                 checkpoint_file=None, resume=False):
         """Initialise a new Scraper.
 
         Parameters
@@ -46,12 +101,73 @@ class Scraper:
             The path to the failure list CSV.
         non_text_levels : obj:`list` of str
             A list of levels or "all" to scrape all levels of non-text books.
+        workers : int
+            The maximum number of books to download concurrently.
+        translate_workers : int
+            The maximum number of titles to translate concurrently.
+        validate_workers : int, optional
+            The number of processes counting the pages of downloaded PDFs.
+            Defaults to the number of CPUs.
+        queue_size : int, optional
+            The number of items that can wait for each pipeline stage before
+            the stage feeding it blocks. Defaults to twice the number of
+            workers in the stage.
+        stats_interval : float
+            The number of seconds between pipeline statistics log lines, or 0
+            to only log them once scraping has finished.
+        sync_state_file : str, optional
+            The path to the CSV of catalogue high-water marks. Defaults to
+            `sibi_sync_state.csv`.
+        full_resync : bool
+            True to look at every book in the catalogue, rather than only
+            those changed since the last successful run.
+        page_size : int
+            The number of books to request from the catalogue at a time.
+        discover_workers : int
+            The number of catalogue searches to run concurrently.
+        audio_workers : int
+            The maximum number of chapters of each audiobook to download
+            concurrently.
+        audio_index_file : str, optional
+            The path to the CSV of audiobook chapters (see `AudioIndex`).
+            Defaults to `sibi_audio_index.csv`.
+        checkpoint_file : str, optional
+            The path to the checkpoint of the current scrape. Defaults to
+            `sibi_checkpoint.json`.
+        resume : bool
+            True to carry on from where an interrupted run stopped, rather
+            than starting over.
 
         """
         self.book_list = BookList(book_list_file)
         self.failure_list = FailureList(failure_list_file)
         self.classes = []
         self.non_text_levels = []
+        self.workers = max(1, workers)
+        self.translate_workers = max(1, translate_workers)
+        self.validate_workers = max(1, validate_workers or os.cpu_count() or 1)
+        self.queue_size = queue_size
+        self.stats_interval = stats_interval
+        self.stage_stats = []
+        self.sync_state = SyncState(sync_state_file
+                                    or Path("sibi_sync_state.csv"))
+        self.full_resync = full_resync
+        self.page_size = max(1, page_size)
+        self.discover_workers = max(1, discover_workers)
+        self.audio_workers = max(1, audio_workers)
+        AudioIndex().use_file(audio_index_file
+                              or Path("sibi_audio_index.csv"))
+        self._syncs = {}
+        self._discovered = set()
+        self._update_metadata_only = False
+        self._validator = None
+        self._pipeline = None
+        self.checkpoint = Checkpoint(checkpoint_file
+                                     or Path("sibi_checkpoint.json"))
+        self.resume = resume
+        self._lock = threading.RLock()
+        self._in_flight = set()
+        self._stopping = threading.Event()
 
         if text_classes is None and non_text_levels is None:
             self.classes = self.CLASSES[1:]
@@ -75,107 +191,680 @@ class Scraper:
         First, load the book list from the CSV file. Then iterate through the
         specified classes, querying the SIBI API for a list of books for each
         class, downloading any book returned that was not already in the book
-        list. Finally, the updated book list is saved back to the CSV file.
+        list. Finally, the updated book list is compacted back into the CSV
+        file.
+
+        Searching, downloading, validating and recording books run as
+        separate stages connected by bounded queues (see `scrape`), so each
+        can be sized independently. Titles are translated in a separate
+        stage once every download has finished.
+
+        The first SIGINT or SIGTERM stops the run once the downloads in
+        progress have finished, saving everything needed to carry on with
+        `resume` (see `handle_signals`).
 
         """
         self.book_list.load()
         self.failure_list.load()
+        self.sync_state.load()
+
+        with self.handle_signals():
+            try:
+                self.scrape(update_metadata_only)
+                if not update_metadata_only and not self._stopping.is_set():
+                    self.translate_missing()
+            finally:
+                self.checkpoint.save()
+                self.save_lists()
+
+        if self._stopping.is_set():
+            logging.warning("Stopped early: run again with --resume to carry "
+                            "on from %s", self.checkpoint.path)
+
+        logging.info("%d books added to or changed in the book list",
+                     len(self.book_list.changed))
+        Session().log_connection_stats()
+        if Session().cache is not None:
+            Session().cache.log_stats()
+        if BlobStore().path is not None:
+            BlobStore().log_stats()
+        TranslationCache().log_stats()
+        Metrics().log_summary()
+        Metrics().export()
+
+    def save_lists(self):
+        """Bring every list's CSV file up to date."""
+        with self._lock:
+            self.book_list.compact()
+            self.failure_list.compact()
+            AudioIndex().compact()
+            BlobStore().compact()
+
+    @contextlib.contextmanager
+    def handle_signals(self):
+        """Stop the scrape gracefully on SIGINT or SIGTERM.
+
+        The first signal stops any more searches or downloads from starting.
+        The downloads in progress are finished and recorded, and the
+        checkpoint and lists are saved as the run ends. The original
+        handlers are put back straight away, so a second signal stops the
+        run at once.
+
+        Signal handlers can only be set from the main thread, so elsewhere
+        this does nothing.
 
-        if "1" in self.classes:
-            for category in self.categories:
-                for type_ in self.BOOK_TYPES:
-                    found_books = self.search_for_books(None, category, type_)
-                    non_class_books = list(filter(lambda r: r["class"] in ["", None], found_books["results"]))
+        """
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+
+        signals = [signal.SIGINT, signal.SIGTERM]
+        previous = {}
+
+        def stop(signum, _frame):
+            logging.warning("Received %s: stopping once the current downloads "
+                            "finish. Send it again to stop at once.",
+                            signal.Signals(signum).name)
+            self._stopping.set()
+            for other, handler in previous.items():
+                signal.signal(other, handler)
+
+        for signum in signals:
+            previous[signum] = signal.signal(signum, stop)
+        try:
+            yield
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def stop(self):
+        """Stop the scrape gracefully, as if it had been sent SIGTERM."""
+        self._stopping.set()
+
+    def translate(self):
+        """Fill in missing English titles without querying the catalogue."""
+        self.book_list.load()
+
+        try:
+            self.translate_missing()
+        finally:
+            self.book_list.compact()
+            AudioIndex().compact()
+
+        TranslationCache().log_stats()
+
+    def verify(self, manifest_file, workers=4):
+        """Check downloaded files and queue any damaged ones for download.
+
+        See `sibi_scraper.verify.Verifier`.
+
+        Parameters
+        ----------
+        manifest_file : obj:`pathlib.Path`
+            The path to the CSV file recording the size, modification time
+            and hash of every downloaded file.
+        workers : int
+            The number of files to hash concurrently.
+
+        Returns
+        -------
+        obj:`list` of tuple of (obj:`pathlib.Path`, str)
+            The path of each missing or corrupt file and what is wrong
+            with it.
+
+        """
+        self.book_list.load()
+        self.failure_list.load()
+        self.sync_state.load()
+
+        verifier = Verifier(self.book_list, self.failure_list,
+                            Manifest(manifest_file), self.sync_state,
+                            workers=workers)
+        try:
+            return verifier.run()
+        finally:
+            self.book_list.compact()
+            self.failure_list.compact()
+            AudioIndex().compact()
+            BlobStore().compact()
+
+    def export_audio_lists(self):
+        """Write the `files.csv` and `failures.csv` of every audiobook.
+
+        Returns
+        -------
+        int
+            The number of audiobooks exported.
+
+        """
+        return AudioIndex().export_all(Path("audiobooks"))
 
-                    for book_json in non_class_books:
-                        if book_json["type"] == "audio":
-                            self.get_audio_book(book_json, update_metadata_only)
-                        else:
-                            self.get_book(book_json, update_metadata_only)
+    def log_incomplete_audio_books(self):
+        """Log every audiobook with chapters that failed to download.
 
-        for class_ in self.classes:
+        Returns
+        -------
+        dict
+            The titles of the failed chapters, by audiobook.
+
+        """
+        incomplete = AudioIndex().incomplete()
+        for audiobook, titles in incomplete.items():
+            logging.info("%s: %d chapters failed: %s", audiobook, len(titles),
+                         ", ".join(titles))
+        logging.info("%d incomplete audiobooks", len(incomplete))
+        return incomplete
+
+    def translate_missing(self):
+        """Translate every book and audio chapter title that is missing one.
+
+        The untranslated titles are collected from the book list and from
+        the chapters of every audiobook in the `AudioIndex`, translated in
+        bulk, and written back. Titles that fail to translate are left blank
+        to be picked up by the next run.
+
+        """
+        books = [b for b in self.book_list.books if not b.english_title]
+
+        audio_books = []
+        for book in self.book_list.books:
+            if book.type_ != "Audio":
+                continue
+            audio_book = AudioBook(title=book.title, class_=book.class_,
+                                   file=book.file)
+            audio_book.load_lists()
+            audio_books.append(audio_book.chapters)
+
+        chapters = [
+            (audio_book, row["Title"])
+            for audio_book in audio_books
+            for row in audio_book.files
+            if not row["English Title"]
+        ]
+
+        if not books and not chapters:
+            return
+
+        logging.info("Translating %d titles and %d audio chapter titles",
+                     len(books), len(chapters))
+        with Metrics().time("sibi_translation_seconds"):
+            translations = translate_all(
+                [book.title for book in books]
+                + [title for _, title in chapters],
+                workers=self.translate_workers,
+            )
+        Metrics().inc("sibi_translated_titles_total", len(translations))
+
+        for book in books:
+            if book.title in translations:
+                self.book_list.update(
+                    book, english_title=translations[book.title])
+        self.book_list.save()
+
+        for audio_book, title in chapters:
+            if title in translations:
+                audio_book.update(title,
+                                  {"English Title": translations[title]})
+        AudioIndex().commit()
+
+    def scrape(self, update_metadata_only):
+        """Download every new book found, as a pipeline of stages.
+
+        discover
+            `discover_workers` threads running the catalogue searches planned
+            by `queries`, queueing each new book found.
+        fetch
+            `workers` threads running `get_book` or `get_audio_book`, which
+            download the book and queue the result.
+        validate
+            `validate_workers` threads, each counting the pages of one
+            downloaded PDF at a time on a pool of processes.
+        record
+            A single thread adding books to the book list, and failures to
+            the failure list, with `record_book`.
+
+        Once every stage has drained, the high-water marks of the searches
+        that fully succeeded are advanced (see `advance_marks`).
+
+        Each stage is fed by a bounded queue of `queue_size` items (by
+        default twice its worker count), so a stage that falls behind holds
+        back the stages before it. Returns once every stage has drained.
+
+        Progress is recorded in `checkpoint`. With `resume`, the books that
+        an interrupted run had found but not handled are queued first, and
+        the searches it finished are not run again. Once `stop` has been
+        called (or a signal received) no more searches or downloads are
+        started, and the checkpoint is kept for the next run to resume.
+
+        """
+        self._syncs = {}
+        self._discovered = set()
+        self._update_metadata_only = update_metadata_only
+
+        if self.resume and self.checkpoint.load():
+            logging.info("Resuming from %s: %d searches done, %d books to go",
+                         self.checkpoint.path, len(self.checkpoint.queries),
+                         len(self.checkpoint.pending))
+            for key, query in self.checkpoint.queries.items():
+                self._syncs[key] = (query["newest"], query["titles"])
+        else:
+            self.checkpoint.clear()
+
+        def fetch(item):
+            handler, book_json = item
+            if self._stopping.is_set():
+                # Left in the checkpoint, to be fetched when resuming.
+                return
+            handler(book_json, update_metadata_only)
+
+        # Workers are spawned rather than forked, as forking a process with
+        # live download threads and connection pools is not safe. They
+        # ignore SIGINT, which a terminal sends to every process in the
+        # group, so that only this process handles Ctrl-C (see
+        # `handle_signals`) and the pool is not broken under the books
+        # still being validated.
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.validate_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=signal.signal,
+                initargs=(signal.SIGINT, signal.SIG_IGN),
+        ) as self._validator:
+            self._pipeline = Pipeline([
+                Stage("discover", self.discover, self.discover_workers,
+                      self.queue_size),
+                Stage("fetch", fetch, self.workers, self.queue_size),
+                Stage("validate", self.validate_book, self.validate_workers,
+                      self.queue_size),
+                Stage("record", self.record_book, 1, self.queue_size),
+            ], stats_interval=self.stats_interval)
+
+            with self._pipeline:
+                for key, book_json in list(self.checkpoint.pending.items()):
+                    self._discovered.add(key)
+                    self._pipeline["fetch"].put(
+                        (self.handler_for(book_json), book_json))
+
+                for query in self.queries():
+                    if self._stopping.is_set():
+                        break
+                    if query[0] not in self.checkpoint.queries:
+                        self._pipeline["discover"].put(query)
+
+        self.stage_stats = self._pipeline.stats()
+        for stats in self.stage_stats:
+            for field in ["processed", "failed", "busy", "blocked"]:
+                name = (f"sibi_stage_{field}_seconds_total"
+                        if field in ["busy", "blocked"]
+                        else f"sibi_stage_{field}_total")
+                Metrics().set_gauge(name, stats[field], stage=stats["name"])
+        self.advance_marks()
+        self._validator = None
+        self._pipeline = None
+
+        if not self._stopping.is_set():
+            self.checkpoint.clear()
+
+    def queries(self):
+        """Plan the catalogue searches for the selected classes and levels.
+
+        A text book search without a class returns every book of its
+        category and type. It has always been needed for class 1, to find
+        the books that have no class, so when every class is selected that
+        one search replaces the twelve per-class searches of the same
+        category and type.
+
+        Yields
+        ------
+        tuple of (str, callable, tuple)
+            The key of the search's high-water mark in `sync_state`, a method
+            returning the books found by the search, and the arguments to
+            call it with.
+
+        """
+        every_class = set(self.CLASSES[1:]) <= set(self.classes)
+
+        if every_class:
+            for category in self.categories:
+                for type_ in self.BOOK_TYPES:
+                    yield (f"{category}/{type_}/all_classes",
+                           self.find_all_text_books, (category, type_))
+        elif "1" in self.classes:
             for category in self.categories:
                 for type_ in self.BOOK_TYPES:
-                    found_books = self.search_for_books(
-                        class_, category, type_)
+                    yield (f"{category}/{type_}/unclassified",
+                           self.find_unclassified_books, (category, type_))
 
-                    for book_json in found_books["results"]:
-                        if book_json["type"] == "audio":
-                            self.get_audio_book(book_json, update_metadata_only)
-                        else:
-                            self.get_book(book_json, update_metadata_only)
+        for class_ in [] if every_class else self.classes:
+            for category in self.categories:
+                for type_ in self.BOOK_TYPES:
+                    yield (f"{category}/{type_}/class_{class_}",
+                           self.find_text_books, (class_, category, type_))
 
         for level in self.non_text_levels:
-            found_books = self.search_for_non_text_books(level)
+            yield (f"non_text/level_{level}",
+                   self.find_non_text_books, (level,))
 
-            for book_json in found_books["results"]:
-                self.get_book(book_json, update_metadata_only)
+    def discover(self, query):
+        """Run a catalogue search and queue every book it finds for fetching.
 
-    def get_book(self, book_json, update_metadata_only):
-        if self.book_list.exists(book_json["title"]):
-            book = self.book_list.get(book_json["title"])
-            if not book.level:
-                book.level = book_json["level"]
-                self.book_list.save()
-            if not book.subject:
-                book.subject = book_json["subject"]
-                self.book_list.save()
+        The catalogue is ordered by `updated_at`, newest first, so the
+        search stops at the first book that has not changed since the
+        search's high-water mark, and no further pages of results are
+        requested. With `full_resync`, or when only updating metadata (which
+        needs to see the older books too), the mark is ignored and every
+        book is looked at.
+
+        Searches run concurrently and some overlap, so books already queued
+        by another search (identified by `book_key`) are not queued again.
+
+        Only a search that reached the end of its results, or its
+        high-water mark, is recorded in `_syncs` and the checkpoint. A
+        search that failed part way through may have missed books newer
+        than its mark, so the mark is left where it was and the search is
+        run again in full by the next run (or when resuming).
+
+        Parameters
+        ----------
+        query : tuple of (str, callable, tuple)
+            A search from `queries`.
+
+        """
+        key, find, args = query
+        if self.full_resync or self._update_metadata_only:
+            mark = None
+        else:
+            mark = self.sync_state.get(key)
+        newest = None
+        titles = []
+
+        try:
+            for item in find(*args):
+                if self._stopping.is_set():
+                    # Not recorded as done, so it is run again when resuming.
+                    return
+
+                updated_at = item[1].get("updated_at")
+                if updated_at:
+                    if mark is not None and updated_at <= mark:
+                        logging.debug("%s: no changes since %s", key, mark)
+                        break
+                    newest = max(newest or updated_at, updated_at)
+
+                book_key = self.book_key(item[1])
+                with self._lock:
+                    if book_key in self._discovered:
+                        continue
+                    self._discovered.add(book_key)
+
+                titles.append(item[1]["title"])
+                self.checkpoint.add(book_key, item[1])
+                self._pipeline["fetch"].put(item)
+        except (SearchError, httpx.HTTPError, json.JSONDecodeError) as e:
+            # The books found so far are still fetched, but the search is not
+            # recorded as done, so its mark stays put.
+            logging.warning("%s: search incomplete, not advancing past %s: "
+                            "%s", key, mark, e)
             return
 
-        if update_metadata_only:
+        with self._lock:
+            self._syncs[key] = (newest, titles)
+        self.checkpoint.complete_query(key, newest, titles)
+
+    def book_key(self, book_json):
+        """Return a key identifying a book across catalogue searches.
+
+        Books are identified by their slug, falling back to their ISBN and
+        then their title. The type is included because the PDF and audio
+        editions of a book share an ISBN.
+
+        """
+        ident = (book_json.get("slug") or book_json.get("isbn")
+                 or book_json["title"])
+        return f"{book_json.get('type')}/{ident}"
+
+    def advance_marks(self):
+        """Move the high-water mark of each search that fully succeeded.
+
+        Only searches that reached the end of their results, or their old
+        mark, without an error are in `_syncs` (see `discover`), so every
+        book newer than the old mark was seen. Even then, a search's mark
+        only moves once every book it found is in the book list, so books
+        that failed (or were skipped) are found again by the next run.
+
+        """
+        for key, (newest, titles) in self._syncs.items():
+            if newest is None:
+                continue
+            missing = [t for t in titles if not self.book_list.exists(t)]
+            if missing:
+                logging.info("%s: not advancing past %s, %d books missing",
+                             key, self.sync_state.get(key), len(missing))
+                continue
+            self.sync_state.update(key, newest)
+
+        self.sync_state.save()
+
+    def find_all_text_books(self, category, type_):
+        """Find every text book of a category and type.
+
+        Yields
+        ------
+        tuple of (callable, dict)
+            The method that should fetch each book (`get_book` or
+            `get_audio_book`) and the API result for the book.
+
+        """
+        for book_json in self.search_for_books(None, category, type_):
+            yield self.handler_for(book_json), book_json
+
+    def find_unclassified_books(self, category, type_):
+        """Find the text books of a category and type that have no class.
+
+        Yields
+        ------
+        tuple of (callable, dict)
+            The method that should fetch each book (`get_book` or
+            `get_audio_book`) and the API result for the book.
+
+        """
+        for book_json in self.search_for_books(None, category, type_):
+            if book_json["class"] in ["", None]:
+                yield self.handler_for(book_json), book_json
+
+    def find_text_books(self, class_, category, type_):
+        """Find the text books of a class, category and type.
+
+        Yields
+        ------
+        tuple of (callable, dict)
+            The method that should fetch each book (`get_book` or
+            `get_audio_book`) and the API result for the book.
+
+        """
+        for book_json in self.search_for_books(class_, category, type_):
+            yield self.handler_for(book_json), book_json
+
+    def find_non_text_books(self, level):
+        """Find the non-text books of a level.
+
+        Yields
+        ------
+        tuple of (callable, dict)
+            `get_book` and the API result for each book.
+
+        """
+        for book_json in self.search_for_non_text_books(level):
+            yield self.get_book, book_json
+
+    def handler_for(self, book_json):
+        """Return the method that fetches the given text book."""
+        if book_json["type"] == "audio":
+            return self.get_audio_book
+        return self.get_book
+
+    def get_book(self, book_json, update_metadata_only):
+        if not self.claim_book(book_json, update_metadata_only):
+            self.checkpoint.finish(self.book_key(book_json))
             return
 
         logging.info("New book: %s", book_json["title"])
+        outcome = (book_json, None, None)
 
         try:
-            new_book = Book.from_api(book_json)
+            new_book = Book.from_api(book_json, validate=False)
 
-            if not new_book:
-                return
-
-            self.book_list.add(new_book)
-            self.book_list.save()
-            if self.failure_list.exists(new_book.title):
-                self.failure_list.remove(new_book.title)
-                self.failure_list.save()
+            if new_book:
+                self._pipeline["validate"].put((book_json, new_book))
+                outcome = None
         except ScraperError as e:
-            logging.warning(e.message)
-            self.failure_list.add(e.title, e.message)
-            self.failure_list.save()
-
-        time.sleep(10)
+            outcome = (book_json, None, e)
+        finally:
+            # Anything not handed on to be validated is recorded straight
+            # away, so that the book is always released.
+            if outcome is not None:
+                self._pipeline["record"].put(outcome)
 
     def get_audio_book(self, book_json, update_metadata_only):
-        if self.book_list.exists(book_json["title"]):
-            book = self.book_list.get(book_json["title"])
-            if not book.level:
-                book.level = book_json["level"]
-                self.book_list.save()
-            if not book.subject:
-                book.subject = book_json["subject"]
-                self.book_list.save()
+        if not self.claim_book(book_json, update_metadata_only):
+            self.checkpoint.finish(self.book_key(book_json))
             return
 
-        if update_metadata_only:
-            return
+        outcome = (book_json, None, None)
 
         try:
-            new_book = AudioBook.from_api(book_json)
+            audio_book = AudioBook.from_api(book_json,
+                                            workers=self.audio_workers)
+            outcome = (book_json, audio_book, None)
+        except ScraperError as e:
+            outcome = (book_json, None, e)
+        finally:
+            self._pipeline["record"].put(outcome)
 
-            if not new_book:
-                return
+    def validate_book(self, item):
+        """Count the pages of a downloaded book and queue it for recording.
 
-            if self.failure_list.exists(new_book.title):
-                self.failure_list.remove(new_book.title)
-                self.failure_list.save()
+        Parameters
+        ----------
+        item : tuple of (dict, obj:`sibi_scraper.book.Book`)
+            The API result for the book and the downloaded book.
+
+        """
+        book_json, book = item
+        outcome = (book_json, None, None)
+        store = BlobStore()
 
-            self.book_list.add(new_book)
+        try:
+            # A PDF with the same contents as one already counted (see
+            # `BlobStore`) does not need counting again.
+            book.pages = store.pages(book.sha256) if book.sha256 else None
+            if book.pages is None:
+                with Metrics().time("sibi_pdf_parse_seconds"):
+                    book.pages = self._validator.submit(
+                        pdf.page_count, book.local_path).result()
+                if book.sha256:
+                    store.set_pages(book.sha256, book.pages)
+            outcome = (book_json, book, None)
+        except (PyPDF2.errors.PdfReadError, OSError, ValueError) as e:
+            logging.debug("%s: %s", book.title, e)
+            outcome = (book_json, None,
+                       ScraperError(book.title, f"Corrupt PDF: {book.file}"))
+        except concurrent.futures.BrokenExecutor as e:
+            outcome = (book_json, None,
+                       ScraperError(book.title,
+                                    f"Unable to validate {book.file}: {e}"))
+        finally:
+            self._pipeline["record"].put(outcome)
+
+    def record_book(self, outcome):
+        """Record the outcome of fetching a book and release the book.
+
+        Parameters
+        ----------
+        outcome : tuple of (dict, obj:`sibi_scraper.book.Book`, obj:`sibi_scraper.errors.ScraperError`)
+            The API result for the book, then either the book to add to the
+            book list or the error to add to the failure list. Both are None
+            if there is nothing to record.
+
+        """  # noqa: E501
+        book_json, book, error = outcome
+
+        try:
+            if error is not None:
+                self.add_failure(error)
+            elif book is not None:
+                self.add_book(book)
+        finally:
+            self.release_book(book_json)
+
+    def add_book(self, book):
+        """Add a downloaded book to the book list, clearing any failure."""
+        Metrics().inc("sibi_books_recorded_total", outcome="downloaded",
+                      type=book.type_)
+        with self._lock:
+            self.book_list.add(book)
             self.book_list.save()
-        except ScraperError as e:
-            logging.warning(e.message)
-            self.failure_list.add(e.title, e.message)
+            if self.failure_list.exists(book.title):
+                self.failure_list.remove(book.title)
+                self.failure_list.save()
+
+    def add_failure(self, error):
+        """Record a book that could not be downloaded in the failure list."""
+        logging.warning(error.message)
+        Metrics().inc("sibi_books_recorded_total", outcome="failed")
+        with self._lock:
+            self.failure_list.add(error.title, error.message)
             self.failure_list.save()
 
+    def claim_book(self, book_json, update_metadata_only):
+        """Decide whether a book returned by the API needs downloading.
+
+        Books that are already in the book list have any missing metadata
+        filled in from the API result, which is saved by `BookList.save_if_due`
+        and at the end of the run. Books that are already being downloaded
+        by another worker are skipped.
+
+        Parameters
+        ----------
+        book_json : dict
+            The API result for the book.
+        update_metadata_only : bool
+            True if no new books should be downloaded.
+
+        Returns
+        -------
+        bool
+            True if the caller should download the book, otherwise False.
+
+        """
+        title = book_json["title"]
+
+        with self._lock:
+            if self.book_list.exists(title):
+                book = self.book_list.get(title)
+                values = {}
+                if not book.level and book_json["level"]:
+                    values["level"] = book_json["level"]
+                if not book.subject and book_json["subject"]:
+                    values["subject"] = book_json["subject"]
+                if values:
+                    # Filled in metadata can be fetched again, so it is saved
+                    # in batches rather than once per book.
+                    self.book_list.update(book, **values)
+                    self.book_list.save_if_due()
+                return False
+
+            if update_metadata_only or title in self._in_flight:
+                return False
+
+            self._in_flight.add(title)
+            return True
+
+    def release_book(self, book_json):
+        """Mark a book claimed with `claim_book` as no longer in flight."""
+        with self._lock:
+            self._in_flight.discard(book_json["title"])
+        self.checkpoint.finish(self.book_key(book_json))
+
     def search_for_books(self, class_, category, type_):
         """Query the SIBI API for the text books for a given class.
 
@@ -188,32 +877,17 @@ class Scraper:
         type_ : str
             The type of book to scrape, "pdf" or "audio".
 
-        Returns
-        -------
+        Yields
+        ------
         dict
-            The parsed JSON result from the API if successful, otherwise an
-            empty dict.
+            The API result for each book found, as it is received.
 
         """
-        response = Session().session.get(
-            self.categories[category],
-            params={
-                "limit": 2000,
-                "order_by": "updated_at",
-                f"type_{type_}": "",
-                f"class_{class_}": "",
-            },
-        )
-
-        logging.debug(response)
-        logging.debug(response.text)
-
-        if response.ok:
-            return response.json()
-        else:
-            print(response)
-
-        return {"results": []}
+        yield from self.search(self.categories[category], {
+            "order_by": "updated_at",
+            f"type_{type_}": "",
+            f"class_{class_}": "",
+        })
 
     def search_for_non_text_books(self, level):
         """Query the SIBI API for the non-text books for a given level.
@@ -223,29 +897,88 @@ class Scraper:
         level : str
             The level of non-text book: A, B1, B2, B3, C, D, E, transisi.
 
-        Returns
-        -------
+        Yields
+        ------
         dict
-            The parsed JSON result from the API if successful, otherwise an
-            empty dict.
+            The API result for each book found, as it is received.
 
         """
-        response = Session().session.get(
-            self.NON_TEXT_ENDPOINT,
-            params={
-                "limit": 2000,
-                "order_by": "updated_at",
-                "type_pdf": "",
-                f"level_{level}": "",
-            },
-        )
+        yield from self.search(self.NON_TEXT_ENDPOINT, {
+            "order_by": "updated_at",
+            "type_pdf": "",
+            f"level_{level}": "",
+        })
 
-        logging.debug(response)
-        logging.debug(response.text)
+    def search(self, url, params):
+        """Page through the results of a catalogue search.
 
-        if response.ok:
-            return response.json()
-        else:
-            print(response)
+        Each page of `page_size` books is streamed, and its books are yielded
+        as they are decoded, so downloading can start before the listing has
+        arrived. The next page is only requested once the caller has
+        consumed the current one, so a caller that stops early (see
+        `discover`) saves the remaining requests.
+
+        Parameters
+        ----------
+        url : str
+            The catalogue endpoint.
+        params : dict
+            The query parameters, apart from the `limit` and `offset`.
 
-        return {"results": []}
+        Yields
+        ------
+        dict
+            The API result for each book found.
+
+        Raises
+        ------
+        obj:`sibi_scraper.errors.SearchError`
+            If a page was refused by the server, or the same page was
+            returned twice, so the results could not be paged through to
+            the end.
+        httpx.HTTPError
+            If a page could not be fetched.
+        json.JSONDecodeError
+            If a page is not a valid API result.
+
+        """
+        offset = 0
+        seen = set()
+
+        while True:
+            found = 0
+            new = 0
+
+            started = time.monotonic()
+            with Session().stream(url, cache=True, params={
+                **params,
+                "limit": self.page_size,
+                "offset": offset,
+            }) as response:
+                Metrics().observe("sibi_api_request_seconds",
+                                  time.monotonic() - started,
+                                  endpoint=url.rsplit("/", 1)[-1])
+                logging.debug(response)
+
+                if not response.is_success:
+                    raise SearchError(url, f"Unable to search {url} at offset "
+                                      f"{offset}: error "
+                                      f"{response.status_code}")
+
+                for book_json in iter_items(response.iter_text()):
+                    found += 1
+                    # Books can move between pages while they are being
+                    # paged through, so the same book may be seen twice.
+                    key = (book_json.get("title"), book_json.get("isbn"))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    new += 1
+                    yield book_json
+
+            if found < self.page_size:
+                return
+            if not new:
+                raise SearchError(url, f"{url} returned the same page twice "
+                                  f"at offset {offset}")
+            offset += found
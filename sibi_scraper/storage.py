@@ -0,0 +1,559 @@
+import csv
+import logging
+import re
+import sqlite3
+import threading
+
+from sibi_scraper.journal import Journal, write_csv
+
+# Each migration moves the SQLite schema up one version. The Level and Subject
+# columns mirror the columns that were added to the CSV book list over time,
+# sync_state holds the catalogue high-water marks (see SyncState), blobs
+# indexes the content-addressed store (see BlobStore), manifest records the
+# files checked by the verify command (see Manifest) and audio_index tracks
+# the chapters of every audiobook (see AudioIndex).
+MIGRATIONS = [
+    [
+        """CREATE TABLE books (
+            book_list_title TEXT PRIMARY KEY,
+            class TEXT,
+            isbn TEXT,
+            edition TEXT,
+            file_name TEXT,
+            pages TEXT,
+            english_title TEXT,
+            date_downloaded TEXT,
+            category TEXT,
+            type TEXT
+        )""",
+        "CREATE INDEX books_isbn ON books (isbn)",
+        "CREATE INDEX books_file_name ON books (file_name)",
+        "CREATE INDEX books_class ON books (class)",
+        """CREATE TABLE failures (
+            scope TEXT NOT NULL,
+            title TEXT NOT NULL,
+            failure TEXT,
+            PRIMARY KEY (scope, title)
+        )""",
+        """CREATE TABLE audio_files (
+            scope TEXT NOT NULL,
+            title TEXT NOT NULL,
+            english_title TEXT,
+            chapter TEXT,
+            subchapter TEXT,
+            file_name TEXT,
+            PRIMARY KEY (scope, title)
+        )""",
+    ],
+    ["ALTER TABLE books ADD COLUMN level TEXT"],
+    ["ALTER TABLE books ADD COLUMN subject TEXT"],
+    [
+        """CREATE TABLE sync_state (
+            query TEXT PRIMARY KEY,
+            updated_at TEXT,
+            synced_at TEXT
+        )""",
+    ],
+    [
+        """CREATE TABLE blobs (
+            sha_256 TEXT PRIMARY KEY,
+            size TEXT,
+            pages TEXT
+        )""",
+    ],
+    [
+        """CREATE TABLE manifest (
+            path TEXT PRIMARY KEY,
+            size TEXT,
+            modified TEXT,
+            sha_256 TEXT
+        )""",
+    ],
+    [
+        """CREATE TABLE audio_index (
+            id TEXT PRIMARY KEY,
+            audiobook TEXT,
+            title TEXT,
+            english_title TEXT,
+            chapter TEXT,
+            subchapter TEXT,
+            file_name TEXT,
+            failure TEXT
+        )""",
+        "CREATE INDEX audio_index_audiobook ON audio_index (audiobook)",
+    ],
+]
+
+
+class Storage:
+    """A singleton that decides where the scraper's lists are stored.
+
+    By default every list is kept in its own CSV file. Once `use_sqlite` has
+    been called, lists are stored in tables of a single SQLite database
+    instead, and their CSV files become exports of the database.
+
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.database = None
+                cls._instance = instance
+        return cls._instance
+
+    def use_sqlite(self, path):
+        """Store every list in a SQLite database.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path to the SQLite database, which is created and migrated to
+            the latest schema if necessary.
+
+        """
+        self.database = SqliteDatabase(path)
+
+    def use_csv(self):
+        """Store every list in its own CSV file (the default)."""
+        if self.database is not None:
+            self.database.close()
+        self.database = None
+
+    def backend(self, path, fields, key, table, *, scope=None,
+                compact_min=1000, keep_empty=True):
+        """Return the storage backend for a list.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The path to the list's CSV file.
+        fields : obj:`list` of str
+            The CSV column names.
+        key : str
+            The CSV column that uniquely identifies a row.
+        table : str
+            The SQLite table holding the list.
+        scope : str, optional
+            For tables shared by many lists, the value that identifies this
+            list's rows.
+        compact_min : int
+            The smallest number of journal entries that will trigger a CSV
+            compaction.
+        keep_empty : bool
+            False if the CSV file should be removed rather than written when
+            the list is empty.
+
+        Returns
+        -------
+        obj:`CsvBackend` or obj:`SqliteBackend`
+            The backend to load and save the list through.
+
+        """
+        if self.database is None:
+            return CsvBackend(path, fields, key, compact_min=compact_min,
+                              keep_empty=keep_empty)
+
+        return SqliteBackend(self.database, table, path, fields, key,
+                             scope=scope, keep_empty=keep_empty)
+
+
+class CsvBackend:
+    """Rows kept in a CSV file, with changes appended to a journal.
+
+    `commit` appends changes to `{path}.journal` and the CSV file is only
+    rewritten by `compact`, which `commit` triggers once the journal holds as
+    many entries as there are rows. Journal entries are upserts and deletes
+    by key, so replaying a journal that has already been compacted into the
+    CSV file changes nothing.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the CSV file.
+    fields : obj:`list` of str
+        The CSV column names.
+    key : str
+        The CSV column that uniquely identifies a row.
+
+    """
+
+    def __init__(self, path, fields, key, *, compact_min=1000,
+                 keep_empty=True):
+        self.path = path
+        self.fields = fields
+        self.key = key
+        self.compact_min = compact_min
+        self.keep_empty = keep_empty
+        self.journal = Journal(path.with_name(f"{path.name}.journal"))
+        self._rows = {}
+        self._pending = []
+
+    def load(self):
+        """Read every row from the CSV file and journal.
+
+        Columns missing from an older CSV file are filled in as blank. If
+        the file has more than one row with the same key, the first is kept,
+        as it is the one a lookup by key has always found. A warning is
+        logged for each of the others, as they are dropped when the file is
+        next compacted.
+
+        Returns
+        -------
+        obj:`list` of dict
+            The rows, keyed by column name.
+
+        """
+        self._rows = {}
+
+        if self.path.is_file():
+            logging.debug("Loading %s", self.path)
+            with self.path.open(newline="", encoding="utf-8") as csvfile:
+                reader = csv.DictReader(csvfile)
+                for csv_row in reader:
+                    row = {field: csv_row.get(field) or ""
+                           for field in self.fields}
+                    if row[self.key] in self._rows:
+                        logging.warning("%s line %d: ignoring a second row "
+                                        "for %s %r", self.path,
+                                        reader.line_num, self.key,
+                                        row[self.key])
+                        continue
+                    self._rows[row[self.key]] = row
+
+        for entry in self.journal.replay():
+            self._apply(entry)
+
+        if self.journal.entries:
+            logging.debug("Replayed %d changes from %s",
+                          self.journal.entries, self.journal.path)
+
+        return list(self._rows.values())
+
+    def put(self, key, row):
+        """Insert or replace a row.
+
+        Parameters
+        ----------
+        key : str
+            The key of the row being replaced. This differs from the key in
+            `row` when the row's key is being changed.
+        row : dict
+            The new row, keyed by column name.
+
+        """
+        entry = {"op": "put", "key": key, "row": row}
+        self._apply(entry)
+        self._pending.append(entry)
+
+    def delete(self, key):
+        """Remove a row.
+
+        Parameters
+        ----------
+        key : str
+            The key of the row to remove.
+
+        """
+        entry = {"op": "delete", "key": key}
+        self._apply(entry)
+        self._pending.append(entry)
+
+    def commit(self):
+        """Durably record every change made since the last commit."""
+        self.journal.append(self._pending)
+        self._pending = []
+
+        if self.journal.entries >= max(self.compact_min, len(self._rows)):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the CSV file with every row and empty the journal."""
+        logging.debug("Compacting %s", self.path)
+
+        self._pending = []
+        if self._rows or self.keep_empty:
+            write_csv(self.path, self.fields, self._rows.values())
+        else:
+            self.path.unlink(missing_ok=True)
+        self.journal.clear()
+
+    def _apply(self, entry):
+        if entry["op"] == "put":
+            row = entry["row"]
+            if entry["key"] != row[self.key] and entry["key"] in self._rows:
+                # Renames are rare, so rebuild to keep the row in place.
+                self._rows.pop(row[self.key], None)
+                self._rows = {
+                    (row[self.key] if key == entry["key"] else key): value
+                    for key, value in self._rows.items()
+                }
+            self._rows[row[self.key]] = row
+        elif entry["op"] == "delete":
+            self._rows.pop(entry["key"], None)
+
+
+class SqliteDatabase:
+    """A SQLite database shared by every SqliteBackend.
+
+    The schema version is kept in a `schema_version` table, and any
+    outstanding `MIGRATIONS` are applied when the database is opened.
+
+    Attributes
+    ----------
+    path : obj:`pathlib.Path`
+        The path to the database file.
+    lock : obj:`threading.RLock`
+        Serialises access to the connection between threads.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+
+    def schema_version(self):
+        """Return the version of the schema currently in the database."""
+        with self.lock:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER)")
+            row = self.connection.execute(
+                "SELECT MAX(version) FROM schema_version").fetchone()
+            return row[0] or 0
+
+    def migrate(self):
+        """Apply any migrations that the database has not seen yet."""
+        with self.lock:
+            version = self.schema_version()
+            for number, statements in enumerate(MIGRATIONS, start=1):
+                if number <= version:
+                    continue
+
+                logging.info("Migrating %s to schema version %d",
+                             self.path, number)
+                with self.transaction():
+                    for statement in statements:
+                        self.connection.execute(statement)
+                    self.connection.execute(
+                        "INSERT INTO schema_version (version) VALUES (?)",
+                        (number,))
+
+    def transaction(self):
+        """Return a context manager wrapping a block in a transaction."""
+        return _Transaction(self)
+
+    def close(self):
+        """Close the database connection."""
+        with self.lock:
+            self.connection.close()
+
+
+class _Transaction:
+    def __init__(self, database):
+        self.database = database
+
+    def __enter__(self):
+        self.database.lock.acquire()
+        self.database.connection.execute("BEGIN")
+        return self.database.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.database.connection.execute("COMMIT")
+            else:
+                self.database.connection.execute("ROLLBACK")
+        finally:
+            self.database.lock.release()
+
+
+class SqliteBackend:
+    """Rows kept in a table of a SQLite database.
+
+    Changes are buffered until `commit`, which writes them all in a single
+    transaction. The first time a list is loaded from an empty table, its
+    existing CSV file is imported, and `compact` exports the table back to
+    the same CSV file so that anything reading the CSV keeps working.
+
+    Attributes
+    ----------
+    table : str
+        The name of the table holding the rows.
+    path : obj:`pathlib.Path`
+        The path to the CSV file the rows are imported from and exported to.
+    fields : obj:`list` of str
+        The CSV column names.
+    key : str
+        The CSV column that uniquely identifies a row.
+    scope : str or None
+        For tables shared by many lists, the value of the `scope` column that
+        identifies this list's rows.
+
+    """
+
+    def __init__(self, database, table, path, fields, key, *, scope=None,
+                 keep_empty=True):
+        self.database = database
+        self.table = table
+        self.path = path
+        self.fields = fields
+        self.key = key
+        self.scope = scope
+        self.keep_empty = keep_empty
+        self.columns = {field: column_name(field) for field in fields}
+        self._pending = []
+
+    def _where(self, extra=""):
+        if self.scope is None:
+            return (f"WHERE {extra}" if extra else ""), []
+        clause = "WHERE scope = ?" + (f" AND {extra}" if extra else "")
+        return clause, [self.scope]
+
+    def load(self):
+        """Read every row from the table, importing the CSV file if empty.
+
+        Returns
+        -------
+        obj:`list` of dict
+            The rows, keyed by CSV column name.
+
+        """
+        rows = self._select()
+        if not rows and self.path.is_file():
+            self.import_csv(self.path)
+            rows = self._select()
+        return rows
+
+    def _select(self):
+        where, params = self._where()
+        columns = ", ".join(self.columns.values())
+        with self.database.lock:
+            cursor = self.database.connection.execute(
+                f"SELECT {columns} FROM {self.table} {where} "  # noqa: S608
+                "ORDER BY rowid", params)
+            return [
+                {field: row[column] or "" for field, column in
+                 self.columns.items()}
+                for row in cursor
+            ]
+
+    def import_csv(self, path):
+        """Replace the rows in the table with the contents of a CSV file.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The CSV file to import.
+
+        """
+        logging.info("Importing %s into %s", path, self.database.path)
+
+        backend = CsvBackend(path, self.fields, self.key)
+        rows = backend.load()
+
+        where, params = self._where()
+        with self.database.transaction() as connection:
+            connection.execute(f"DELETE FROM {self.table} {where}",  # noqa: S608
+                               params)
+            self._insert(connection, rows)
+
+    def export_csv(self, path):
+        """Write every row in the table to a CSV file.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The CSV file to write.
+
+        """
+        rows = self._select()
+        if rows or self.keep_empty:
+            write_csv(path, self.fields, rows)
+        else:
+            path.unlink(missing_ok=True)
+
+    def put(self, key, row):
+        """Insert or replace a row (see `CsvBackend.put`)."""
+        self._pending.append(("put", key, row))
+
+    def delete(self, key):
+        """Remove a row (see `CsvBackend.delete`)."""
+        self._pending.append(("delete", key, None))
+
+    def commit(self):
+        """Write every change made since the last commit in one transaction."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        key_column = self.columns[self.key]
+        where, params = self._where(f"{key_column} = ?")
+
+        with self.database.transaction() as connection:
+            for op, key, row in pending:
+                if op == "delete":
+                    connection.execute(
+                        f"DELETE FROM {self.table} {where}",  # noqa: S608
+                        [*params, key])
+                    continue
+
+                if key != row[self.key]:
+                    connection.execute(
+                        f"UPDATE OR REPLACE {self.table} "  # noqa: S608
+                        f"SET {key_column} = ? {where}",
+                        [row[self.key], *params, key])
+                self._insert(connection, [row])
+
+    def compact(self):
+        """Commit any outstanding changes and export the table to CSV."""
+        self.commit()
+        self.export_csv(self.path)
+
+    def _insert(self, connection, rows):
+        # An upsert rather than INSERT OR REPLACE, so that updated rows keep
+        # their rowid and therefore their place in the exported CSV.
+        columns = list(self.columns.values())
+        conflict = [self.columns[self.key]]
+        if self.scope is not None:
+            columns.insert(0, "scope")
+            conflict.insert(0, "scope")
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{column} = excluded.{column}"
+                            for column in columns if column not in conflict)
+
+        connection.executemany(
+            f"INSERT INTO {self.table} ({', '.join(columns)}) "  # noqa: S608
+            f"VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}",
+            (
+                ([self.scope] if self.scope is not None else [])
+                + [row.get(field) for field in self.fields]
+                for row in rows
+            ),
+        )
+
+
+def column_name(field):
+    """Convert a CSV column name into a SQLite column name.
+
+    Parameters
+    ----------
+    field : str
+        The CSV column name, e.g. "Book List Title".
+
+    Returns
+    -------
+    str
+        The column name, e.g. "book_list_title".
+
+    """
+    return re.sub(r"\W+", "_", field).strip("_").lower()
@@ -0,0 +1,63 @@
+import datetime
+
+from sibi_scraper.storage import Storage
+
+
+class SyncState:
+    """The newest catalogue change seen by each search, as of its last sync.
+
+    Every search of the SIBI catalogue (an endpoint, category, type and
+    class or level) has a high-water mark: the largest `updated_at` of the
+    books it returned the last time every one of those books was scraped
+    successfully. Later runs only need to look at books changed since then.
+
+    Like `FailureList`, the marks are stored through the backend chosen by
+    `sibi_scraper.storage.Storage`.
+
+    """
+
+    _csv_fields = [
+        "Query",
+        "Updated At",
+        "Synced At",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.marks = {}
+        self.backend = Storage().backend(path, self._csv_fields, "Query",
+                                         "sync_state")
+
+    def load(self):
+        for row in self.backend.load():
+            self.marks[row["Query"]] = row["Updated At"]
+
+    def save(self):
+        self.backend.commit()
+        self.backend.compact()
+
+    def get(self, query):
+        """Return the high-water mark of a search, or None if it has none."""
+        return self.marks.get(query) or None
+
+    def update(self, query, updated_at):
+        """Record a new high-water mark for a search.
+
+        Parameters
+        ----------
+        query : str
+            The key identifying the search.
+        updated_at : str
+            The `updated_at` of the newest book the search returned.
+
+        """
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.marks[query] = updated_at
+        self.backend.put(query, dict(zip(self._csv_fields,
+                                         [query, updated_at, now])))
+
+    def clear(self):
+        """Forget every high-water mark, so the next run reads every book."""
+        for query in list(self.marks):
+            self.backend.delete(query)
+        self.marks = {}
@@ -0,0 +1,271 @@
+import concurrent.futures
+import logging
+import sqlite3
+import threading
+import time
+
+import googletrans
+import httpx
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from sibi_scraper.rate_limit import RateLimiter
+
+TRANSLATE_HOST = "translate.googleapis.com"
+
+_local = threading.local()
+
+
+class TranslationCache:
+    """A singleton, persistent memo of Google Translate results.
+
+    Translations are keyed by the source text and the source and destination
+    languages. The cache holds at most `max_entries` translations, evicting
+    the least recently used ones once it is full. Until `use_database` is
+    called the cache is held in memory only.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups answered from the cache.
+    misses : int
+        The number of lookups that needed a call to Google Translate.
+    max_entries : int
+        The largest number of translations kept.
+
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.lock = threading.RLock()
+                instance.connection = None
+                instance.hits = 0
+                instance.misses = 0
+                instance.max_entries = 100_000
+                instance.use_database(":memory:")
+                cls._instance = instance
+        return cls._instance
+
+    def use_database(self, path, max_entries=None):
+        """Store the cache in a SQLite database.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path` or str
+            The path to the database file, which is created if necessary.
+        max_entries : int, optional
+            The largest number of translations to keep.
+
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+
+            if max_entries is not None:
+                self.max_entries = max_entries
+
+            self.connection = sqlite3.connect(path, check_same_thread=False,
+                                              isolation_level=None)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    source TEXT NOT NULL,
+                    src TEXT NOT NULL,
+                    dest TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (source, src, dest)
+                )""")
+            self.connection.execute("""
+                CREATE INDEX IF NOT EXISTS translations_last_used
+                ON translations (last_used)""")
+            self.entries = self.connection.execute(
+                "SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get(self, text, src, dest):
+        """Look up a cached translation.
+
+        Parameters
+        ----------
+        text : str
+            The text to translate.
+        src : str
+            The language of `text`.
+        dest : str
+            The language to translate into.
+
+        Returns
+        -------
+        str or None
+            The cached translation, or None if it is not in the cache.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT translation FROM translations "
+                "WHERE source = ? AND src = ? AND dest = ?",
+                (text, src, dest)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE translations SET last_used = ? "
+                "WHERE source = ? AND src = ? AND dest = ?",
+                (time.time(), text, src, dest))
+            return row[0]
+
+    def put(self, text, src, dest, translation):
+        """Add a translation to the cache.
+
+        Parameters
+        ----------
+        text : str
+            The text that was translated.
+        src : str
+            The language of `text`.
+        dest : str
+            The language of `translation`.
+        translation : str
+            The translated text.
+
+        """
+        with self.lock:
+            now = time.time()
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO translations "
+                "(source, src, dest, translation, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (text, src, dest, translation, now))
+            if cursor.rowcount:
+                self.entries += 1
+            else:
+                # Only a new key adds to the number of entries.
+                self.connection.execute(
+                    "UPDATE translations SET translation = ?, last_used = ? "
+                    "WHERE source = ? AND src = ? AND dest = ?",
+                    (translation, now, text, src, dest))
+
+            if self.entries > self.max_entries:
+                self.evict()
+
+    def evict(self):
+        """Drop the least recently used translations to make room.
+
+        A tenth of the cache is freed at a time, so that a full cache is not
+        trimmed on every insert.
+
+        """
+        with self.lock:
+            target = int(self.max_entries * 0.9)
+            self.connection.execute(
+                "DELETE FROM translations WHERE rowid IN ("
+                "SELECT rowid FROM translations "
+                "ORDER BY last_used LIMIT ?)",
+                (max(0, self.entries - target),))
+            self.entries = self.connection.execute(
+                "SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def log_stats(self):
+        """Log how effective the cache has been."""
+        logging.info("Translation cache: %d hits, %d misses, %d entries",
+                     self.hits, self.misses, self.entries)
+
+
+@retry(wait=wait_exponential(multiplier=1, min=2, max=10),
+       stop=stop_after_attempt(3),
+       retry=retry_if_exception_type((
+           httpx.ConnectError,
+           httpx.ReadTimeout,
+           TimeoutError)),
+       reraise=True)
+def translate_text(text, src="id", dest="en"):
+    """Translate text with Google Translate, using the translation cache.
+
+    Parameters
+    ----------
+    text : str
+        The text to translate.
+    src : str
+        The language of `text`.
+    dest : str
+        The language to translate into.
+
+    Returns
+    -------
+    str
+        The translated text.
+
+    """
+    cache = TranslationCache()
+    translation = cache.get(text, src, dest)
+    if translation is not None:
+        return translation
+
+    # googletrans clients hold an HTTP connection pool, so keep one per
+    # thread rather than building a new one for every title.
+    if not hasattr(_local, "translator"):
+        _local.translator = googletrans.Translator()
+
+    with RateLimiter().limit(TRANSLATE_HOST):
+        translation = _local.translator.translate(text, src=src,
+                                                  dest=dest).text
+
+    cache.put(text, src, dest, translation)
+    return translation
+
+
+def translate_all(texts, src="id", dest="en", workers=4):
+    """Translate many texts at once on a pool of worker threads.
+
+    Duplicate texts are only translated once, and texts already in the
+    `TranslationCache` are answered without a network call. googletrans has
+    no batch endpoint, so the remaining texts are translated concurrently,
+    one request each, paced by the shared `RateLimiter`.
+
+    Parameters
+    ----------
+    texts : iterable of str
+        The texts to translate.
+    src : str
+        The language of the texts.
+    dest : str
+        The language to translate into.
+    workers : int
+        The number of translations to run at the same time.
+
+    Returns
+    -------
+    dict
+        A mapping of text to translation. Texts that could not be
+        translated are left out, so they can be retried later.
+
+    """
+    unique = list(dict.fromkeys(text for text in texts if text))
+    translations = {}
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(translate_text, text, src, dest): text
+            for text in unique
+        }
+        for future in concurrent.futures.as_completed(futures):
+            text = futures[future]
+            try:
+                translations[text] = future.result()
+            except (httpx.HTTPError, TimeoutError, ValueError, LookupError,
+                    TypeError) as e:
+                logging.warning("Unable to translate %r: %s", text, e)
+
+    return translations
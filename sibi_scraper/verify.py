@@ -0,0 +1,251 @@
+import concurrent.futures
+import logging
+from pathlib import Path
+
+from sibi_scraper import pdf
+from sibi_scraper.audio_book import AudioBook
+from sibi_scraper.audio_index import AudioIndex
+from sibi_scraper.blob_store import BlobStore, file_sha256
+
+
+class Verifier:
+    """Check that every downloaded file is still present and intact.
+
+    The check runs in two passes. The first only calls `stat` on each file
+    in the book list (and each audiobook chapter in the `AudioIndex`), and
+    compares its size and modification time against the `Manifest`. The
+    second hashes, in parallel, just the files whose size or modification
+    time changed, or which have never been hashed before. A file whose contents
+    no longer match the hash in the manifest, or a PDF without its
+    end-of-file marker, is corrupt.
+
+    Missing and corrupt files are queued for re-download: their book is
+    taken out of the book list and the reason is recorded in the failure
+    list, so the next scrape downloads the book again. For an audiobook,
+    only the affected chapters are marked as failed in the `AudioIndex`. The
+    catalogue high-water marks are cleared as well, as otherwise the next
+    scrape would not look at the (unchanged) catalogue entries again.
+
+    Attributes
+    ----------
+    book_list : obj:`sibi_scraper.book_list.BookList`
+        The books whose files are checked.
+    failure_list : obj:`sibi_scraper.failure_list.FailureList`
+        Where books queued for re-download are recorded.
+    manifest : obj:`sibi_scraper.manifest.Manifest`
+        The size, modification time and hash of each file last checked.
+    sync_state : obj:`sibi_scraper.sync_state.SyncState`
+        The catalogue high-water marks.
+    workers : int
+        The number of files to hash concurrently.
+    checked : int
+        The number of files checked by the last `run`.
+    hashed : int
+        The number of those files that had to be hashed.
+    missing : int
+        The number of files that could not be found.
+    corrupt : int
+        The number of files that were damaged.
+
+    """
+
+    def __init__(self, book_list, failure_list, manifest, sync_state,
+                 workers=4):
+        self.book_list = book_list
+        self.failure_list = failure_list
+        self.manifest = manifest
+        self.sync_state = sync_state
+        self.workers = workers
+        self.checked = 0
+        self.hashed = 0
+        self.missing = 0
+        self.corrupt = 0
+
+    def run(self):
+        """Check every downloaded file and queue any problems.
+
+        Returns
+        -------
+        obj:`list` of tuple of (obj:`pathlib.Path`, str)
+            The path of each missing or corrupt file and what is wrong
+            with it.
+
+        """
+        self.manifest.load()
+
+        entries = list(self.expected_files())
+        changed, problems = self.stat_files(entries)
+        problems += self.hash_files(changed)
+
+        self.checked = len(entries)
+        self.hashed = len(changed)
+
+        expected = {str(path) for _, _, _, path in entries}
+        for path in list(self.manifest.entries):
+            if path not in expected:
+                self.manifest.remove(path)
+
+        self.queue_downloads(problems)
+        self.manifest.save()
+
+        logging.info("Verified %d files: %d hashed, %d missing, %d corrupt",
+                     self.checked, self.hashed, self.missing, self.corrupt)
+
+        return [(path, message) for _, _, _, path, message in problems]
+
+    def expected_files(self):
+        """List every file that the book list says has been downloaded.
+
+        Yields
+        ------
+        tuple of (obj:`sibi_scraper.book.Book`, obj:`sibi_scraper.audio_book.AudioBook`, str, obj:`pathlib.Path`)
+            The book, and for an audio chapter the audiobook (with its lists
+            loaded) and the chapter title, or None for both for a PDF, then
+            the path of the file.
+
+        """  # noqa: E501
+        for book in self.book_list.books:
+            if book.type_ != "Audio":
+                yield book, None, None, Path("books") / book.class_ / book.file
+                continue
+
+            audio_book = AudioBook(title=book.title, class_=book.class_,
+                                   file=book.file)
+            download_dir = audio_book.load_lists()
+            for row in audio_book.chapters.files:
+                yield (book, audio_book, row["Title"],
+                       download_dir / row["File Name"])
+
+    def stat_files(self, entries):
+        """Find the files that are missing or have changed.
+
+        Parameters
+        ----------
+        entries : obj:`list` of tuple
+            The files to check, as yielded by `expected_files`.
+
+        Returns
+        -------
+        tuple of (obj:`list`, obj:`list`)
+            Each changed file's entry with its `os.stat_result` appended, and
+            each missing file's entry with a description appended.
+
+        """
+        changed = []
+        problems = []
+
+        for entry in entries:
+            path = entry[-1]
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                self.missing += 1
+                problems.append((*entry, f"Missing file: {path}"))
+                continue
+
+            if not self.manifest.matches(path, stat):
+                changed.append((*entry, stat))
+
+        return changed, problems
+
+    def hash_files(self, changed):
+        """Hash changed files in parallel and update the manifest.
+
+        Parameters
+        ----------
+        changed : obj:`list` of tuple
+            The changed files, as returned by `stat_files`.
+
+        Returns
+        -------
+        obj:`list` of tuple
+            Each corrupt file's entry with a description appended.
+
+        """
+        problems = []
+        if not changed:
+            return problems
+
+        logging.info("Hashing %d new or changed files", len(changed))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers) as executor:
+            results = executor.map(self.check_file,
+                                   [entry[-2] for entry in changed])
+
+            for (*entry, stat), (digest, message) in zip(changed, results):
+                path = entry[-1]
+                if message is None:
+                    self.manifest.update(path, stat, digest)
+                    continue
+
+                self.corrupt += 1
+                problems.append((*entry, message))
+
+        return problems
+
+    def check_file(self, path):
+        """Hash a file and check that it is intact.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path`
+            The file to check.
+
+        Returns
+        -------
+        tuple of (str, str)
+            The SHA-256 hex digest of the file, and a description of what is
+            wrong with it, or None if it is intact.
+
+        """
+        try:
+            digest = file_sha256(path)
+        except OSError as e:
+            return None, f"Unreadable file: {path}: {e}"
+
+        entry = self.manifest.get(path)
+        if entry is not None and entry["SHA-256"] != digest:
+            return digest, f"Corrupt file: {path} has changed"
+
+        if path.suffix.lower() == ".pdf" and pdf.is_truncated(path):
+            return digest, f"Corrupt file: {path} is truncated"
+
+        return digest, None
+
+    def queue_downloads(self, problems):
+        """Queue missing and corrupt files to be downloaded again.
+
+        Parameters
+        ----------
+        problems : obj:`list` of tuple
+            Each missing or corrupt file's entry with a description appended.
+
+        """
+        if not problems:
+            return
+
+        removed = set()
+
+        for book, audio_book, chapter, path, message in problems:
+            logging.warning(message)
+
+            entry = self.manifest.get(path)
+            if entry is not None and BlobStore().path is not None:
+                BlobStore().remove(entry["SHA-256"], path)
+            self.manifest.remove(path)
+
+            if audio_book is not None:
+                audio_book.chapters.fail(chapter, message)
+
+            self.failure_list.add(book.title, message)
+            if id(book) not in removed:
+                removed.add(id(book))
+                self.book_list.remove(book)
+
+        AudioIndex().commit()
+        self.book_list.save()
+        self.failure_list.save()
+        self.sync_state.clear()
+        self.sync_state.save()
+
+        logging.info("Queued %d books to be downloaded again", len(removed))
@@ -1,18 +1,282 @@
-import requests
+import contextlib
+import logging
+import threading
+import urllib.parse
+
+import httpx
+
+from sibi_scraper.http_cache import HttpCache
+from sibi_scraper.metrics import Metrics
+from sibi_scraper.rate_limit import RateLimiter
 
 
 class Session:
-    """A singleton wrapper around Requests.Session that sets up HTTP headers.
+    """A singleton pool of keep-alive HTTP clients that sets up HTTP headers.
+
+    One `httpx.Client` is kept per host, so each host gets its own connection
+    pool that is reused for every request made during the run. Every request
+    made through `get` is paced by the shared per-host `RateLimiter`, and
+    throttled responses are retried once the limiter has backed off.
+
+    Requests made with `cache=True` go through the on-disk `HttpCache`, once
+    one has been set up with `use_cache`.
+
+    Attributes
+    ----------
+    pool_size : int
+        The default number of keep-alive connections kept open per host.
+    host_pool_sizes : dict
+        Per-host overrides for `pool_size`.
+    http2 : bool
+        True if the clients should negotiate HTTP/2 where the server
+        supports it.
+    timeout : obj:`httpx.Timeout`
+        The timeouts applied to every request.
+    cache : obj:`sibi_scraper.http_cache.HttpCache` or None
+        The cache used by requests made with `cache=True`.
 
     """
     _ua = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
     _instance = None
+    _instance_lock = threading.Lock()
+    max_throttle_retries = 3
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.pool_size = 10
+                instance.host_pool_sizes = {}
+                instance.http2 = False
+                instance.timeout = httpx.Timeout(60.0, connect=15.0)
+                instance.clients = {}
+                instance.stats = {}
+                instance.cache = None
+                instance.lock = threading.Lock()
+                cls._instance = instance
         return cls._instance
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": self._ua})
+    def configure(self, pool_size=None, host_pool_sizes=None, http2=None,
+                  timeout=None):
+        """Change the connection pool settings.
+
+        Any clients that have already been created are closed, so the new
+        settings apply to every request made afterwards.
+
+        Parameters
+        ----------
+        pool_size : int, optional
+            The default number of keep-alive connections kept open per host.
+        host_pool_sizes : dict, optional
+            A mapping of host name to pool size for hosts that need a
+            different pool size from the default.
+        http2 : bool, optional
+            True to negotiate HTTP/2 where the server supports it.
+        timeout : float or obj:`httpx.Timeout`, optional
+            The timeouts applied to every request.
+
+        """
+        with self.lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if host_pool_sizes is not None:
+                self.host_pool_sizes = dict(host_pool_sizes)
+            if http2 is not None:
+                self.http2 = http2
+            if timeout is not None:
+                self.timeout = httpx.Timeout(timeout)
+
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+
+    def use_cache(self, path, *, offline=False):
+        """Cache responses to requests made with `cache=True` on disk.
+
+        Parameters
+        ----------
+        path : obj:`pathlib.Path` or None
+            The directory to keep the cache in, or None to stop caching.
+        offline : bool
+            True to answer cached requests from the cache alone, without
+            touching the network.
+
+        """
+        self.cache = None if path is None else HttpCache(path,
+                                                          offline=offline)
+
+    def client(self, host):
+        """Return the pooled client for a host, creating it if necessary.
+
+        Parameters
+        ----------
+        host : str
+            The host name (and port, if any) of the URL being requested.
+
+        Returns
+        -------
+        obj:`httpx.Client`
+            The shared client for the host.
+
+        """
+        with self.lock:
+            if host not in self.clients:
+                pool_size = self.host_pool_sizes.get(host, self.pool_size)
+                self.clients[host] = httpx.Client(
+                    headers={"User-Agent": self._ua},
+                    limits=httpx.Limits(
+                        max_connections=pool_size,
+                        max_keepalive_connections=pool_size,
+                    ),
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                )
+                self.stats.setdefault(host, {"requests": 0, "connections": 0})
+            return self.clients[host]
+
+    def get(self, url, *, cache=False, **kwargs):
+        """Send a rate limited GET request.
+
+        Parameters
+        ----------
+        url : str
+            The URL to request.
+        cache : bool
+            True to revalidate and store the response in the `HttpCache`.
+        **kwargs
+            Keyword arguments passed to `httpx.Client.build_request`.
+
+        Returns
+        -------
+        obj:`httpx.Response`
+            The response from the server. This may still be a throttled
+            response if the server kept refusing after every retry.
+
+        """
+        return self._send(url, stream=False, cache=cache, **kwargs)
+
+    @contextlib.contextmanager
+    def stream(self, url, *, cache=False, **kwargs):
+        """Send a rate limited GET request without reading the body.
+
+        The body can then be consumed in chunks with `iter_bytes`, and the
+        connection is returned to the pool when the block exits.
+
+        Parameters
+        ----------
+        url : str
+            The URL to request.
+        cache : bool
+            True to revalidate and store the response in the `HttpCache`.
+            The body is only stored if it is read to the end.
+        **kwargs
+            Keyword arguments passed to `httpx.Client.build_request`.
+
+        Yields
+        ------
+        obj:`httpx.Response`
+            The response from the server, with the body not yet read.
+
+        """
+        response = self._send(url, stream=True, cache=cache, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def _send(self, url, stream, *, cache=False, **kwargs):
+        host = urllib.parse.urlsplit(url).netloc
+        client = self.client(host)
+        cache = self.cache if cache else None
+
+        if cache is None:
+            return self._send_paced(client, host, url, stream, kwargs)
+
+        request = client.build_request("GET", url, **kwargs)
+        meta = cache.lookup(request.url)
+        if cache.offline:
+            return cache.offline_response(request, meta, stream=stream)
+
+        if meta is not None:
+            kwargs = {**kwargs, "headers": {
+                **dict(kwargs.get("headers") or {}),
+                **cache.conditional_headers(meta),
+            }}
+
+        response = self._send_paced(client, host, url, stream, kwargs)
+        return cache.update(request, response, meta, stream=stream)
+
+    def _send_paced(self, client, host, url, stream, kwargs):
+        bucket = RateLimiter().bucket(host)
+
+        for _ in range(self.max_throttle_retries):
+            self._acquire(bucket)
+            response = client.send(self._request(client, host, url, kwargs),
+                                   stream=stream)
+            if not bucket.update(response):
+                return response
+            response.close()
+            Metrics().inc("sibi_retries_total", operation="throttled")
+
+        self._acquire(bucket)
+        response = client.send(self._request(client, host, url, kwargs),
+                               stream=stream)
+        bucket.update(response)
+        return response
+
+    def _acquire(self, bucket):
+        waited = bucket.acquire()
+        if waited:
+            Metrics().inc("sibi_sleep_seconds_total", waited,
+                          reason="rate_limit")
+
+    def _request(self, client, host, url, kwargs):
+        return client.build_request("GET", url, extensions=self._trace(host),
+                                    **kwargs)
+
+    def _trace(self, host):
+        """Build the httpx request extensions that count connection reuse."""
+        with self.lock:
+            self.stats[host]["requests"] += 1
+
+        def trace(event_name, _info):
+            if event_name == "connection.connect_tcp.complete":
+                with self.lock:
+                    self.stats[host]["connections"] += 1
+
+        return {"trace": trace}
+
+    def connection_stats(self):
+        """Report how often pooled connections were reused.
+
+        Returns
+        -------
+        dict
+            A mapping of host name to a dict with the number of `requests`
+            sent, the number of new `connections` opened, and the number of
+            requests that `reused` an already open connection.
+
+        """
+        with self.lock:
+            return {
+                host: {
+                    **counts,
+                    "reused": max(0, counts["requests"] - counts["connections"]),
+                }
+                for host, counts in self.stats.items()
+            }
+
+    def log_connection_stats(self):
+        """Log the connection reuse statistics for every host."""
+        for host, counts in self.connection_stats().items():
+            logging.info("%s: %d requests over %d connections (%d reused)",
+                         host, counts["requests"], counts["connections"],
+                         counts["reused"])
+
+    def close(self):
+        """Close every pooled client."""
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
@@ -0,0 +1,62 @@
+import pytest
+
+from sibi_scraper.audio_index import AudioIndex
+from sibi_scraper.journal import write_csv
+
+AUDIOBOOK = "1/buku-1"
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = AudioIndex()
+    index.use_file(tmp_path / "audio_index.csv")
+    return index
+
+
+def test_per_directory_lists_round_trip(index, tmp_path):
+    download_dir = tmp_path / "audiobooks" / AUDIOBOOK
+    files = [
+        {"Title": "Bab 1", "English Title": "Chapter 1", "Chapter": "1",
+         "Subchapter": "", "File Name": "01 Bab 1.mp3"},
+        {"Title": "Bab 2, Bagian 1", "English Title": "Chapter 2, Part 1",
+         "Chapter": "2", "Subchapter": "1",
+         "File Name": "02-1 Bab 2, Bagian 1.mp3"},
+    ]
+    failures = [{"Title": "Bab 3", "Failure": "Unable to download: 404"}]
+    write_csv(download_dir / "files.csv", list(files[0]), files)
+    write_csv(download_dir / "failures.csv", ["Title", "Failure"], failures)
+    original = {name: (download_dir / name).read_bytes()
+                for name in ["files.csv", "failures.csv"]}
+
+    chapters = index.book(AUDIOBOOK, download_dir)
+
+    assert [row["Title"] for row in chapters.files] == ["Bab 1",
+                                                        "Bab 2, Bagian 1"]
+    assert chapters.failures == {"Bab 3": "Unable to download: 404"}
+    assert index.incomplete() == {AUDIOBOOK: ["Bab 3"]}
+
+    (download_dir / "files.csv").unlink()
+    (download_dir / "failures.csv").unlink()
+    chapters.export()
+
+    for name, data in original.items():
+        assert (download_dir / name).read_bytes() == data
+
+
+def test_chapter_downloaded_after_failing_is_complete(index, tmp_path):
+    chapters = index.book(AUDIOBOOK, tmp_path / "audiobooks" / AUDIOBOOK)
+    chapters.fail("Bab 1", "Timed out")
+    chapters.save()
+    assert index.incomplete() == {AUDIOBOOK: ["Bab 1"]}
+
+    chapters.add("Bab 1", "Chapter 1", "1", "", "01 Bab 1.mp3")
+    chapters.save()
+
+    assert index.incomplete() == {}
+    assert chapters.exists("Bab 1")
+    assert chapters.isempty()
+
+    # The journal replays to the same state.
+    index.use_file(tmp_path / "audio_index.csv")
+    assert index.incomplete() == {}
+    assert index.book(AUDIOBOOK, chapters.download_dir).exists("Bab 1")
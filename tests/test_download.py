@@ -0,0 +1,132 @@
+import hashlib
+import json
+
+import httpx
+import pytest
+
+from sibi_scraper.download import HTTP_PARTIAL_CONTENT, PartFile, fetch_to_file
+from sibi_scraper.rate_limit import RateLimiter
+from sibi_scraper.web import Session
+
+FILES_HOST = "files.example"
+URL = f"https://{FILES_HOST}/buku-1.pdf"
+BODY = bytes(range(256)) * 1000
+
+
+def use_server(etag='"v1"', *, ranges=True, misaligned=False):
+    """Serve `BODY` from `URL`, returning the requests received.
+
+    Parameters
+    ----------
+    etag : str
+        The ETag of the file. A resume with another `If-Range` validator is
+        answered with the whole file.
+    ranges : bool
+        False to ignore `Range` headers, as some servers do.
+    misaligned : bool
+        True to send ranges that start later than the one asked for.
+
+    """
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        headers = {"ETag": etag}
+        range_ = request.headers.get("Range")
+        if (ranges and range_
+                and request.headers.get("If-Range") == etag):
+            start = int(range_.removeprefix("bytes=").rstrip("-"))
+            if misaligned:
+                start += 10
+            headers["Content-Range"] = (f"bytes {start}-{len(BODY) - 1}"
+                                        f"/{len(BODY)}")
+            return httpx.Response(HTTP_PARTIAL_CONTENT, headers=headers,
+                                  stream=httpx.ByteStream(BODY[start:]))
+        return httpx.Response(200, headers=headers,
+                              stream=httpx.ByteStream(BODY))
+
+    Session().client(FILES_HOST)
+    Session().clients[FILES_HOST] = httpx.Client(
+        transport=httpx.MockTransport(handler))
+    RateLimiter().configure(FILES_HOST, rate=1000, max_rate=1000,
+                            capacity=1000)
+    return requests
+
+
+@pytest.fixture
+def part(tmp_path):
+    """A download interrupted after a third of `BODY`, fetched as "v1"."""
+    part = PartFile(tmp_path / "buku-1.pdf")
+    part.path.write_bytes(BODY[:len(BODY) // 3])
+    part.meta_path.write_text(json.dumps({
+        "url": URL, "etag": '"v1"', "last_modified": None}),
+        encoding="utf-8")
+    yield part
+    Session().configure()
+
+
+def test_resume_fetches_only_missing_bytes(part):
+    requests = use_server()
+    digest = hashlib.sha256()
+
+    response = fetch_to_file(URL, part.target, digest)
+
+    assert response.status_code == HTTP_PARTIAL_CONTENT
+    assert requests[0].headers["Range"] == f"bytes={len(BODY) // 3}-"
+    assert response.num_bytes_downloaded == len(BODY) - len(BODY) // 3
+    assert part.target.read_bytes() == BODY
+    assert digest.hexdigest() == hashlib.sha256(BODY).hexdigest()
+    assert not part.path.exists()
+    assert not part.meta_path.exists()
+
+
+def test_whole_file_sent_for_resume_starts_over(part):
+    requests = use_server(ranges=False)
+    digest = hashlib.sha256()
+
+    response = fetch_to_file(URL, part.target, digest)
+
+    assert response.status_code == 200
+    assert "Range" in requests[0].headers
+    assert len(requests) == 1
+    assert part.target.read_bytes() == BODY
+    assert digest.hexdigest() == hashlib.sha256(BODY).hexdigest()
+
+
+def test_changed_file_is_downloaded_again(part):
+    # The file changed since the part was fetched, so If-Range fails.
+    use_server(etag='"v2"')
+
+    fetch_to_file(URL, part.target)
+
+    assert part.target.read_bytes() == BODY
+    assert not part.path.exists()
+
+
+@pytest.mark.parametrize("validators", [
+    {"url": f"https://{FILES_HOST}/buku-2.pdf", "etag": '"v1"'},
+    {"url": URL, "etag": None, "last_modified": None},
+])
+def test_part_without_matching_validator_is_discarded(part, validators):
+    part.meta_path.write_text(json.dumps(validators), encoding="utf-8")
+    requests = use_server()
+
+    assert part.resume_headers(URL) == {}
+    assert not part.path.exists()
+    assert not part.meta_path.exists()
+
+    fetch_to_file(URL, part.target)
+
+    assert "Range" not in requests[0].headers
+    assert part.target.read_bytes() == BODY
+
+
+def test_range_not_following_part_starts_over(part):
+    requests = use_server(misaligned=True)
+
+    response = fetch_to_file(URL, part.target)
+
+    assert response.status_code == 200
+    assert [request.headers.get("Range") for request in requests] == [
+        f"bytes={len(BODY) // 3}-", None]
+    assert part.target.read_bytes() == BODY
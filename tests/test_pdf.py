@@ -0,0 +1,98 @@
+import pytest
+
+from sibi_scraper import pdf
+
+
+def write_section(data, objects, free=(), prev=None, size=None):
+    """Append objects and a cross-reference section listing them to `data`.
+
+    Parameters
+    ----------
+    data : bytearray
+        The PDF written so far.
+    objects : dict
+        The body of each object to write, by object number.
+    free : iterable of int
+        Object numbers to list as free (deleted).
+    prev : int, optional
+        The offset of the previous cross-reference section.
+    size : int, optional
+        The `/Size` of the trailer.
+
+    """
+    entries = {0: b"0000000000 65535 f \n"} if prev is None else {}
+    for number, body in objects.items():
+        entries[number] = b"%010d 00000 n \n" % len(data)
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    for number in free:
+        entries[number] = b"0000000000 00001 f \n"
+
+    startxref = len(data)
+    data += b"xref\n"
+    for number in sorted(entries):
+        data += b"%d 1\n%s" % (number, entries[number])
+
+    trailer = b"/Size %d /Root 1 0 R" % (size or max(entries) + 1)
+    if prev is not None:
+        trailer += b" /Prev %d" % prev
+    data += b"trailer\n<< %s >>\nstartxref\n%d\n%%%%EOF\n" % (trailer,
+                                                               startxref)
+    return startxref
+
+
+def write_pdf(path, pages):
+    """Write a PDF with `pages` pages, returning its data and startxref."""
+    kids = b" ".join(b"%d 0 R" % (3 + i) for i in range(pages))
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages),
+    }
+    for i in range(pages):
+        objects[3 + i] = b"<< /Type /Page /Parent 2 0 R >>"
+
+    data = bytearray(b"%PDF-1.4\n")
+    startxref = write_section(data, objects)
+    path.write_bytes(bytes(data))
+    return data, startxref
+
+
+def test_trailing_bytes_after_eof_marker(tmp_path):
+    path = tmp_path / "book.pdf"
+    write_pdf(path, 3)
+    with path.open("ab") as pdf_file:
+        pdf_file.write(b"\0" * (pdf.EOF_WINDOW * 4))
+
+    assert not pdf.is_truncated(path)
+    assert pdf.page_count(path) == 3
+
+
+def test_truncated_pdf(tmp_path):
+    path = tmp_path / "book.pdf"
+    write_pdf(path, 50)
+    path.write_bytes(path.read_bytes()[:-pdf.EOF_WINDOW * 2])
+
+    assert pdf.is_truncated(path)
+
+
+def test_updated_object_is_not_read_from_older_section(tmp_path):
+    path = tmp_path / "book.pdf"
+    data, startxref = write_pdf(path, 3)
+    # An update that drops the last page, leaving the catalog as it was.
+    write_section(data, {
+        2: b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+    }, prev=startxref, size=6)
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(pdf.FastPathError):
+        pdf.fast_page_count(path)
+    assert pdf.page_count(path) == 2
+
+
+def test_deleted_object_is_not_read_from_older_section(tmp_path):
+    path = tmp_path / "book.pdf"
+    data, startxref = write_pdf(path, 3)
+    write_section(data, {}, free=[2], prev=startxref, size=6)
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(pdf.FastPathError):
+        pdf.fast_page_count(path)
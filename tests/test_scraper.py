@@ -0,0 +1,180 @@
+import queue
+import threading
+
+import httpx
+import pytest
+
+from sibi_scraper.rate_limit import RateLimiter
+from sibi_scraper.scraper import Scraper
+from sibi_scraper.web import Session
+from tests.test_pdf import write_pdf
+
+API_HOST = "api.buku.kemdikbud.go.id"
+FILES_HOST = "files.example"
+HTTP_SERVER_ERROR = 500
+
+
+def catalogue(size):
+    """Return a catalogue of PDF text books, newest first."""
+    return [{
+        "title": f"Buku {i}",
+        "isbn": f"978-602-{i:07d}",
+        "edition": "",
+        "attachment": f"https://files.example/buku-{i}.pdf",
+        "level": "SD",
+        "subject": "",
+        "class": "1",
+        "category": "buku_teks",
+        "type": "pdf",
+        "slug": f"buku-{i}",
+        "updated_at": f"2024-01-01T00:{59 - i:02d}:00",
+    } for i in range(size)]
+
+
+def use_catalogue(books, failing_offset=None):
+    """Answer catalogue searches from `books`, failing one page for good."""
+    def handler(request):
+        offset = int(request.url.params["offset"])
+        if offset == failing_offset:
+            return httpx.Response(HTTP_SERVER_ERROR)
+        limit = int(request.url.params["limit"])
+        return httpx.Response(
+            200, json={"results": books[offset:offset + limit]})
+
+    Session().client(API_HOST)
+    Session().clients[API_HOST] = httpx.Client(
+        transport=httpx.MockTransport(handler))
+    RateLimiter().configure(API_HOST, rate=1000, max_rate=1000,
+                            capacity=1000)
+
+
+def use_files(pdf_data, on_download=None):
+    """Serve `pdf_data` for every book, calling `on_download` each time."""
+    def handler(_request):
+        if on_download is not None:
+            on_download()
+        return httpx.Response(200, stream=httpx.ByteStream(pdf_data))
+
+    Session().client(FILES_HOST)
+    Session().clients[FILES_HOST] = httpx.Client(
+        transport=httpx.MockTransport(handler))
+    RateLimiter().configure(FILES_HOST, rate=1000, max_rate=1000,
+                            capacity=1000)
+
+
+def new_scraper(tmp_path, **kwargs):
+    return Scraper(["1"], [], tmp_path / "book_list.csv",
+                   tmp_path / "failures.csv", page_size=10,
+                   sync_state_file=tmp_path / "sync_state.csv",
+                   audio_index_file=tmp_path / "audio_index.csv",
+                   checkpoint_file=tmp_path / "checkpoint.json", **kwargs)
+
+
+def scrape(scraper):
+    """Scrape as `Scraper.run` does, without translating the titles."""
+    scraper.book_list.load()
+    scraper.failure_list.load()
+    scraper.sync_state.load()
+    try:
+        scraper.scrape(update_metadata_only=False)
+    finally:
+        scraper.checkpoint.save()
+        scraper.save_lists()
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    scraper = new_scraper(tmp_path)
+    scraper.sync_state.load()
+    scraper._pipeline = {"fetch": queue.Queue()}  # noqa: SLF001
+    yield scraper
+    Session().configure()
+
+
+def discover(scraper):
+    query = ("text/pdf/class_1", scraper.find_text_books,
+             ("1", "text", "pdf"))
+    scraper.discover(query)
+    return scraper._pipeline["fetch"]  # noqa: SLF001
+
+
+def test_failing_page_does_not_complete_search(scraper):
+    use_catalogue(catalogue(60), failing_offset=10)
+
+    fetch = discover(scraper)
+
+    # The books on the first page are still fetched...
+    assert fetch.qsize() == 10
+    # ...but the search is not recorded as done, so its mark stays put.
+    assert scraper._syncs == {}  # noqa: SLF001
+    assert scraper.checkpoint.queries == {}
+    scraper.advance_marks()
+    assert scraper.sync_state.get("text/pdf/class_1") is None
+
+
+def test_complete_search_is_recorded(scraper):
+    books = catalogue(25)
+    use_catalogue(books)
+
+    fetch = discover(scraper)
+
+    assert fetch.qsize() == len(books)
+    newest, titles = scraper._syncs["text/pdf/class_1"]  # noqa: SLF001
+    assert newest == books[0]["updated_at"]
+    assert len(titles) == len(books)
+    assert "text/pdf/class_1" in scraper.checkpoint.queries
+
+
+def test_metadata_only_search_ignores_mark(scraper):
+    books = catalogue(25)
+    use_catalogue(books)
+    scraper.sync_state.update("text/pdf/class_1", books[0]["updated_at"])
+
+    assert discover(scraper).qsize() == 0
+
+    scraper._discovered = set()  # noqa: SLF001
+    scraper._update_metadata_only = True  # noqa: SLF001
+    assert discover(scraper).qsize() == len(books)
+
+
+def test_stopped_scrape_resumes_unfinished_books(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    books = catalogue(25)
+    use_catalogue(books)
+    pdf_data, _ = write_pdf(tmp_path / "buku.pdf", 3)
+    scraper = new_scraper(tmp_path, workers=1, validate_workers=1)
+    downloads = []
+    lock = threading.Lock()
+
+    def stop_after_five():
+        with lock:
+            downloads.append(1)
+            if len(downloads) == 5:
+                scraper.stop()
+
+    use_files(bytes(pdf_data), stop_after_five)
+    try:
+        scrape(scraper)
+
+        # The books found but not fetched are left in the checkpoint, and
+        # the searches that were cut short are run again when resuming.
+        downloaded = {book.title for book in scraper.book_list.books}
+        pending = {book_json["title"]
+                   for book_json in scraper.checkpoint.pending.values()}
+        assert downloaded
+        assert pending
+        assert not downloaded & pending
+        assert len(downloaded) < len(books)
+        assert scraper.failure_list.isempty()
+
+        resumed = new_scraper(tmp_path, workers=1, validate_workers=1,
+                              resume=True)
+        scrape(resumed)
+
+        assert {book.title for book in resumed.book_list.books} == {
+            book["title"] for book in books}
+        assert all(str(book.pages) == "3" for book in resumed.book_list.books)
+        assert resumed.checkpoint.pending == {}
+        assert resumed.failure_list.isempty()
+    finally:
+        Session().configure()
@@ -0,0 +1,18 @@
+import logging
+
+from sibi_scraper.storage import CsvBackend
+
+
+def test_duplicate_keys_are_reported(tmp_path, caplog):
+    path = tmp_path / "books.csv"
+    path.write_text("Title,Pages\nBuku 1,10\nBuku 2,20\nBuku 1,30\n",
+                    encoding="utf-8")
+    backend = CsvBackend(path, ["Title", "Pages"], "Title")
+
+    with caplog.at_level(logging.WARNING):
+        rows = backend.load()
+
+    assert rows == [{"Title": "Buku 1", "Pages": "10"},
+                    {"Title": "Buku 2", "Pages": "20"}]
+    assert "line 4" in caplog.text
+    assert "'Buku 1'" in caplog.text
@@ -0,0 +1,39 @@
+import pytest
+
+from sibi_scraper.translation import TranslationCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranslationCache()
+    cache.use_database(tmp_path / "translations.sqlite3", max_entries=3)
+    yield cache
+    cache.use_database(":memory:", max_entries=100_000)
+
+
+def test_overwriting_a_translation_does_not_add_an_entry(cache):
+    for translation in ["Math", "Maths", "Mathematics"]:
+        cache.put("Matematika", "id", "en", translation)
+    assert cache.entries == 1
+    assert cache.get("Matematika", "id", "en") == "Mathematics"
+
+    # The cache only holds three translations, so an overcount would have
+    # evicted one of these.
+    cache.put("Bahasa", "id", "en", "Language")
+    cache.put("Sejarah", "id", "en", "History")
+    assert cache.entries == 3
+    assert cache.get("Matematika", "id", "en") == "Mathematics"
+    assert cache.get("Bahasa", "id", "en") == "Language"
+
+
+def test_full_cache_evicts_least_recently_used(cache):
+    cache.put("Matematika", "id", "en", "Mathematics")
+    cache.put("Bahasa", "id", "en", "Language")
+    cache.put("Sejarah", "id", "en", "History")
+    cache.get("Matematika", "id", "en")
+
+    cache.put("Seni", "id", "en", "Art")
+
+    assert cache.entries == 2
+    assert cache.get("Matematika", "id", "en") == "Mathematics"
+    assert cache.get("Bahasa", "id", "en") is None